@@ -0,0 +1,126 @@
+# benchmarks/bench_import_time.py
+"""
+Cold-start import time per combination, measured with ``python -X importtime``.
+
+Each combination runs in a fresh interpreter that imports main.py and then
+loads what that combination needs: the selected client through the client
+registry, the compiled graph if LangGraph is used, and for the API
+combinations the FastAPI app. The interpreter's own import report gives the
+total import time and the heaviest top-level packages; wall time covers the
+whole process start. Results are appended to bench_output.txt as JSON lines.
+
+Usage:
+    python -m benchmarks.bench_import_time --repeat 5
+    python -m benchmarks.bench_import_time --only direct-openai-plain api-langchain-langgraph
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.load_test import COMBINATIONS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+# Stacks whose presence in sys.modules is reported per combination
+STACKS = ("openai", "langchain_core", "langchain_openai", "langgraph", "fastapi", "uvicorn")
+
+_SCRIPT = """
+import sys
+import main
+from src.client_registry import get_compiled_graph, load_client
+mode, client_mode, use_langgraph = {mode!r}, {client_mode!r}, {use_langgraph!r}
+if mode == "api":
+    from src.server import ServerConfig, build_app
+    build_app(ServerConfig(client_mode=client_mode, use_langgraph=use_langgraph))
+client_fn, _ = load_client(client_mode)
+if use_langgraph:
+    get_compiled_graph(client_fn)
+print(",".join(p for p in {stacks!r} if p in sys.modules))
+"""
+
+
+def parse_importtime(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Sums an ``-X importtime`` report.
+
+    Returns:
+        Tuple of (total import time in µs, cumulative µs per top-level import)
+    """
+    total = 0
+    top_level = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total += int(self_us)
+        # Top-level entries are the ones main.py and the script import directly
+        if not indent:
+            top_level[name] = top_level.get(name, 0) + int(cumulative_us)
+    return total, top_level
+
+
+def measure(mode: str, client_mode: str, use_langgraph: bool) -> Tuple[float, int, Dict[str, int], List[str]]:
+    """Runs one cold start; returns (wall seconds, import µs, top-level µs, stacks loaded)."""
+    script = _SCRIPT.format(mode=mode, client_mode=client_mode, use_langgraph=use_langgraph, stacks=STACKS)
+    # A placeholder key lets the clients be built; nothing is sent
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "importtime")}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    total, top_level = parse_importtime(result.stderr)
+    stacks = result.stdout.strip().splitlines()[-1].split(",") if result.stdout.strip() else []
+    return wall, total, top_level, [s for s in stacks if s]
+
+
+def bench_combination(mode: str, client_mode: str, use_langgraph: bool, repeat: int, top: int) -> dict:
+    runs = [measure(mode, client_mode, use_langgraph) for _ in range(repeat)]
+    walls = [r[0] for r in runs]
+    imports = [r[1] for r in runs]
+    # Heaviest imports of the median run
+    median_run = sorted(runs, key=lambda r: r[1])[len(runs) // 2]
+    heaviest = sorted(median_run[2].items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "benchmark": "import_time",
+        "mode": mode,
+        "client_mode": client_mode,
+        "langgraph": use_langgraph,
+        "repeat": repeat,
+        "wall_ms": {"median": round(statistics.median(walls) * 1000, 1), "min": round(min(walls) * 1000, 1)},
+        "import_ms": {"median": round(statistics.median(imports) / 1000, 1), "min": round(min(imports) / 1000, 1)},
+        "heaviest_ms": {name: round(us / 1000, 1) for name, us in heaviest},
+        "stacks": median_run[3],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import time per combination")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per combination")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest top-level imports to report")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="Subset of combinations, e.g. direct-openai-plain api-langchain-langgraph")
+    parser.add_argument("--output", default="bench_output.txt", help="File results are appended to as JSON lines")
+    args = parser.parse_args()
+
+    results = []
+    for mode, client_mode, use_langgraph in COMBINATIONS:
+        if args.only and f"{mode}-{client_mode}-{'langgraph' if use_langgraph else 'plain'}" not in args.only:
+            continue
+        result = bench_combination(mode, client_mode, use_langgraph, args.repeat, args.top)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,328 @@
+# benchmarks/bench_per_token.py
+"""
+Per-token overhead of each streaming layer, driven by a synthetic in-process
+token source with no network.
+
+Layers:
+    source           the synthetic client function alone (the floor)
+    stream_plain     src.plain_impl.stream_plain around the source
+    call_model       the compiled LangGraph graph running call_model, read with
+                     the stream modes create_app uses ('custom' + 'updates')
+    bridge           QueueCallbackHandler pushing into a TokenBridge, read by
+                     a consumer, as in stream_langchain_tokens
+    event_generator  the /stream endpoint body of create_app (generate_tokens,
+                     metrics, flush policy), iterated without HTTP
+
+For each layer the source yields ``--tokens`` tokens of ``--token-size``
+characters as fast as the layer reads them. The report gives CPU µs per token
+(best of ``--repeat`` runs, and net of the bare source), the tokens/sec one
+stream sustains, and tracemalloc figures: peak traced bytes per token and
+bytes retained per token (growth of live memory between 1/4 and 3/4 of the
+stream, e.g. parts kept for the final answer). tracemalloc only sees live
+blocks, so short-lived allocations show up in the peak, not as a count.
+With ``--rate`` the source is also paced at that many tokens/sec, and the
+report says whether the layer kept up and what a token cost at that pace.
+
+Results are appended to bench_output.txt. ``--save-baseline`` writes them to
+benchmarks/baselines/per_token.json; otherwise they are compared with that
+file and regressions beyond ``--tolerance`` are listed (exit code 1 with
+``--fail-on-regression``).
+
+Usage:
+    python -m benchmarks.bench_per_token --tokens 20000 --repeat 3
+    python -m benchmarks.bench_per_token --layers stream_plain bridge --rate 2000
+    python -m benchmarks.bench_per_token --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import aclosing, contextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from src.token_event import TokenEvent
+
+logger = logging.getLogger(__name__)
+
+LAYERS = ("source", "stream_plain", "call_model", "bridge", "event_generator")
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "per_token.json")
+
+
+class SyntheticSource:
+    """
+    Client function (topic, config=None) yielding ``tokens`` TokenEvents.
+
+    Args:
+        tokens: Tokens per stream
+        token_size: Characters per token
+        rate: Tokens per second to pace the stream at (None: as fast as read)
+        marks: Token positions at which ``on_mark`` is called
+        on_mark: Called with the position when the source reaches a mark
+    """
+    def __init__(self, tokens: int, token_size: int, rate: Optional[float] = None,
+                 marks: tuple = (), on_mark: Optional[Callable[[int], None]] = None):
+        self.tokens = tokens
+        self.text = "x" * token_size
+        self.rate = rate
+        self.marks = frozenset(marks)
+        self.on_mark = on_mark
+        self.__name__ = "synthetic_tokens"
+
+    async def __call__(self, topic: str, config=None):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i in range(self.tokens):
+            if i in self.marks:
+                self.on_mark(i)
+            if self.rate is not None:
+                # Sleep only when ahead of schedule, so timer granularity does not cap the rate
+                ahead = start + i / self.rate - loop.time()
+                if ahead > 0.001:
+                    await asyncio.sleep(ahead)
+            yield TokenEvent(self.text, i)
+
+
+async def _bridge_stream(source) -> AsyncIterator[TokenEvent]:
+    from src.langchain_openai_client import QueueCallbackHandler
+    from src.token_bridge import TokenBridge
+
+    bridge = TokenBridge()
+    handler = QueueCallbackHandler(bridge)
+
+    async def produce():
+        async with aclosing(source("bench")) as events:
+            async for event in events:
+                await handler.on_llm_new_token(event.text)
+        bridge.close()
+
+    producer = asyncio.create_task(produce())
+    try:
+        async for event in bridge:
+            yield event
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        bridge.release()
+
+
+async def _graph_stream(source) -> AsyncIterator:
+    from src.langgraph_impl import get_compiled_graph
+
+    graph = get_compiled_graph(source)
+    run = graph.astream({"topic": "bench", "client_fn": source}, stream_mode=["custom", "updates"])
+    async with aclosing(run):
+        async for mode, chunk in run:
+            if mode == "custom":
+                yield chunk
+
+
+@contextmanager
+def _patched_openai_client(source):
+    from src import openai_client
+
+    original = openai_client.stream_openai_tokens
+    openai_client.stream_openai_tokens = source
+    try:
+        yield
+    finally:
+        openai_client.stream_openai_tokens = original
+
+
+async def _endpoint_stream(source, flush: str) -> AsyncIterator:
+    from src.fastapi_endpoint import create_app
+
+    # The client is looked up per request, so the patch stays for the whole stream
+    with _patched_openai_client(source):
+        app = create_app(client_mode="openai", flush_policy=flush)
+        endpoint = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/stream")
+        response = await endpoint(topic="bench", flush=None, flush_bytes=None, flush_ms=None,
+                                  x_cache_bypass=None, accept_encoding=None)
+        async with aclosing(response.body_iterator) as body:
+            async for chunk in body:
+                yield chunk
+
+
+def open_layer(layer: str, source, flush: str = "immediate") -> AsyncIterator:
+    """Returns the output stream of a layer reading from the source."""
+    if layer == "source":
+        return source("bench")
+    if layer == "stream_plain":
+        from src.plain_impl import stream_plain
+
+        return stream_plain("bench", source)
+    if layer == "call_model":
+        return _graph_stream(source)
+    if layer == "bridge":
+        return _bridge_stream(source)
+    if layer == "event_generator":
+        return _endpoint_stream(source, flush)
+    raise ValueError(f"Unknown layer '{layer}'; choose from {list(LAYERS)}")
+
+
+async def drain(stream: AsyncIterator) -> int:
+    outputs = 0
+    async with aclosing(stream) as items:
+        async for _ in items:
+            outputs += 1
+    return outputs
+
+
+async def timed_run(layer: str, tokens: int, token_size: int, rate: Optional[float] = None,
+                    flush: str = "immediate") -> dict:
+    """One stream through a layer; returns CPU and wall seconds."""
+    source = SyntheticSource(tokens, token_size, rate)
+    cpu, wall = time.process_time(), time.perf_counter()
+    outputs = await drain(open_layer(layer, source, flush))
+    return {"cpu": time.process_time() - cpu, "wall": time.perf_counter() - wall, "outputs": outputs}
+
+
+async def traced_run(layer: str, tokens: int, token_size: int, flush: str = "immediate") -> dict:
+    """One stream through a layer under tracemalloc; returns peak and retained bytes per token."""
+    quarter, three_quarters = tokens // 4, 3 * tokens // 4
+    current = {}
+    source = SyntheticSource(tokens, token_size, marks=(quarter, three_quarters),
+                             on_mark=lambda i: current.__setitem__(i, tracemalloc.get_traced_memory()[0]))
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await drain(open_layer(layer, source, flush))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes_per_token": round((peak - baseline) / tokens, 1),
+        "retained_bytes_per_token": round((current[three_quarters] - current[quarter])
+                                          / max(1, three_quarters - quarter), 1),
+    }
+
+
+async def bench_layer(layer: str, tokens: int, token_size: int, repeat: int, rate: Optional[float] = None,
+                      flush: str = "immediate") -> dict:
+    # One short stream first so imports, graph compilation and app creation are not measured
+    await timed_run(layer, min(tokens, 100), token_size, flush=flush)
+    runs = [await timed_run(layer, tokens, token_size, flush=flush) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["cpu"])
+    result = {
+        "layer": layer,
+        "cpu_us_per_token": round(best["cpu"] / tokens * 1e6, 3),
+        "max_tokens_per_sec": round(tokens / min(r["wall"] for r in runs)),
+        **await traced_run(layer, tokens, token_size, flush),
+    }
+    if rate is not None:
+        paced = await timed_run(layer, tokens, token_size, rate=rate, flush=flush)
+        achieved = tokens / paced["wall"]
+        result["paced"] = {
+            "rate": rate,
+            "achieved_tokens_per_sec": round(achieved),
+            "kept_up": achieved >= 0.95 * rate,
+            "cpu_us_per_token": round(paced["cpu"] / tokens * 1e6, 3),
+        }
+    return result
+
+
+def add_net_cost(results: List[dict]):
+    """Adds each layer's CPU per token above the bare source, if the source was measured."""
+    floor = next((r["cpu_us_per_token"] for r in results if r["layer"] == "source"), None)
+    if floor is None:
+        return
+    for r in results:
+        r["net_cpu_us_per_token"] = round(r["cpu_us_per_token"] - floor, 3)
+
+
+def compare_to_baseline(results: List[dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Lists the measurements that got worse than the baseline by more than ``tolerance``.
+
+    CPU and memory per token may not grow, and max tokens/sec may not drop,
+    by more than that fraction. Retained bytes get 8 bytes of slack so a
+    layer that retains nothing does not flag noise.
+    """
+    regressions = []
+    for r in results:
+        base = baseline.get(r["layer"])
+        if base is None:
+            continue
+        for key in ("cpu_us_per_token", "peak_bytes_per_token", "retained_bytes_per_token"):
+            slack = 8.0 if key == "retained_bytes_per_token" else 0.0
+            if r[key] > base[key] * (1 + tolerance) + slack:
+                regressions.append(f"{r['layer']}: {key} {base[key]} -> {r[key]}")
+        if r["max_tokens_per_sec"] < base["max_tokens_per_sec"] / (1 + tolerance):
+            regressions.append(f"{r['layer']}: max_tokens_per_sec {base['max_tokens_per_sec']} "
+                               f"-> {r['max_tokens_per_sec']}")
+    return regressions
+
+
+def markdown_table(results: List[dict]) -> str:
+    lines = [
+        "| Layer | CPU µs/token | Net µs/token | Max tokens/s | Peak B/token | Retained B/token |",
+        "|-------|--------------|--------------|--------------|--------------|------------------|",
+    ]
+    for r in results:
+        lines.append(f"| {r['layer']} | {r['cpu_us_per_token']} | {r.get('net_cpu_us_per_token', '')} "
+                     f"| {r['max_tokens_per_sec']} | {r['peak_bytes_per_token']} "
+                     f"| {r['retained_bytes_per_token']} |")
+    return "\n".join(lines)
+
+
+async def main(args) -> int:
+    results = []
+    for layer in args.layers:
+        result = await bench_layer(layer, args.tokens, args.token_size, args.repeat, args.rate, args.flush)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+    add_net_cost(results)
+    settings = {"tokens": args.tokens, "token_size": args.token_size, "flush": args.flush}
+
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(json.dumps({"benchmark": "per_token", **settings, **result}) + "\n")
+    print(markdown_table(results))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"settings": settings, "layers": {r["layer"]: r for r in results}}, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != settings:
+        print(f"Baseline was measured with {baseline['settings']}; not comparing")
+        return 0
+    regressions = compare_to_baseline(results, baseline["layers"], args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-token overhead of each streaming layer")
+    parser.add_argument("--layers", nargs="+", choices=list(LAYERS), default=list(LAYERS))
+    parser.add_argument("--tokens", type=int, default=20000, help="Tokens per stream")
+    parser.add_argument("--token-size", type=int, default=4, help="Characters per token")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per layer; the best is reported")
+    parser.add_argument("--rate", type=float, default=None, help="Also run paced at this many tokens/sec")
+    parser.add_argument("--flush", choices=["immediate", "coalesce"], default="immediate",
+                        help="Flush policy of the event_generator layer")
+    parser.add_argument("--output", default="bench_output.txt", help="File results are appended to as JSON lines")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with 1 if anything regressed")
+    args = parser.parse_args()
+
+    # Per-request INFO logs would be measured along with the layers
+    logging.disable(logging.INFO)
+    sys.exit(asyncio.run(main(args)))
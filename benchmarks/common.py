@@ -0,0 +1,10 @@
+# benchmarks/common.py
+import math
+from typing import List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an unsorted list (q in 0-100)."""
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
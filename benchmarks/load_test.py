@@ -0,0 +1,266 @@
+# benchmarks/load_test.py
+"""
+Concurrent load generator for the streaming combinations.
+
+Drives N concurrent clients against /stream for every (client_mode,
+use_langgraph) combination served by create_app, plus the run_direct paths,
+and reports time-to-first-token, inter-token latency percentiles, tokens/sec,
+requests/sec and error rate. Results are appended to bench_output.txt as one
+JSON object per combination.
+
+By default the LLM is the offline replay server (src/replay_server.py), so runs
+are free and repeatable; pass --live to use the configured OpenAI endpoint.
+
+Usage:
+    python -m benchmarks.load_test --requests 200 --concurrency 50 --time-scale 0.1
+    python -m benchmarks.load_test --url http://localhost:8000 --requests 100
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.common import percentile
+
+logger = logging.getLogger(__name__)
+
+COMBINATIONS = [
+    ("direct", "openai", True),
+    ("direct", "langchain", True),
+    ("direct", "openai", False),
+    ("direct", "langchain", False),
+    ("api", "openai", True),
+    ("api", "langchain", True),
+    ("api", "openai", False),
+    ("api", "langchain", False),
+]
+
+END_MARKER = "\nEnd of stream\n"
+
+
+class StreamSample:
+    """Timing of one request: when it started and when each token arrived."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.token_times: List[float] = []
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def token(self, text: str):
+        if text:
+            self.token_times.append(time.perf_counter())
+            if "Error:" in text and self.error is None:
+                self.error = text.strip()
+
+    def finish(self):
+        self.end = time.perf_counter()
+        if not self.token_times and self.error is None:
+            self.error = "no tokens received"
+
+
+class SampleWriter:
+    """File-like sink for run_direct that timestamps every write after the header line as a token."""
+    def __init__(self, sample: StreamSample):
+        self.sample = sample
+        self.in_header = True
+
+    def write(self, text: str) -> int:
+        if self.in_header:
+            self.in_header = "\n" not in text
+        elif text.strip():
+            self.sample.token(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+async def http_request(client: httpx.AsyncClient, url: str, topic: str) -> StreamSample:
+    sample = StreamSample()
+    try:
+        async with client.stream("GET", url, params={"topic": topic}) as response:
+            if response.status_code != 200:
+                sample.error = f"HTTP {response.status_code}"
+            async for chunk in response.aiter_text():
+                sample.token(chunk.replace(END_MARKER, "").replace("No content received from LLM\n", ""))
+    except httpx.HTTPError as e:
+        sample.error = f"{type(e).__name__}: {e}"
+    sample.finish()
+    return sample
+
+
+async def direct_request(client_mode: str, use_langgraph: bool, topic: str) -> StreamSample:
+    from src.direct_execution import run_direct
+
+    sample = StreamSample()
+    await run_direct(client_mode=client_mode, use_langgraph=use_langgraph, topic=topic,
+                     out=SampleWriter(sample))
+    sample.finish()
+    return sample
+
+
+def summarize(samples: List[StreamSample], wall: float) -> dict:
+    ok = [s for s in samples if s.error is None]
+    ttft = [s.token_times[0] - s.start for s in ok]
+    gaps = [b - a for s in ok for a, b in zip(s.token_times, s.token_times[1:])]
+    tokens = sum(len(s.token_times) for s in ok)
+    per_stream_tps = [
+        len(s.token_times) / (s.end - s.token_times[0])
+        for s in ok if len(s.token_times) > 1 and s.end > s.token_times[0]
+    ]
+
+    def ms(values, q):
+        return round(percentile(values, q) * 1000, 2) if values else None
+
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "wall_seconds": round(wall, 3),
+        "requests_per_sec": round(len(ok) / wall, 2) if wall else None,
+        "tokens_per_sec": round(tokens / wall, 1) if wall else None,
+        "stream_tokens_per_sec_mean": round(statistics.mean(per_stream_tps), 1) if per_stream_tps else None,
+        "ttft_ms": {"p50": ms(ttft, 50), "p90": ms(ttft, 90), "p99": ms(ttft, 99)},
+        "inter_token_ms": {"p50": ms(gaps, 50), "p90": ms(gaps, 90), "p99": ms(gaps, 99)},
+        "sample_errors": sorted({s.error for s in samples if s.error})[:3],
+    }
+
+
+async def run_load(make_request, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            return await make_request(i)
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(bounded(i) for i in range(requests)))
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def bench_combination(mode: str, client_mode: str, use_langgraph: bool, args) -> dict:
+    topics = args.topics
+
+    if mode == "direct":
+        from src.client_registry import client_module, share_http_client
+        from src.http_pool import create_http_client
+
+        # The SDK clients of the direct runs go through a pool owned by this
+        # combination and closed on this loop. Left to the garbage collector,
+        # they would be closed later from the API server's loop and fail with
+        # "Event loop is closed".
+        client_module(client_mode)
+        http_client = create_http_client()
+        share_http_client(http_client)
+        try:
+            result = await run_load(
+                lambda i: direct_request(client_mode, use_langgraph, topics[i % len(topics)]),
+                args.requests, args.concurrency)
+        finally:
+            share_http_client(None)
+            await http_client.aclose()
+    else:
+        from src.fastapi_endpoint import create_app
+        from src.replay_server import start_server, stop_server
+
+        server = None
+        if args.url:
+            base_url = args.url
+        else:
+            server, base_url = start_server(create_app(client_mode=client_mode, use_langgraph=use_langgraph))
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+                url = f"{base_url}/stream"
+                result = await run_load(
+                    lambda i: http_request(client, url, topics[i % len(topics)]),
+                    args.requests, args.concurrency)
+        finally:
+            if server is not None:
+                # The app's shutdown resets the process-wide clients; it must not
+                # run while the next combination's app is already serving
+                stop_server(server)
+
+    return {
+        "benchmark": "load_test",
+        "mode": mode,
+        "client_mode": client_mode,
+        "langgraph": use_langgraph,
+        "concurrency": args.concurrency,
+        **result,
+    }
+
+
+def markdown_matrix(results: List[dict]) -> str:
+    """Renders results in the layout of the README's experimental matrix."""
+    lines = [
+        "| Combination | Execution Mode | LangGraph | LLM Client | Streaming Works? |",
+        "|-------------|----------------|-----------|------------|------------------|",
+    ]
+    for i, r in enumerate(results, 1):
+        works = "Yes" if r["error_rate"] == 0 else f"No ({r['error_rate']:.0%} errors)"
+        if r["ttft_ms"]["p50"] is not None:
+            works += (f", TTFT p50 {r['ttft_ms']['p50']:.0f} ms, ITL p50 {r['inter_token_ms']['p50']} ms, "
+                      f"{r['requests_per_sec']} req/s")
+        lines.append(
+            f"| {i:<11} | {'Direct' if r['mode'] == 'direct' else 'FastAPI':<14} "
+            f"| {'Yes' if r['langgraph'] else 'No':<9} "
+            f"| {'OpenAI' if r['client_mode'] == 'openai' else 'LangChain':<10} | {works} |"
+        )
+    return "\n".join(lines)
+
+
+async def main(args) -> List[dict]:
+    results = []
+    for mode, client_mode, use_langgraph in COMBINATIONS:
+        if args.only and f"{mode}-{client_mode}-{'langgraph' if use_langgraph else 'plain'}" not in args.only:
+            continue
+        if args.url and mode == "direct":
+            continue
+        result = await bench_combination(mode, client_mode, use_langgraph, args)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent streaming load benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per combination")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--topics", nargs="+", default=["dogs"], help="Topics cycled across requests")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="Subset of combinations, e.g. api-openai-plain direct-langchain-langgraph")
+    parser.add_argument("--url", default=None,
+                        help="Benchmark an already running server instead (API combinations only)")
+    parser.add_argument("--live", action="store_true", help="Use the configured OpenAI endpoint, not the replay server")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="Replay timing scale (0 disables delays)")
+    parser.add_argument("--max-delay", type=float, default=0.5, help="Cap on any single replayed gap (seconds)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request HTTP timeout (seconds)")
+    parser.add_argument("--output", default="bench_output.txt", help="File results are appended to as JSON lines")
+    parser.add_argument("--markdown", action="store_true", help="Print the README matrix filled with results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if not args.live and not args.url:
+        from src.replay_server import create_replay_app, start_replay_server
+
+        replay, replay_url = start_replay_server(
+            create_replay_app(time_scale=args.time_scale, max_delay=args.max_delay))
+        # Must be set before the client modules are imported
+        os.environ["OPENAI_BASE_URL"] = replay_url
+        os.environ["OPENAI_API_KEY"] = "replay"
+    # The app modules log every request at INFO; keep benchmark output readable
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(main(args))
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    print(markdown_matrix(results) if args.markdown else json.dumps(results, indent=2))
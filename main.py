@@ -1,9 +1,17 @@
 # main.py
 import argparse
 import asyncio
-import uvicorn
+from src.backend_pool import ROUTING_POLICIES
+from src.client_registry import configure_client
 from src.direct_execution import run_direct
-from src.fastapi_endpoint import create_app
+from src.server import ServerConfig, serve
+from src.shared_cache import CACHE_BACKENDS
+from src.stream_compression import ENCODINGS, CompressionConfig, available_encodings
+from src.stream_recorder import RecorderConfig
+from src.topic_matcher import DEFAULT_NORMALIZERS, NORMALIZERS
+from src.token_bridge import OVERFLOW_POLICIES, BridgeConfig
+from src.warmup import WarmupConfig
+from src.ws_multiplex import WebSocketConfig
 
 def main():
     parser = argparse.ArgumentParser(description="LLM Streaming Experiments")
@@ -16,16 +24,129 @@ def main():
     parser.add_argument("--topic", default="dogs", help="Topic for the joke")
     parser.add_argument("--host", default="0.0.0.0", help="Host for API mode")
     parser.add_argument("--port", type=int, default=8000, help="Port for API mode")
+    parser.add_argument("--flush", choices=["immediate", "coalesce"], default="immediate",
+                        help="Default flush policy for the /stream endpoint in API mode")
+    parser.add_argument("--cache", action="store_true",
+                        help="Serve repeated requests from an in-memory response cache")
+    parser.add_argument("--cache-ttl", type=float, default=3600.0, help="Seconds a cached response stays valid")
+    parser.add_argument("--cache-max-mb", type=float, default=64.0, help="Memory budget of the response cache")
+    parser.add_argument("--cache-replay", choices=["instant", "paced"], default="instant",
+                        help="Replay cache hits at once or with the recorded token timing")
+    parser.add_argument("--cache-backend", choices=list(CACHE_BACKENDS), default="memory",
+                        help="Per-process cache, or one SQLite file shared by all workers on the host")
+    parser.add_argument("--cache-path", default=".cache/responses.sqlite3",
+                        help="Database file of --cache-backend sqlite")
+    parser.add_argument("--cache-normalize", nargs="*", choices=list(NORMALIZERS), default=None,
+                        help="Normalize topics before the cache lookup, e.g. 'Dogs!' and 'a dog' "
+                             f"(no steps given: {' '.join(DEFAULT_NORMALIZERS)})")
+    parser.add_argument("--cache-near-threshold", type=float, default=None,
+                        help="Serve cached responses of topics at least this similar (0-1, e.g. 0.7)")
+    parser.add_argument("--coalesce-requests", action="store_true",
+                        help="Share one upstream stream between identical concurrent API requests")
+    parser.add_argument("--bridge-size", type=int, default=None,
+                        help="Tokens buffered per LangChain stream (default: LLM_BRIDGE_MAX_SIZE or 256)")
+    parser.add_argument("--bridge-overflow", choices=list(OVERFLOW_POLICIES), default=None,
+                        help="Policy when a LangChain stream's buffer is full (default: LLM_BRIDGE_OVERFLOW or block)")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Upstream streams allowed at once in API mode (0: unlimited)")
+    parser.add_argument("--requests-per-minute", type=float, default=0.0,
+                        help="Upstream requests per minute in API mode (0: unlimited)")
+    parser.add_argument("--tokens-per-minute", type=float, default=0.0,
+                        help="Estimated upstream tokens per minute in API mode (0: unlimited)")
+    parser.add_argument("--admission-queue", type=int, default=100,
+                        help="Requests allowed to wait for admission before new ones are rejected")
+    parser.add_argument("--admission-timeout", type=float, default=10.0,
+                        help="Seconds a request may wait for admission before a 429/503")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Start a duplicate OpenAI request when the first token is late")
+    parser.add_argument("--hedge-after", type=float, default=None,
+                        help="Seconds before hedging (default: rolling p95 time to first token)")
+    parser.add_argument("--max-retries", type=int, default=2,
+                        help="Retries of OpenAI requests that fail before their first token")
+    parser.add_argument("--backends", default=None,
+                        help="JSON file listing OpenAI-compatible backends to route requests across")
+    parser.add_argument("--routing", choices=list(ROUTING_POLICIES), default="least_outstanding",
+                        help="How requests are spread across --backends")
+    parser.add_argument("--warmup-connections", type=int, default=0,
+                        help="Upstream connections each worker opens before it reports ready")
+    parser.add_argument("--warmup-probe", action="store_true",
+                        help="Send one short probe generation at startup; /ready stays 503 if it fails")
+    parser.add_argument("--warmup-timeout", type=float, default=10.0,
+                        help="Seconds the startup warm-up may take")
+    parser.add_argument("--compress", action="store_true",
+                        help="Compress /stream responses with the best encoding the client accepts")
+    parser.add_argument("--compress-encodings", nargs="+", choices=list(ENCODINGS), default=None,
+                        help="Encodings offered with --compress, most preferred first (default: all available)")
+    parser.add_argument("--record", action="store_true",
+                        help="Record upstream streams to logs/openai_stream_*.jsonl for debugging and replay")
+    parser.add_argument("--record-dir", default="logs", help="Directory recorded streams are written to")
+    parser.add_argument("--record-sample-rate", type=float, default=1.0,
+                        help="Fraction of streams recorded with --record")
+    parser.add_argument("--record-gzip", action="store_true", help="Gzip the recorded log files")
+    parser.add_argument("--ws-max-streams", type=int, default=16,
+                        help="Generations one /ws connection may run at once")
+    parser.add_argument("--ws-initial-credit", type=int, default=64,
+                        help="Token frames a /ws stream may send before the client grants more credit")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes in API mode, e.g. one per core")
+    parser.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], default="auto",
+                        help="Event loop of the API server ('auto' uses uvloop when installed)")
+    parser.add_argument("--http", choices=["auto", "h11", "httptools"], default="auto",
+                        help="HTTP parser of the API server ('auto' uses httptools when installed)")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Seconds in-flight streams may take to finish after SIGTERM")
     args = parser.parse_args()
 
+    bridge = BridgeConfig.from_env()
+    config = ServerConfig(client_mode=args.client,
+                          use_langgraph=args.langgraph,
+                          flush_policy=args.flush,
+                          cache=args.cache,
+                          cache_ttl=args.cache_ttl,
+                          cache_max_mb=args.cache_max_mb,
+                          cache_replay=args.cache_replay,
+                          cache_backend=args.cache_backend,
+                          cache_path=args.cache_path,
+                          cache_normalize=(tuple(args.cache_normalize or DEFAULT_NORMALIZERS)
+                                           if args.cache_normalize is not None else ()),
+                          cache_near_threshold=args.cache_near_threshold,
+                          coalesce_requests=args.coalesce_requests,
+                          bridge=BridgeConfig(max_size=args.bridge_size or bridge.max_size,
+                                              overflow=args.bridge_overflow or bridge.overflow,
+                                              max_coalesced_chars=bridge.max_coalesced_chars),
+                          max_concurrent=args.max_concurrent,
+                          requests_per_minute=args.requests_per_minute,
+                          tokens_per_minute=args.tokens_per_minute,
+                          admission_queue=args.admission_queue,
+                          admission_timeout=args.admission_timeout,
+                          hedge=args.hedge,
+                          hedge_after=args.hedge_after,
+                          max_retries=args.max_retries,
+                          backends=args.backends,
+                          routing=args.routing,
+                          warmup=WarmupConfig(connections=args.warmup_connections, probe=args.warmup_probe,
+                                              timeout=args.warmup_timeout),
+                          recorder=RecorderConfig(enabled=args.record, directory=args.record_dir,
+                                                  sample_rate=args.record_sample_rate, gzip=args.record_gzip),
+                          compression=CompressionConfig(enabled=args.compress,
+                                                        encodings=tuple(args.compress_encodings
+                                                                        or available_encodings())),
+                          websocket=WebSocketConfig(max_streams=args.ws_max_streams,
+                                                    initial_credit=args.ws_initial_credit))
+
     if args.mode == "direct":
+        # Only the selected client (and LangGraph, if asked for) is imported
+        configure_client(args.client, hedging=config.hedging(), bridge=config.bridge,
+                         backends=config.build_backends())
         asyncio.run(run_direct(client_mode=args.client,
                                use_langgraph=args.langgraph,
-                               topic=args.topic))
+                               topic=args.topic,
+                               cache=config.build_cache(),
+                               recorder=config.build_recorder()))
     elif args.mode == "api":
-        app = create_app(client_mode=args.client,
-                         use_langgraph=args.langgraph)
-        uvicorn.run(app, host=args.host, port=args.port)
+        # Workers rebuild the app from the environment through the app factory
+        serve(config, host=args.host, port=args.port, workers=args.workers, loop=args.loop,
+              http=args.http, graceful_timeout=args.graceful_timeout)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,254 @@
+# src/admission.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    """
+    Limits applied before a request may start an upstream stream.
+
+    A limit of 0 disables it.
+
+    Attributes:
+        max_concurrent: Upstream streams allowed to run at the same time
+        requests_per_minute: Token-bucket limit on started requests
+        tokens_per_minute: Token-bucket limit on estimated prompt + completion tokens
+        max_queue: Requests allowed to wait for admission; more are rejected at once
+        queue_timeout: Seconds a request may wait before it is rejected
+        completion_tokens: Completion tokens assumed per request when estimating
+    """
+    max_concurrent: int = 0
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+    max_queue: int = 100
+    queue_timeout: float = 10.0
+    completion_tokens: int = 256
+
+
+def estimate_tokens(params: dict, completion_tokens: int) -> int:
+    """Estimates the tokens a request will use from its messages and the expected completion length."""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in params.get("messages", ()))
+    return prompt_chars // CHARS_PER_TOKEN + completion_tokens
+
+
+class TokenBucket:
+    """
+    Refills continuously at ``per_minute / 60`` units per second up to a
+    capacity of one minute's budget.
+    """
+    __slots__ = ("rate", "capacity", "level", "updated")
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be admitted in time.
+
+    Attributes:
+        status_code: 429 when a rate limit is the bottleneck, 503 when capacity or the queue is
+        retry_after: Suggested seconds before retrying
+        reason: 'queue_full', 'rate_limited' or 'timeout'
+    """
+    def __init__(self, status_code: int, retry_after: float, reason: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class AdmissionTicket:
+    """A granted admission; release it when the upstream stream ends."""
+    __slots__ = ("controller", "wait", "released")
+
+    def __init__(self, controller: "AdmissionController", wait: float):
+        self.controller = controller
+        self.wait = wait
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release()
+
+
+class _Waiter:
+    __slots__ = ("future", "cost")
+
+    def __init__(self, future: asyncio.Future, cost: int):
+        self.future = future
+        self.cost = cost
+
+
+class AdmissionController:
+    """
+    Admission control in front of the upstream API.
+
+    Requests are admitted in FIFO order once a concurrency slot is free and
+    both token buckets can pay for them. Others wait in a bounded queue; a
+    request that cannot be admitted within ``queue_timeout`` (or would
+    certainly miss it because a rate limit is exhausted) is rejected at once
+    with a Retry-After hint instead of hanging.
+
+    Args:
+        config: The limits to apply
+    """
+    def __init__(self, config: AdmissionConfig):
+        self.config = config
+        self.requests = TokenBucket(config.requests_per_minute) if config.requests_per_minute else None
+        self.tokens = TokenBucket(config.tokens_per_minute) if config.tokens_per_minute else None
+        self.active = 0
+        self._queue = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "rate_limited": 0, "timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _rate_wait(self, cost: int, now: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.wait_time(1, now)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(cost, now))
+        return wait
+
+    def _has_slot(self) -> bool:
+        return not self.config.max_concurrent or self.active < self.config.max_concurrent
+
+    def _grant(self, cost: int):
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(cost)
+        self.active += 1
+        self.admitted += 1
+
+    def _reject(self, status_code: int, retry_after: float, reason: str, message: str):
+        self.rejected[reason] += 1
+        logger.warning(f"Admission rejected ({reason}): {message}")
+        raise AdmissionRejected(status_code, retry_after, reason, message)
+
+    async def acquire(self, cost: int = 0) -> AdmissionTicket:
+        """
+        Waits for admission.
+
+        Args:
+            cost: Estimated tokens of the request, charged to the tokens/minute bucket
+
+        Returns:
+            An AdmissionTicket to release when the stream ends
+
+        Raises:
+            AdmissionRejected: If the request cannot be admitted within the queue timeout
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        now = time.monotonic()
+        rate_wait = self._rate_wait(cost, now)
+        if not self._queue and self._has_slot() and rate_wait == 0.0:
+            self._grant(cost)
+            return AdmissionTicket(self, 0.0)
+
+        if rate_wait > self.config.queue_timeout:
+            self._reject(429, rate_wait, "rate_limited",
+                         f"Rate limit exhausted; next slot in {rate_wait:.1f}s")
+        if len(self._queue) >= self.config.max_queue:
+            self._reject(503, self.config.queue_timeout, "queue_full",
+                         f"Admission queue is full ({self.config.max_queue} waiting)")
+
+        waiter = _Waiter(loop.create_future(), cost)
+        self._queue.append(waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the deadline passed
+                return AdmissionTicket(self, loop.time() - start)
+            waiter.future.cancel()
+            self._discard(waiter)
+            retry_after = self._rate_wait(cost, time.monotonic()) or self.config.queue_timeout
+            status_code = 429 if self._has_slot() else 503
+            self._reject(status_code, retry_after, "timeout",
+                         f"Not admitted within {self.config.queue_timeout:.1f}s")
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            else:
+                waiter.future.cancel()
+                self._discard(waiter)
+            raise
+        return AdmissionTicket(self, loop.time() - start)
+
+    def _discard(self, waiter: _Waiter):
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            pass
+        self._dispatch()
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admits queued requests in order while capacity and budget allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                self._queue.popleft()
+                continue
+            if not self._has_slot():
+                # _release dispatches again when a stream ends
+                return
+            wait = self._rate_wait(waiter.cost, time.monotonic())
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            self._queue.popleft()
+            self._grant(waiter.cost)
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,250 @@
+# src/backend_pool.py
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from src.http_pool import HTTPPoolConfig, create_http_client
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ROUTING_POLICIES = ("least_outstanding", "weighted")
+
+
+@dataclass(frozen=True)
+class BackendConfig:
+    """
+    One OpenAI-compatible endpoint.
+
+    Attributes:
+        base_url: API base URL
+        api_key: API key (None falls back to OPENAI_API_KEY)
+        model: Model to request from this backend (None keeps the client's default)
+        weight: Relative share of traffic
+        name: Label used in logs and metrics (defaults to base_url)
+    """
+    base_url: str
+    api_key: Optional[str] = None
+    model: Optional[str] = None
+    weight: float = 1.0
+    name: Optional[str] = None
+
+    def __post_init__(self):
+        if self.weight <= 0:
+            raise ValueError("weight must be positive")
+
+
+@dataclass(frozen=True)
+class BackendPoolConfig:
+    """
+    Routing and passive health check settings of a BackendPool.
+
+    Attributes:
+        routing: 'least_outstanding' picks the backend with the lowest
+            (in-flight requests + 1) * latency / weight; 'weighted' picks at
+            random by weight, scaled down for backends slower than the fastest
+        ewma_alpha: Weight of the newest sample in the latency average
+        failure_threshold: Consecutive failures that eject a backend
+        ejection_time: Seconds of the first ejection; doubles on each
+            ejection in a row
+        max_ejection_time: Upper bound of an ejection
+    """
+    routing: str = "least_outstanding"
+    ewma_alpha: float = 0.3
+    failure_threshold: int = 3
+    ejection_time: float = 10.0
+    max_ejection_time: float = 300.0
+
+    def __post_init__(self):
+        if self.routing not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy '{self.routing}'. "
+                             f"Choose one of: {', '.join(ROUTING_POLICIES)}")
+
+
+def load_backend_configs(path: str) -> List[BackendConfig]:
+    """
+    Reads backends from a JSON file holding a list of objects with the
+    BackendConfig fields. ``api_key_env`` may name an environment variable to
+    read the key from instead of storing it in the file.
+
+    Args:
+        path: Path of the JSON file
+
+    Returns:
+        The BackendConfigs in file order
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    configs = []
+    for entry in entries:
+        entry = dict(entry)
+        key_env = entry.pop("api_key_env", None)
+        if key_env is not None:
+            entry["api_key"] = os.environ[key_env]
+        configs.append(BackendConfig(**entry))
+    return configs
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error says something about the backend's health (not about the request)."""
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class Backend:
+    """
+    Live state of one backend.
+
+    Attributes:
+        outstanding: Requests in flight
+        latency: EWMA of the time to first token, None until measured
+        clients: Client objects built for this backend (keyed by client
+            kind); dropped whenever its connection pool changes
+    """
+    def __init__(self, config: BackendConfig):
+        self.config = config
+        self.name = config.name or config.base_url
+        self.http_client = None
+        self.clients: Dict[str, object] = {}
+        self.outstanding = 0
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self) -> str:
+        return self.config.base_url
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return self.config.api_key
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.config.model
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def stats(self) -> dict:
+        return {
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": not self.available(time.monotonic()),
+        }
+
+
+class BackendLease:
+    """One request routed to a backend; report its outcome, then release it."""
+    __slots__ = ("pool", "backend", "started", "released")
+
+    def __init__(self, pool: "BackendPool", backend: Backend):
+        self.pool = pool
+        self.backend = backend
+        self.started = time.monotonic()
+        self.released = False
+
+    def first_token(self):
+        """Records a success and the time to first token."""
+        self.pool._record_success(self.backend, time.monotonic() - self.started)
+
+    def fail(self, error: Optional[BaseException] = None):
+        """Records a failure, unless ``error`` is a client-side error such as a 400."""
+        if error is None or is_backend_failure(error):
+            self.pool._record_failure(self.backend)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.backend.outstanding -= 1
+
+
+class BackendPool:
+    """
+    Routes requests across several OpenAI-compatible backends.
+
+    Each request takes a lease on the backend chosen by the routing policy.
+    Latency is tracked as an EWMA of the time to first token, so traffic moves
+    away from slow backends. Health is checked passively: a backend that
+    fails ``failure_threshold`` times in a row is ejected for a while, then
+    re-admitted; a failure right after re-admission ejects it again for
+    twice as long, a success resets it. If every backend is ejected, the one
+    due back first is used rather than failing the request.
+
+    Args:
+        backends: The endpoints to route to
+        config: Routing and health check settings
+    """
+    def __init__(self, backends: Sequence[BackendConfig], config: BackendPoolConfig = BackendPoolConfig(),
+                 rng: random.Random = random):
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        self.config = config
+        self.backends = [Backend(b) for b in backends]
+        self.rng = rng
+
+    def acquire(self) -> BackendLease:
+        """Picks a backend and counts the request as outstanding on it."""
+        backend = self.pick()
+        backend.outstanding += 1
+        backend.requests += 1
+        return BackendLease(self, backend)
+
+    def pick(self) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.available(now)]
+        if not candidates:
+            return min(self.backends, key=lambda b: b.ejected_until)
+        if len(candidates) == 1:
+            return candidates[0]
+        # Unmeasured backends count as fast as the fastest so they get probed
+        measured = [b.latency for b in candidates if b.latency is not None]
+        fastest = min(measured) if measured else 1.0
+        if self.config.routing == "weighted":
+            weights = [b.config.weight * fastest / (b.latency or fastest) for b in candidates]
+            return self.rng.choices(candidates, weights)[0]
+        return min(candidates,
+                   key=lambda b: (b.outstanding + 1) * (b.latency or fastest) / b.config.weight)
+
+    def _record_success(self, backend: Backend, latency: float):
+        alpha = self.config.ewma_alpha
+        backend.latency = latency if backend.latency is None else alpha * latency + (1 - alpha) * backend.latency
+        backend.failures = 0
+        backend.ejections = 0
+
+    def _record_failure(self, backend: Backend):
+        backend.errors += 1
+        backend.failures += 1
+        now = time.monotonic()
+        if backend.failures >= self.config.failure_threshold and backend.available(now):
+            duration = min(self.config.max_ejection_time, self.config.ejection_time * 2 ** backend.ejections)
+            backend.ejections += 1
+            backend.ejected_until = now + duration
+            logger.warning(f"Ejecting backend {backend.name} for {duration:.0f}s "
+                           f"after {backend.failures} consecutive failures")
+
+    def open_http_clients(self, config: Optional[HTTPPoolConfig] = None):
+        """Gives every backend its own connection pool; close them with aclose_http_clients."""
+        for backend in self.backends:
+            backend.http_client = create_http_client(config)
+            backend.clients.clear()
+
+    async def aclose_http_clients(self):
+        for backend in self.backends:
+            http_client, backend.http_client = backend.http_client, None
+            backend.clients.clear()
+            if http_client is not None:
+                await http_client.aclose()
+
+    def stats(self) -> dict:
+        return {backend.name: backend.stats() for backend in self.backends}
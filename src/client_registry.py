@@ -0,0 +1,168 @@
+# src/client_registry.py
+import importlib
+import sys
+from contextlib import aclosing
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, Dict, List, Tuple
+
+
+@dataclass(frozen=True)
+class ClientSpec:
+    """
+    Where an LLM client lives, so it is imported only when selected.
+
+    Attributes:
+        module: Module implementing the client
+        stream: Name of its streaming function (yields TokenEvents)
+        params: Name of its request-parameters function (used for cache keys)
+        set_http_client: Name of its function that sets the shared connection pool
+        sdk_clients: Name of its function that builds its client objects and
+            returns the AsyncOpenAI clients they send requests with
+    """
+    module: str
+    stream: str
+    params: str
+    set_http_client: str
+    sdk_clients: str
+
+    def load(self) -> ModuleType:
+        return importlib.import_module(self.module)
+
+    @property
+    def loaded(self) -> bool:
+        return self.module in sys.modules
+
+
+CLIENTS: Dict[str, ClientSpec] = {
+    "openai": ClientSpec("src.openai_client", "stream_openai_tokens", "openai_request_params",
+                         "set_openai_http_client", "openai_sdk_clients"),
+    "langchain": ClientSpec("src.langchain_openai_client", "stream_langchain_tokens", "langchain_request_params",
+                            "set_langchain_http_client", "langchain_sdk_clients"),
+}
+
+LANGGRAPH_MODULE = "src.langgraph_impl"
+
+
+def _spec(client_mode: str) -> ClientSpec:
+    try:
+        return CLIENTS[client_mode]
+    except KeyError:
+        raise ValueError(f"Invalid client_mode '{client_mode}'. Use one of: {', '.join(CLIENTS)}.")
+
+
+def client_module(client_mode: str) -> ModuleType:
+    """Imports (on first use) and returns the module of a client."""
+    return _spec(client_mode).load()
+
+
+def load_client(client_mode: str) -> Tuple[Callable, Callable]:
+    """
+    Imports the selected client and nothing else.
+
+    Args:
+        client_mode: 'openai' or 'langchain'
+
+    Returns:
+        Tuple of (streaming function, request-parameters function)
+
+    Raises:
+        ValueError: If the client_mode is unknown
+    """
+    spec = _spec(client_mode)
+    module = spec.load()
+    return getattr(module, spec.stream), getattr(module, spec.params)
+
+
+def loaded_clients() -> List[str]:
+    """Client modes whose modules have been imported in this process."""
+    return [mode for mode, spec in CLIENTS.items() if spec.loaded]
+
+
+def configure_client(client_mode: str, hedging=None, bridge=None, backends=None):
+    """
+    Applies the settings that concern the selected client; the others are ignored.
+
+    Args:
+        client_mode: 'openai' or 'langchain'
+        hedging: HedgingConfig of the OpenAI client
+        bridge: BridgeConfig of the LangChain token buffer
+        backends: BackendPool to route the client's requests across
+    """
+    module = client_module(client_mode)
+    if client_mode == "openai":
+        if hedging is not None:
+            module.openai_client.set_hedging(hedging)
+    else:
+        if bridge is not None:
+            module.set_bridge_config(bridge)
+    if backends is not None:
+        set_client_backends(client_mode, backends)
+
+
+def set_client_backends(client_mode: str, backends):
+    """
+    Routes the selected client's requests across a pool of backends.
+
+    Args:
+        client_mode: 'openai' or 'langchain'
+        backends: The BackendPool, or None to go back to the single endpoint
+    """
+    module = client_module(client_mode)
+    if client_mode == "openai":
+        module.openai_client.set_backends(backends)
+    else:
+        module.set_langchain_backends(backends)
+
+
+def client_setting(config, key: str, default=None):
+    """Reads a setting a client function was called with from config['configurable']."""
+    return ((config or {}).get("configurable") or {}).get(key, default)
+
+
+def bind_client_settings(client_fn: Callable, settings: dict) -> Callable:
+    """
+    Wraps a client function so every call carries an app's client settings.
+
+    The settings travel in config['configurable'] next to the per-request
+    ones (e.g. cache_bypass), so apps sharing the process-wide client modules
+    never see each other's settings.
+
+    Args:
+        client_fn: The client's streaming function
+        settings: Setting name to value, e.g. {"hedging": HedgingState(...)}
+
+    Returns:
+        A client function with the same signature
+    """
+    async def stream_with_settings(topic, config=None):
+        config = dict(config or {})
+        config["configurable"] = {**(config.get("configurable") or {}), **settings}
+        async with aclosing(client_fn(topic, config=config)) as events:
+            async for event in events:
+                yield event
+
+    stream_with_settings.__name__ = getattr(client_fn, "__name__", "client")
+    return stream_with_settings
+
+
+def build_sdk_clients(client_mode: str) -> list:
+    """Builds the selected client's objects now and returns its AsyncOpenAI clients, e.g. to warm them."""
+    spec = _spec(client_mode)
+    return getattr(spec.load(), spec.sdk_clients)()
+
+
+def share_http_client(http_client):
+    """
+    Points every imported client at a shared connection pool, or back to its
+    own with None. Clients that were never imported are left alone rather
+    than imported just to be configured.
+    """
+    for mode in loaded_clients():
+        spec = CLIENTS[mode]
+        getattr(spec.load(), spec.set_http_client)(http_client)
+
+
+def get_compiled_graph(client_fn):
+    """The shared compiled LangGraph workflow for a client function; imports LangGraph on first use."""
+    return importlib.import_module(LANGGRAPH_MODULE).get_compiled_graph(client_fn)
@@ -1,16 +1,20 @@
 # src/direct_execution.py
 import asyncio
 import logging
-from src.langgraph_impl import build_langgraph
+import sys
+from typing import Optional, TextIO
+from src.client_registry import get_compiled_graph, load_client
 from src.plain_impl import stream_plain
-from src.openai_client import stream_openai_tokens
-from src.langchain_openai_client import stream_langchain_tokens
+from src.response_cache import ResponseCache, cached_client
+from src.stream_recorder import StreamRecorder, recorded_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-async def run_direct(client_mode: str = "openai", use_langgraph: bool = False, topic: str = "dogs"):
+async def run_direct(client_mode: str = "openai", use_langgraph: bool = False, topic: str = "dogs",
+                     out: Optional[TextIO] = None, cache: Optional[ResponseCache] = None,
+                     recorder: Optional[StreamRecorder] = None):
     """
     Run the streaming in direct (CLI) mode.
     
@@ -18,38 +22,45 @@ async def run_direct(client_mode: str = "openai", use_langgraph: bool = False, t
         client_mode: The client to use ('openai' or 'langchain')
         use_langgraph: Whether to use LangGraph orchestration
         topic: The topic for content generation
+        out: Stream the output is written to (defaults to sys.stdout)
+        cache: Optional response cache in front of the client function
+        recorder: Optional recorder of the upstream stream, flushed before returning
     """
+    out = out or sys.stdout
     try:
-        # Select the appropriate client function
-        if client_mode == "openai":
-            client_fn = stream_openai_tokens
-        elif client_mode == "langchain":
-            client_fn = stream_langchain_tokens
-        else:
-            raise ValueError("Invalid client_mode; choose 'openai' or 'langchain'.")
+        # Select the appropriate client function; only its stack is imported
+        client_fn, params_fn = load_client(client_mode)
+
+        if recorder is not None:
+            recorder.start()
+            client_fn = recorded_client(client_fn, recorder, params_fn)
+        if cache is not None:
+            client_fn = cached_client(client_fn, cache, params_fn, namespace=client_mode)
 
         if use_langgraph:
             logger.info("Streaming via LangGraph")
-            print("Streaming via LangGraph:")  # Required header for tests
-            graph = build_langgraph(client_fn)
+            print("Streaming via LangGraph:", file=out)  # Required header for tests
+            graph = get_compiled_graph(client_fn)
             inputs = {
                 "topic": topic,
                 "client_fn": client_fn
             }
-            config = {"stream_mode": "messages"}
             
-            async for msg, metadata in graph.astream(inputs, stream_mode="messages"):
-                if msg.content:
-                    logger.debug(f"Received content: {msg.content}")
-                    print(msg.content, end="", flush=True)
+            async for event in graph.astream(inputs, stream_mode="custom"):
+                logger.debug(f"Received content: {event.text}")
+                print(event.text, end="", flush=True, file=out)
         else:
             logger.info("Streaming directly")
-            print("Streaming directly:")  # Required header for tests
-            async for token in stream_plain(topic, client_fn):
-                print(token, end="", flush=True)
+            print("Streaming directly:", file=out)  # Required header for tests
+            async for event in stream_plain(topic, client_fn):
+                text = f"Error: {event.error}" if event.error is not None else event.text
+                print(text, end="", flush=True, file=out)
                 
-        print()  # Newline after completion
+        print(file=out)  # Newline after completion
         
     except Exception as e:
         logger.error(f"Error in run_direct: {str(e)}")
-        print(f"Error: {str(e)}")
+        print(f"Error: {str(e)}", file=out)
+    finally:
+        if recorder is not None:
+            await recorder.aclose()
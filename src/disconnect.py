@@ -0,0 +1,47 @@
+# src/disconnect.py
+import asyncio
+import logging
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class CancellingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that cancels its body generator once the client disconnects.
+
+    Starlette also stops streaming on disconnect, but it does so by cancelling an
+    anyio task group. Inside a cancelled scope every later await is cancelled
+    again, so the cleanup of the generator chain (closing the LangGraph run,
+    the upstream HTTP response, the LangChain task) is cut short. Here the
+    streaming task is cancelled exactly once with plain asyncio, and the body
+    generator is then closed explicitly, so every finally block runs to
+    completion and the upstream request is released at once.
+    """
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        streaming = asyncio.ensure_future(self.stream_response(send))
+        disconnect = asyncio.ensure_future(self.listen_for_disconnect(receive))
+        try:
+            await asyncio.wait((streaming, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            streaming.cancel()
+            disconnect.cancel()
+            await asyncio.gather(streaming, disconnect, return_exceptions=True)
+            # A no-op if the generator finished; closes it if it was parked at a yield
+            await self.body_iterator.aclose()
+            # Unlike Starlette, run the background task on every exit path so it
+            # can release per-request resources
+            if self.background is not None:
+                await self.background()
+
+        if not streaming.cancelled():
+            error = streaming.exception()
+            if isinstance(error, OSError):
+                raise ClientDisconnect() from error
+            if error is not None:
+                raise error
@@ -1,88 +1,552 @@
 # src/fastapi_endpoint.py
 import logging
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import StreamingResponse
+import os
+import time
+from typing import Optional, Union
+from fastapi import FastAPI, Header, Query, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import asyncio
-from src.langgraph_impl import build_langgraph
+from contextlib import aclosing
+from starlette.background import BackgroundTask
+from src.admission import AdmissionController, AdmissionRejected, AdmissionTicket, estimate_tokens
+from src.backend_pool import BackendPool
+from src.client_registry import (bind_client_settings, build_sdk_clients, get_compiled_graph, load_client,
+                                  set_client_backends, share_http_client)
+from src.disconnect import CancellingStreamingResponse
+from src.flush_policy import FlushPolicy, apply_flush_policy, resolve_flush_policy
+from src.hedging import HedgingConfig, HedgingState
+from src.http_pool import HTTPPoolConfig, create_http_client
 from src.plain_impl import stream_plain
-from src.openai_client import stream_openai_tokens
-from src.langchain_openai_client import stream_langchain_tokens
+from src.response_cache import ResponseCache, cache_bypassed, cached_client, is_cached
+from src.single_flight import SingleFlight
+from src.sse import StreamRegistry, parse_last_event_id
+from src.stream_compression import (CompressionConfig, CompressionStats, StreamCompressor, available_encodings,
+                                    compress_stream, negotiate_encoding)
+from src.stream_recorder import StreamRecorder, recorded_client
+from src.metrics import StreamMetrics
+from src.token_event import TokenEvent
+from src.token_bridge import BridgeConfig, BridgeStats
+from src.warmup import WarmupConfig, WarmupState, run_warmup
+from src.ws_multiplex import MultiplexSession, MultiplexStats, StreamRejected, WebSocketConfig
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def create_app(client_mode: str = "openai", use_langgraph: bool = False):
-    """Create FastAPI application with streaming endpoint."""
+def create_app(client_mode: str = "openai", use_langgraph: bool = False,
+               flush_policy: Union[str, FlushPolicy] = "immediate",
+               http_pool: Optional[HTTPPoolConfig] = None,
+               cache: Optional[ResponseCache] = None,
+               coalesce_requests: bool = False,
+               sse_streams: Optional[StreamRegistry] = None,
+               metrics: Optional[StreamMetrics] = None,
+               bridge: Optional[BridgeConfig] = None,
+               admission: Optional[AdmissionController] = None,
+               hedging: Optional[HedgingConfig] = None,
+               backends: Optional[BackendPool] = None,
+               warmup: Optional[WarmupConfig] = None,
+               recorder: Optional[StreamRecorder] = None,
+               compression: Optional[CompressionConfig] = None,
+               websocket: Optional[WebSocketConfig] = None):
+    """
+    Create FastAPI application with streaming endpoint.
+
+    Args:
+        client_mode: The client to use ('openai' or 'langchain')
+        use_langgraph: Whether to use LangGraph orchestration
+        flush_policy: Default flush policy name or FlushPolicy for /stream;
+            requests may override it with the 'flush' query parameter
+        http_pool: Settings of the connection pool shared by both LLM clients
+            for the app's lifetime (defaults to HTTPPoolConfig.from_env())
+        cache: Optional response cache in front of the client function; a
+            request can skip it with the 'X-Cache-Bypass: 1' header
+        coalesce_requests: Share one upstream stream between identical
+            concurrent requests
+        sse_streams: Ring buffers backing resumable /sse streams (defaults to
+            a StreamRegistry with its default sizes)
+        metrics: Instrumentation exposed on /metrics (defaults to a new StreamMetrics)
+        bridge: Buffer size and overflow policy between LangChain's token
+            callback and the stream (defaults to BridgeConfig.from_env())
+        admission: Optional admission control; requests that would start an
+            upstream stream wait for it and are rejected with 429/503 and
+            Retry-After when they cannot be admitted in time
+        hedging: Hedging and retry settings of the OpenAI client before the
+            first token (defaults to retries only, no hedging)
+        backends: Optional pool of OpenAI-compatible backends to route the
+            client's requests across; each gets its own connection pool with
+            the http_pool settings
+        warmup: What to warm at startup before /ready reports ready
+            (defaults to WarmupConfig.from_env())
+        recorder: Optional recorder of sampled upstream streams; it sits
+            directly on the client, so cache hits and coalesced followers
+            are not recorded twice
+        compression: Negotiated compression of /stream responses (defaults
+            to CompressionConfig.from_env(), which leaves it off)
+        websocket: Stream and credit limits of the multiplexed /ws endpoint
+            (defaults to WebSocketConfig.from_env())
+    """
     app = FastAPI()
+    default_policy = resolve_flush_policy(flush_policy)
+    sse_streams = sse_streams or StreamRegistry()
+    app.state.sse_streams = sse_streams
+    metrics = metrics or StreamMetrics()
+    app.state.metrics = metrics
+    metrics.registry.gauge("llm_sse_streams_buffered", "SSE streams held for resumption.",
+                           callback=lambda: len(sse_streams.streams))
     
-    # Select client function based on flag
+    # Select client function based on flag; only the selected client's stack is imported
+    client_fn, params_fn = load_client(client_mode)
     if client_mode == "openai":
-        client_fn = stream_openai_tokens
-    elif client_mode == "langchain":
-        client_fn = stream_langchain_tokens
+        # Kept per app rather than on the process-wide client, so apps neither
+        # inherit each other's hedging nor report each other's hedges
+        hedging_state = HedgingState(hedging or HedgingConfig())
+        hedge_stats = hedging_state.stats
+        client_fn = bind_client_settings(client_fn, {"hedging": hedging_state})
+        registry = metrics.registry
+        registry.counter("llm_upstream_attempts_total", "Upstream requests started, including hedges and retries.",
+                         callback=lambda: hedge_stats.attempts)
+        registry.counter("llm_upstream_hedges_total", "Duplicate requests started because a first token was late.",
+                         callback=lambda: hedge_stats.hedges)
+        registry.counter("llm_upstream_hedge_wins_total", "Streams served by a hedged request.",
+                         callback=lambda: hedge_stats.hedge_wins)
+        registry.counter("llm_upstream_retries_total", "Retries after failures before the first token.",
+                         callback=lambda: hedge_stats.retries)
     else:
-        raise ValueError("Invalid client_mode. Use 'openai' or 'langchain'.")
+        # Same for the token buffer: each app applies its own settings and counts its own streams
+        bridge_stats = BridgeStats()
+        client_fn = bind_client_settings(client_fn, {"bridge": bridge or BridgeConfig.from_env(),
+                                                     "bridge_stats": bridge_stats})
+        registry = metrics.registry
+        registry.gauge("llm_langchain_buffer_depth", "Tokens buffered between callbacks and readers.",
+                       callback=lambda: bridge_stats.depth)
+        registry.gauge("llm_langchain_buffer_high_water", "Largest number of tokens buffered for one stream.",
+                       callback=lambda: bridge_stats.high_water)
+        registry.counter("llm_langchain_buffer_blocked_total", "Times a token callback waited for a slow reader.",
+                         callback=lambda: bridge_stats.blocked)
+        registry.counter("llm_langchain_buffer_coalesced_total", "Tokens merged because a buffer was full.",
+                         callback=lambda: bridge_stats.coalesced)
+        registry.counter("llm_langchain_buffer_aborted_total", "Streams aborted because a buffer was full.",
+                         callback=lambda: bridge_stats.aborted)
 
-    @app.get("/stream")
-    async def stream_joke(topic: str = Query("dogs", description="Topic for the joke")):
-        """Endpoint that streams generated content."""
-        logger.info(f"Received request for topic: {topic}")
-        
-        async def event_generator():
-            content_received = False
-            try:
-                if use_langgraph:
-                    logger.info("Using LangGraph for streaming")
-                    graph = build_langgraph(client_fn)
-                    inputs = {
-                        "topic": topic,
-                        "client_fn": client_fn
-                    }
-                    config = {"stream_mode": "messages"}
-                    
-                    async for msg, metadata in graph.astream(inputs, stream_mode="messages"):
-                        if msg.content:
+    # The warm-up probe goes straight to the client, past the cache and coalescing
+    upstream_fn = client_fn
+
+    if backends is not None:
+        app.state.backends = backends
+
+        @app.get("/backends")
+        async def backend_stats():
+            """Load, latency and health of each backend."""
+            return backends.stats()
+
+        def per_backend(value):
+            return lambda: {(b.name,): value(b) for b in backends.backends}
+
+        registry = metrics.registry
+        registry.gauge("llm_backend_outstanding", "Requests in flight per backend.", ("backend",),
+                       callback=per_backend(lambda b: b.outstanding))
+        registry.gauge("llm_backend_latency_seconds", "EWMA time to first token per backend.", ("backend",),
+                       callback=per_backend(lambda b: b.latency or 0.0))
+        registry.gauge("llm_backend_ejected", "1 while a backend is ejected by the health check.", ("backend",),
+                       callback=per_backend(lambda b: 0 if b.available(time.monotonic()) else 1))
+        registry.counter("llm_backend_requests_total", "Requests routed per backend.", ("backend",),
+                         callback=per_backend(lambda b: b.requests))
+        registry.counter("llm_backend_errors_total", "Failed requests per backend.", ("backend",),
+                         callback=per_backend(lambda b: b.errors))
+
+    if recorder is not None:
+        app.state.recorder = recorder
+        client_fn = recorded_client(client_fn, recorder, params_fn)
+
+        @app.get("/recorder/stats")
+        async def recorder_stats():
+            """Recorded, sampled-out and dropped streams and bytes written by the stream recorder."""
+            return recorder.stats()
+
+        registry = metrics.registry
+        registry.counter("llm_recorder_streams_total", "Streams handed to the recorder.",
+                         callback=lambda: recorder.recorded)
+        registry.counter("llm_recorder_dropped_total", "Streams dropped because the recorder buffer was full.",
+                         callback=lambda: recorder.dropped)
+        registry.gauge("llm_recorder_buffered_lines", "Recorded lines waiting to be written.",
+                       callback=lambda: recorder.buffered)
+        registry.counter("llm_recorder_bytes_written_total", "Uncompressed bytes written to the recordings.",
+                         callback=lambda: recorder.bytes_written)
+
+    if cache is not None:
+        client_fn = cached_client(client_fn, cache, params_fn, namespace=client_mode)
+
+        @app.get("/cache/stats")
+        async def cache_stats():
+            """Hit/miss counters and memory use of the response cache."""
+            return cache.stats()
+
+        metrics.registry.gauge("llm_cache_entries", "Entries in the response cache.", callback=lambda: len(cache))
+        metrics.registry.gauge("llm_cache_bytes", "Approximate memory used by the response cache.",
+                               callback=lambda: cache.stats()["bytes"])
+        metrics.registry.counter("llm_cache_hits_total", "Response cache hits.", callback=lambda: cache.hits)
+        metrics.registry.counter("llm_cache_misses_total", "Response cache misses.", callback=lambda: cache.misses)
+        if cache.matcher is not None:
+            matcher = cache.matcher
+            metrics.registry.counter("llm_cache_topic_hits_total", "Cache hits by lookup tier.", ("tier",),
+                                     callback=lambda: {("normalized",): matcher.normalized_hits,
+                                                       ("near",): matcher.near_hits})
+            metrics.registry.counter("llm_cache_near_lsh_rejected_total",
+                                     "LSH candidates rejected below the similarity threshold.",
+                                     callback=lambda: matcher.lsh_rejected)
+
+    if coalesce_requests:
+        app.state.single_flight = SingleFlight()
+        # Topics sharing a cache entry share a flight too
+        flight_topic = cache.matcher.normalize if cache is not None and cache.matcher is not None else None
+        client_fn = app.state.single_flight.wrap(client_fn, key_fn=flight_topic)
+        metrics.registry.gauge("llm_coalesced_flights_active", "Upstream streams shared by coalesced requests.",
+                               callback=lambda: len(client_fn.active_flights))
+
+    if admission is not None:
+        app.state.admission = admission
+        registry = metrics.registry
+        queue_wait = registry.histogram("llm_admission_queue_wait_seconds",
+                                        "Time requests waited for upstream admission.").labels()
+        admission_rejected = registry.counter("llm_admission_rejected_total",
+                                              "Requests rejected by admission control.", ("reason",))
+        registry.gauge("llm_admission_active", "Admitted upstream streams in progress.",
+                       callback=lambda: admission.active)
+        registry.gauge("llm_admission_queued", "Requests waiting for admission.", callback=lambda: admission.queued)
+
+    compression = compression or CompressionConfig.from_env()
+    compression_stats = CompressionStats()
+    offered_encodings = tuple(e for e in compression.encodings if e in available_encodings())
+    if compression.enabled and offered_encodings != compression.encodings:
+        logger.warning(f"Compression encodings {sorted(set(compression.encodings) - set(offered_encodings))} "
+                       f"need packages that are not installed; offering {list(offered_encodings)}")
+    if compression.enabled:
+        app.state.compression_stats = compression_stats
+
+        @app.get("/compression/stats")
+        async def compression_stats_endpoint():
+            """Bytes before and on the wire, ratio and compressor CPU per stream, by encoding."""
+            return compression_stats.stats()
+
+        def per_encoding(totals):
+            return lambda: {(encoding,): value for encoding, value in totals.items()}
+
+        registry = metrics.registry
+        registry.counter("llm_compressed_streams_total", "Compressed /stream responses.", ("encoding",),
+                         callback=per_encoding(compression_stats.streams))
+        registry.counter("llm_compression_bytes_in_total", "Response bytes before compression.", ("encoding",),
+                         callback=per_encoding(compression_stats.bytes_in))
+        registry.counter("llm_compression_bytes_out_total", "Compressed response bytes sent.", ("encoding",),
+                         callback=per_encoding(compression_stats.bytes_out))
+        registry.counter("llm_compression_cpu_seconds_total", "CPU time spent compressing responses.", ("encoding",),
+                         callback=per_encoding(compression_stats.cpu_time))
+
+    async def admit(topic: str, run_config: Optional[dict]) -> Optional[AdmissionTicket]:
+        """Waits for upstream admission, unless the request will not reach the upstream API."""
+        if admission is None:
+            return None
+        # Cache hits and requests joining a coalesced stream cost no upstream capacity
+        if (cache is not None and not cache_bypassed(run_config)
+                and is_cached(cache, client_mode, params_fn, topic)):
+            return None
+        if coalesce_requests and client_fn.flight_key(topic, run_config) in client_fn.active_flights:
+            return None
+        try:
+            ticket = await admission.acquire(estimate_tokens(params_fn(topic), admission.config.completion_tokens))
+        except AdmissionRejected as e:
+            admission_rejected.labels(e.reason).inc()
+            raise HTTPException(status_code=e.status_code, detail=str(e),
+                                headers={"Retry-After": str(e.retry_after)})
+        queue_wait.observe(ticket.wait)
+        return ticket
+
+    async def generate_tokens(topic: str, run_config: Optional[dict] = None,
+                              ticket: Optional[AdmissionTicket] = None):
+        """
+        Runs the configured path for a topic.
+
+        Args:
+            topic: Topic of the joke
+            run_config: Optional RunnableConfig for the client function
+            ticket: Admission to release when the stream ends
+
+        Yields:
+            A TokenEvent for each token with text and for each failure
+        """
+        content_received = False
+        observer = metrics.observer(client_mode, use_langgraph)
+        try:
+            if use_langgraph:
+                logger.info("Using LangGraph for streaming")
+                graph = get_compiled_graph(client_fn)
+                inputs = {
+                    "topic": topic,
+                    "client_fn": client_fn
+                }
+                
+                run = graph.astream(inputs, config=run_config, stream_mode=["custom", "updates"])
+                async with aclosing(run):
+                    async for mode, chunk in run:
+                        if mode == "custom":
+                            # call_model writes the client's TokenEvents to the custom stream
                             content_received = True
-                            logger.debug(f"Received content: {msg.content}")
-                            yield f"{msg.content}\n"
-                            await asyncio.sleep(0.3)  # Match the working example's delay
-                else:
-                    logger.info("Using direct streaming")
-                    async for token in stream_plain(topic, client_fn):
-                        if isinstance(token, dict):
-                            if "error" in token:
-                                logger.error(f"Streaming error: {token['error']}")
-                                yield f"Error: {token['error']}\n"
-                                content_received = True  # Error is still content
-                            elif "content" in token:
-                                content_received = True
-                                yield token["content"]
-                        else:
+                            observer.token()
+                            yield chunk
+                        elif "error" in (chunk.get("call_model") or {}):
                             content_received = True
-                            yield token
-                        await asyncio.sleep(0.01)
-                
-                if not content_received:
-                    logger.warning("No content received")
-                    yield "No content received from LLM\n"
-                    
-            except Exception as e:
-                error_msg = f"Error in stream_joke: {str(e)}"
-                logger.error(error_msg)
-                yield f"Error: {error_msg}\n"
+                            observer.error(chunk["call_model"]["error"])
+                            yield TokenEvent.failure(chunk["call_model"]["error"])
+            else:
+                logger.info("Using direct streaming")
+                async with aclosing(stream_plain(topic, client_fn, config=run_config)) as events:
+                    async for event in events:
+                        if event.error is not None:
+                            logger.error(f"Streaming error: {event.error}")
+                            content_received = True
+                            observer.error(event.error)
+                            yield event
+                        elif event.text:
+                            content_received = True
+                            observer.token()
+                            yield event
             
-            finally:
-                yield "\nEnd of stream\n"
+            if not content_received:
+                logger.warning("No content received")
+                observer.error("No content received from LLM")
+                yield TokenEvent.failure("No content received from LLM")
                 
-        return StreamingResponse(
-            event_generator(),
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away; closing the generators above cancels the
+            # LangGraph run and the upstream request
+            observer.cancel()
+            raise
+        except Exception as e:
+            error_msg = f"Error in stream_joke: {str(e)}"
+            logger.error(error_msg)
+            observer.error(error_msg)
+            yield TokenEvent.failure(error_msg)
+        finally:
+            observer.finish()
+            if ticket is not None:
+                ticket.release()
+
+    def request_config(x_cache_bypass: Optional[str]) -> Optional[dict]:
+        bypass_cache = x_cache_bypass is not None and x_cache_bypass.lower() in ("1", "true", "yes")
+        return {"configurable": {"cache_bypass": True}} if bypass_cache else None
+
+    @app.get("/stream")
+    async def stream_joke(
+        topic: str = Query("dogs", description="Topic for the joke"),
+        flush: Optional[str] = Query(None, description="Flush policy: 'immediate' or 'coalesce'"),
+        flush_bytes: Optional[int] = Query(None, ge=0, description="Max bytes per coalesced chunk"),
+        flush_ms: Optional[float] = Query(None, ge=0, description="Max milliseconds a token may be held back"),
+        x_cache_bypass: Optional[str] = Header(None, description="Set to 1 to skip the response cache"),
+        accept_encoding: Optional[str] = Header(None, description="Encodings the client can decode"),
+    ):
+        """
+        Endpoint that streams generated content.
+
+        With compression enabled the response is encoded with the best
+        encoding the client accepts, through one compressor per stream that
+        is flushed at every chunk the flush policy writes.
+        """
+        logger.info(f"Received request for topic: {topic}")
+        try:
+            policy = resolve_flush_policy(
+                flush or default_policy,
+                max_bytes=flush_bytes,
+                max_latency=None if flush_ms is None else flush_ms / 1000.0,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        run_config = request_config(x_cache_bypass)
+        ticket = await admit(topic, run_config)
+
+        async def token_generator():
+            async with aclosing(generate_tokens(topic, run_config, ticket)) as events:
+                async for event in events:
+                    if event.error is not None:
+                        yield f"Error: {event.error}\n"
+                    else:
+                        yield event.text
+
+        async def event_generator():
+            # Cancelled as soon as the client disconnects; the cancellation
+            # unwinds the whole chain down to the LLM request
+            try:
+                async for chunk in apply_flush_policy(token_generator(), policy):
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                logger.info(f"Client disconnected; cancelled stream for topic: {topic}")
+                raise
+            yield "\nEnd of stream\n"
+
+        body = event_generator()
+        headers = {"Cache-Control": "no-cache"}
+        encoding = None
+        if compression.enabled:
+            # The body depends on Accept-Encoding even when it goes out uncompressed,
+            # so shared caches must not hand an identity response to a gzip client
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate_encoding(accept_encoding, offered_encodings)
+        if encoding is not None:
+            body = compress_stream(body, StreamCompressor(encoding), compression_stats)
+            headers["Content-Encoding"] = encoding
+
+        return CancellingStreamingResponse(
+            body,
             media_type="text/plain",
-            headers={"Cache-Control": "no-cache"}
+            headers=headers,
+            # Releases the admission even if the body was never iterated
+            background=BackgroundTask(ticket.release) if ticket is not None else None,
         )
         
+    @app.get("/sse")
+    async def stream_joke_events(
+        request: Request,
+        topic: str = Query("dogs", description="Topic for the joke"),
+        last_event_id: Optional[str] = Header(None, description="Resume after this 'stream_id:seq' event"),
+        x_cache_bypass: Optional[str] = Header(None, description="Set to 1 to skip the response cache"),
+    ):
+        """
+        Server-Sent Events endpoint with numbered 'token' events and typed
+        'error' and 'done' events. Reconnecting with Last-Event-ID (header or
+        'last_event_id' query parameter) resumes the same generation from its
+        ring buffer instead of starting a new LLM call.
+        """
+        resume_from = last_event_id or request.query_params.get("last_event_id")
+        if resume_from:
+            resume = parse_last_event_id(resume_from)
+            stream = sse_streams.get(resume[0]) if resume else None
+            if stream is None:
+                raise HTTPException(status_code=404, detail=f"Stream for event '{resume_from}' is no longer available")
+            after_seq = resume[1]
+            logger.info(f"Resuming SSE stream {stream.stream_id} after event {after_seq}")
+        else:
+            logger.info(f"Received SSE request for topic: {topic}")
+            run_config = request_config(x_cache_bypass)
+            ticket = await admit(topic, run_config)
+            stream = sse_streams.start(generate_tokens(topic, run_config, ticket))
+            after_seq = 0
+
+        return StreamingResponse(
+            sse_streams.subscribe(stream, after_seq),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Stream-Id": stream.stream_id}
+        )
+
+    websocket = websocket or WebSocketConfig.from_env()
+    ws_stats = MultiplexStats()
+    app.state.ws_stats = ws_stats
+    registry = metrics.registry
+    registry.gauge("llm_websocket_connections", "Open /ws connections.", callback=lambda: ws_stats.connections)
+    registry.gauge("llm_websocket_streams_active", "Generations running over /ws connections.",
+                   callback=lambda: ws_stats.active)
+    registry.counter("llm_websocket_streams_total", "Generations started over /ws connections.",
+                     callback=lambda: ws_stats.started)
+    registry.counter("llm_websocket_cancelled_total", "/ws generations cancelled by the client.",
+                     callback=lambda: ws_stats.cancelled)
+    registry.counter("llm_websocket_credit_stalls_total", "Times a /ws stream waited for flow-control credit.",
+                     callback=lambda: ws_stats.credit_stalls)
+
+    @app.websocket("/ws")
+    async def stream_joke_multiplexed(ws: WebSocket):
+        """
+        Multiplexes many generations over one WebSocket connection, each with
+        its own stream id, cancellation and credit-based flow control. The
+        generations run the same path as /stream; see MultiplexSession for
+        the message format.
+        """
+        await ws.accept()
+
+        async def open_stream(topic: str, cache_bypass: bool):
+            logger.info(f"Received WebSocket stream for topic: {topic}")
+            run_config = request_config("1" if cache_bypass else None)
+            try:
+                ticket = await admit(topic, run_config)
+            except HTTPException as e:
+                raise StreamRejected(e.detail, e.status_code, (e.headers or {}).get("Retry-After"))
+            return generate_tokens(topic, run_config, ticket)
+
+        session = MultiplexSession(ws.send_json, open_stream, websocket, ws_stats)
+        ws_stats.connections += 1
+        try:
+            while True:
+                await session.handle_text(await ws.receive_text())
+        except WebSocketDisconnect:
+            logger.info(f"WebSocket client disconnected; cancelling {len(session.streams)} stream(s)")
+        finally:
+            ws_stats.connections -= 1
+            # Cancels the generations still running, down to their upstream requests
+            await session.aclose()
+
+    warmup = warmup or WarmupConfig.from_env()
+    warmup_state = WarmupState()
+    app.state.warmup = warmup_state
+    metrics.registry.gauge("llm_ready", "1 once the warm-up has finished successfully.",
+                           callback=lambda: 1 if warmup_state.ready else 0)
+    metrics.registry.gauge("llm_warmup_duration_seconds", "Time the startup warm-up took.",
+                           callback=lambda: warmup_state.duration or 0.0)
+
+    @app.get("/ready")
+    async def readiness():
+        """Readiness probe: 200 once the warm-up is done, 503 while warming or after a failed probe."""
+        return JSONResponse(warmup_state.stats(), status_code=200 if warmup_state.ready else 503)
+
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        """Prometheus text exposition of the streaming metrics."""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
     @app.on_event("startup")
     async def startup_event():
-        logger.info(f"Starting FastAPI app with client_mode={client_mode}, use_langgraph={use_langgraph}")
+        # Runs in every worker process, so each one warms up before serving
+        logger.info(f"Starting FastAPI app in worker {os.getpid()} with client_mode={client_mode}, "
+                    f"use_langgraph={use_langgraph}, flush_policy={default_policy}")
+        if use_langgraph:
+            # Compile once up front so no request pays for it
+            get_compiled_graph(client_fn)
+
+        # One warm connection pool for the loaded clients, owned by the app
+        app.state.http_client = create_http_client(http_pool)
+        share_http_client(app.state.http_client)
+        # Set even without a pool, so the app never routes through a pool an
+        # earlier app in this process left on the client module
+        set_client_backends(client_mode, backends)
+        if backends is not None:
+            backends.open_http_clients(http_pool)
+        if recorder is not None:
+            recorder.start()
+
+        # Builds the client objects and opens upstream connections (and
+        # optionally sends a probe) so the first requests don't pay for it
+        warming = run_warmup(warmup, warmup_state, lambda: build_sdk_clients(client_mode), upstream_fn)
+        if warmup.block_startup:
+            await warming
+        else:
+            app.state.warmup_task = asyncio.create_task(warming)
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        # Uvicorn has already let in-flight requests finish (up to its graceful
+        # shutdown timeout); SSE generations nobody can resume any more are
+        # cancelled so their upstream requests are closed cleanly
+        await sse_streams.close()
+        warmup_task = getattr(app.state, "warmup_task", None)
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+            await asyncio.gather(warmup_task, return_exceptions=True)
+        if recorder is not None:
+            await recorder.aclose()
+        set_client_backends(client_mode, None)
+        if backends is not None:
+            await backends.aclose_http_clients()
+        http_client = getattr(app.state, "http_client", None)
+        if http_client is None:
+            return
+        share_http_client(None)
+        await http_client.aclose()
+        app.state.http_client = None
+        logger.info("Closed HTTP connection pool")
         
     return app
@@ -0,0 +1,172 @@
+# src/flush_policy.py
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterable, Optional, Union
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    """
+    Decides when buffered tokens are written to the client.
+
+    A policy with ``max_bytes == 0`` flushes every token immediately. Otherwise
+    tokens are coalesced into one chunk until either ``max_bytes`` (UTF-8) have
+    been buffered or ``max_latency`` seconds have passed since the first
+    buffered token, whichever comes first.
+
+    Attributes:
+        max_bytes: Size threshold of a coalesced chunk (0 disables coalescing)
+        max_latency: Maximum time in seconds a token may wait in the buffer
+    """
+    max_bytes: int = 0
+    max_latency: float = 0.0
+
+    @property
+    def immediate(self) -> bool:
+        return self.max_bytes <= 0 or self.max_latency <= 0
+
+
+IMMEDIATE = FlushPolicy()
+COALESCE = FlushPolicy(max_bytes=1024, max_latency=0.05)
+
+FLUSH_POLICIES = {
+    "immediate": IMMEDIATE,
+    "coalesce": COALESCE,
+}
+
+
+def resolve_flush_policy(
+    policy: Union[str, FlushPolicy, None] = None,
+    max_bytes: Optional[int] = None,
+    max_latency: Optional[float] = None,
+) -> FlushPolicy:
+    """
+    Resolves a policy name or instance, optionally overriding its thresholds.
+
+    Args:
+        policy: A name from FLUSH_POLICIES, a FlushPolicy, or None for 'immediate'
+        max_bytes: Optional override of the policy's max_bytes
+        max_latency: Optional override of the policy's max_latency (seconds)
+
+    Returns:
+        The resolved FlushPolicy
+    """
+    if policy is None:
+        resolved = IMMEDIATE
+    elif isinstance(policy, FlushPolicy):
+        resolved = policy
+    elif policy in FLUSH_POLICIES:
+        resolved = FLUSH_POLICIES[policy]
+    else:
+        raise ValueError(
+            f"Invalid flush policy '{policy}'; choose one of {sorted(FLUSH_POLICIES)}."
+        )
+
+    if max_bytes is not None or max_latency is not None:
+        # Overrides without a base policy imply coalescing with defaults
+        base = COALESCE if resolved.immediate else resolved
+        resolved = FlushPolicy(
+            max_bytes=base.max_bytes if max_bytes is None else max_bytes,
+            max_latency=base.max_latency if max_latency is None else max_latency,
+        )
+    return resolved
+
+
+async def _close_source(source):
+    aclose = getattr(source, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+# Put by the reader task once the source is exhausted
+_END = object()
+
+
+async def _read_source(iterator, queue: asyncio.Queue):
+    """Iterates the source in one task and hands each token, or its failure, to the consumer."""
+    try:
+        async for token in iterator:
+            await queue.put(token)
+    except Exception as e:
+        await queue.put(e)
+        return
+    finally:
+        await _close_source(iterator)
+    await queue.put(_END)
+
+
+async def apply_flush_policy(source: AsyncIterable[str], policy: FlushPolicy) -> AsyncGenerator[str, None]:
+    """
+    Re-chunks a stream of text tokens according to a flush policy.
+
+    The latency window is enforced even while the source is idle: a single
+    reader task iterates the source and feeds a small queue, and only the
+    wait on that queue times out, so the source generator is never
+    interrupted by a flush. When this generator is closed or cancelled, the
+    reader is cancelled and awaited, so the source has unwound before it returns.
+
+    Args:
+        source: Async iterable of text tokens
+        policy: The FlushPolicy to apply
+
+    Yields:
+        Text chunks ready to be written to the client
+    """
+    if policy.immediate:
+        try:
+            async for token in source:
+                yield token
+        finally:
+            await _close_source(source)
+        return
+
+    loop = asyncio.get_running_loop()
+    # Bounded so the source is read at most one token ahead of the client
+    queue = asyncio.Queue(maxsize=1)
+    reader = asyncio.create_task(_read_source(source.__aiter__(), queue))
+    buffer = []
+    buffered_bytes = 0
+    deadline = 0.0
+
+    try:
+        while True:
+            if not buffer:
+                item = await queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    # Latency window expired while waiting for the next token
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered_bytes = 0
+                    continue
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                continue
+            if not buffer:
+                deadline = loop.time() + policy.max_latency
+            buffer.append(item)
+            buffered_bytes += len(item.encode("utf-8"))
+
+            if buffered_bytes >= policy.max_bytes or loop.time() >= deadline:
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+
+        if buffer:
+            yield "".join(buffer)
+
+    finally:
+        reader.cancel()
+        # Let the source unwind (releasing its upstream request) before returning
+        await asyncio.gather(reader, return_exceptions=True)
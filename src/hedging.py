@@ -0,0 +1,191 @@
+# src/hedging.py
+import asyncio
+import logging
+import math
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Set
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HedgingConfig:
+    """
+    Hedging and retry settings for the phase before a stream's first token.
+
+    Attributes:
+        hedge: Start a duplicate request when the first token is late
+        hedge_after: Fixed delay in seconds before hedging; None uses the
+            rolling ``hedge_percentile`` of recent times to first token
+        hedge_percentile: Percentile of the rolling window used as the delay
+        initial_hedge_after: Delay used until the window has ``min_samples``
+        min_samples: Samples needed before the rolling percentile is trusted
+        window: Number of recent times to first token kept
+        max_hedges: Duplicate requests allowed per stream
+        max_retries: Retries after failures before the first token
+        backoff_base: First retry delay in seconds (grows exponentially)
+        backoff_max: Upper bound of a retry delay
+    """
+    hedge: bool = False
+    hedge_after: Optional[float] = None
+    hedge_percentile: float = 95.0
+    initial_hedge_after: float = 2.0
+    min_samples: int = 20
+    window: int = 200
+    max_hedges: int = 1
+    max_retries: int = 2
+    backoff_base: float = 0.2
+    backoff_max: float = 2.0
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return rng.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Rolling window of times to first token."""
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        # Nearest-rank percentile
+        rank = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+
+class HedgeStats:
+    def __init__(self):
+        self.attempts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.retries = 0
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+        }
+
+
+class HedgingState:
+    """
+    Hedging settings together with the rolling times to first token and the
+    counters they act on, e.g. one set per app.
+
+    Args:
+        config: The HedgingConfig to apply
+        stats: Counters to update (defaults to new ones)
+    """
+    def __init__(self, config: HedgingConfig = HedgingConfig(), stats: Optional[HedgeStats] = None):
+        self.config = config
+        self.first_token_latency = LatencyTracker(config.window)
+        self.stats = stats or HedgeStats()
+
+
+def hedge_delay(config: HedgingConfig, tracker: LatencyTracker) -> float:
+    if config.hedge_after is not None:
+        return config.hedge_after
+    if len(tracker.samples) < config.min_samples:
+        return config.initial_hedge_after
+    return tracker.percentile(config.hedge_percentile)
+
+
+async def race_first(start: Callable[[], Awaitable[Any]], config: HedgingConfig, tracker: LatencyTracker,
+                     stats: HedgeStats, is_retryable: Callable[[BaseException], bool] = lambda e: True,
+                     discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+    """
+    Runs ``start`` until one attempt reaches its first token, hedging and retrying as configured.
+
+    ``start`` opens a request and returns once its first token has arrived.
+    If that takes longer than the hedge delay, a duplicate attempt is started;
+    the first attempt to succeed wins and the others are cancelled. Failed
+    attempts are retried with jittered backoff while no other attempt is
+    still running.
+
+    Args:
+        start: Coroutine function performing one attempt
+        config: Hedging and retry settings
+        tracker: Rolling times to first token; the winner's time is recorded
+        stats: Counters to update
+        is_retryable: Whether a failure may be retried
+        discard: Releases the result of an attempt that finished after the
+            winner (e.g. closes its HTTP response)
+
+    Returns:
+        The result of the winning attempt
+
+    Raises:
+        The last failure if no attempt succeeded
+    """
+    loop = asyncio.get_running_loop()
+    running: Set[asyncio.Task] = set()
+    started_at = {}
+    hedges = 0
+    retries = 0
+    last_error: Optional[BaseException] = None
+
+    def launch():
+        stats.attempts += 1
+        task = asyncio.ensure_future(start())
+        started_at[task] = loop.time()
+        running.add(task)
+        return task
+
+    first = launch()
+    try:
+        while True:
+            can_hedge = config.hedge and hedges < config.max_hedges
+            timeout = None
+            if can_hedge:
+                timeout = max(0.0, started_at[first] + hedge_delay(config, tracker) * (hedges + 1) - loop.time())
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                hedges += 1
+                stats.hedges += 1
+                logger.info("No first token yet; starting a hedged request")
+                launch()
+                continue
+
+            for task in done:
+                running.discard(task)
+                if task.exception() is None:
+                    tracker.record(loop.time() - started_at[task])
+                    if task is not first:
+                        stats.hedge_wins += 1
+                    return task.result()
+                last_error = task.exception()
+
+            if running:
+                continue
+            if retries >= config.max_retries or not is_retryable(last_error):
+                raise last_error
+            delay = backoff_delay(retries, config.backoff_base, config.backoff_max)
+            retries += 1
+            stats.retries += 1
+            logger.warning(f"Upstream attempt failed before the first token ({last_error}); "
+                           f"retry {retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            first = launch()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            results = await asyncio.gather(*running, return_exceptions=True)
+            if discard is not None:
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
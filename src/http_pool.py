@@ -0,0 +1,76 @@
+# src/http_pool.py
+import importlib.util
+import logging
+import os
+from dataclasses import dataclass
+
+import httpx
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class HTTPPoolConfig:
+    """
+    Settings of the pooled transport shared by the LLM clients.
+
+    Attributes:
+        max_connections: Upper bound on open connections to the upstream API
+        max_keepalive_connections: Idle connections kept warm for reuse
+        keepalive_expiry: Seconds an idle connection is kept before closing
+        http2: Negotiate HTTP/2 (requires the optional 'h2' package)
+        connect_timeout: Seconds allowed to establish a connection
+        read_timeout: Seconds allowed between received bytes
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "HTTPPoolConfig":
+        """Builds a config from LLM_HTTP_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            max_connections=int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", defaults.max_keepalive_connections)),
+            keepalive_expiry=float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            http2=os.environ.get("LLM_HTTP2", "0").lower() in ("1", "true", "yes"),
+            connect_timeout=float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT", defaults.connect_timeout)),
+            read_timeout=float(os.environ.get("LLM_HTTP_READ_TIMEOUT", defaults.read_timeout)),
+        )
+
+
+def create_http_client(config: HTTPPoolConfig = None) -> httpx.AsyncClient:
+    """
+    Creates the pooled async HTTP client.
+
+    The caller owns the client and must close it with ``await client.aclose()``.
+
+    Args:
+        config: Pool settings (defaults to HTTPPoolConfig.from_env())
+
+    Returns:
+        An httpx.AsyncClient with the configured limits
+    """
+    config = config or HTTPPoolConfig.from_env()
+    http2 = config.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+
+    logger.info(f"Creating HTTP pool: max_connections={config.max_connections}, "
+                f"keepalive={config.max_keepalive_connections}, http2={http2}")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+    )
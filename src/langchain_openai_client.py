@@ -1,95 +1,234 @@
 # src/langchain_openai_client.py
 import asyncio
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from langchain_openai import ChatOpenAI
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
 import httpx
+from src.backend_pool import Backend, BackendPool
+from src.client_registry import client_setting
+from src.token_bridge import BridgeConfig, TokenBridge, bridge_stats
+from src.token_event import TokenEvent
 
 # For disabling SSL verification when needed:
 # http_client = httpx.AsyncClient(verify=False)
 
+LANGCHAIN_MODEL = "gpt-4o-mini-2024-07-18"
+
+# Endpoint overrides for ChatOpenAI; None falls back to OPENAI_BASE_URL/OPENAI_API_KEY
+_client_settings = {}
+
+# Shared ChatOpenAI instance while a pooled client is set; reset when the settings change
+_model = None
+
+# Size and overflow policy of the buffer between the token callback and the stream
+_bridge_config = BridgeConfig.from_env()
+
+# Optional pool of backends that requests are routed across
+_backends: Optional[BackendPool] = None
+
+def configure_langchain_client(base_url: Optional[str] = None, api_key: Optional[str] = None):
+    """
+    Points the LangChain client at another OpenAI-compatible endpoint, e.g. the replay server.
+
+    Args:
+        base_url: API base URL (None falls back to OPENAI_BASE_URL)
+        api_key: API key (None falls back to OPENAI_API_KEY)
+    """
+    global _model
+    http_async_client = _client_settings.get("http_async_client")
+    _client_settings.clear()
+    if base_url is not None:
+        _client_settings["base_url"] = base_url
+    if api_key is not None:
+        _client_settings["api_key"] = api_key
+    if http_async_client is not None:
+        _client_settings["http_async_client"] = http_async_client
+    _model = None
+
+def set_langchain_http_client(http_client: Optional[httpx.AsyncClient]):
+    """
+    Routes ChatOpenAI requests through a shared, externally owned connection pool.
+
+    Args:
+        http_client: The pooled client, or None to go back to LangChain's default
+    """
+    global _model
+    if http_client is None:
+        _client_settings.pop("http_async_client", None)
+    else:
+        _client_settings["http_async_client"] = http_client
+    _model = None
+
+def set_bridge_config(config: BridgeConfig):
+    """
+    Sets the buffer size and overflow policy used by new LangChain streams.
+
+    Args:
+        config: The BridgeConfig to apply
+    """
+    global _bridge_config
+    _bridge_config = config
+
+def set_langchain_backends(backends: Optional[BackendPool]):
+    """
+    Routes LangChain requests across a pool of backends.
+
+    Args:
+        backends: The BackendPool, or None to go back to the single endpoint
+    """
+    global _backends
+    _backends = backends
+
+def langchain_request_params(topic: str) -> dict:
+    """Request parameters of stream_langchain_tokens for a topic, e.g. for cache keys."""
+    return {
+        "model": LANGCHAIN_MODEL,
+        "messages": [{"role": "user", "content": f"Tell me a joke about {topic}"}],
+    }
+
+def _backend_model(backend: Backend) -> ChatOpenAI:
+    model = backend.clients.get("langchain")
+    if model is not None:
+        return model
+    settings = {"base_url": backend.base_url, "api_key": backend.api_key}
+    if backend.http_client is not None:
+        settings["http_async_client"] = backend.http_client
+    model = ChatOpenAI(
+        model=backend.model or LANGCHAIN_MODEL,
+        streaming=True,
+        request_timeout=30.0,
+        **{k: v for k, v in settings.items() if v is not None},
+    )
+    # Same rule as below: only a model on the backend's own pool is shared
+    if backend.http_client is not None:
+        backend.clients["langchain"] = model
+    return model
+
+def get_langchain_model(backend: Optional[Backend] = None) -> ChatOpenAI:
+    """
+    Returns the streaming ChatOpenAI model.
+
+    With a shared pool set, one instance (and so one transport) serves every
+    request; callbacks are passed per call through the RunnableConfig. Without
+    one, a fresh model is built per call, since a private transport must not
+    outlive the event loop it was created on.
+
+    Args:
+        backend: Backend of a BackendPool to build the model for, instead of
+            the configured single endpoint
+    """
+    global _model
+    if backend is not None:
+        return _backend_model(backend)
+    if _model is not None:
+        return _model
+    model = ChatOpenAI(
+        model=LANGCHAIN_MODEL,
+        streaming=True,
+        request_timeout=30.0,
+        # base_url="http://t1cim-wncchat.wneweb.com.tw/v1", 
+        # api_key=os.environ['ORION_CTH_API_KEY'],
+        # http_async_client=http_client
+        **_client_settings,
+    )
+    if "http_async_client" in _client_settings:
+        _model = model
+    return model
+
+def langchain_sdk_clients() -> list:
+    """
+    Builds the ChatOpenAI models requests will use (one per backend with a
+    pool) and returns their underlying AsyncOpenAI clients.
+    """
+    if _backends is not None:
+        return [get_langchain_model(b).root_async_client for b in _backends.backends]
+    return [get_langchain_model().root_async_client]
+
 class QueueCallbackHandler(BaseCallbackHandler):
-    """Callback handler that pushes tokens to an asyncio queue."""
-    def __init__(self, queue: asyncio.Queue):
-        self.queue = queue
+    """Callback handler that pushes tokens into a bounded TokenBridge as TokenEvents."""
+    def __init__(self, bridge: TokenBridge):
+        self.bridge = bridge
+        self.index = 0
 
     async def on_llm_new_token(self, token: str, **kwargs):
-        # Push the token to the queue with content wrapper
-        await self.queue.put({"content": token})
-        await asyncio.sleep(0.1)
+        chunk = kwargs.get("chunk")
+        info = chunk.generation_info if chunk is not None and chunk.generation_info else None
+        finish_reason = info.get("finish_reason") if info else None
+        # Awaited by LangChain before it reads the next chunk, so a full bridge
+        # under the 'block' policy holds back the upstream read
+        await self.bridge.put(TokenEvent(token, self.index, finish_reason))
+        self.index += 1
+
+def _generation_error(task: asyncio.Task) -> Optional[str]:
+    if task.cancelled():
+        return None
+    error = task.exception()
+    return f"Error during generation: {str(error)}" if error is not None else None
 
-async def stream_langchain_tokens(topic: str, config: RunnableConfig = None) -> AsyncGenerator[dict, None]:
+async def stream_langchain_tokens(topic: str, config: RunnableConfig = None) -> AsyncGenerator[TokenEvent, None]:
     """
     Streams tokens using LangChain's ChatOpenAI client with streaming enabled.
-    Tokens are yielded as they are received via the callback.
+    Tokens are yielded as they are received via the callback, through a
+    bounded TokenBridge configured with set_bridge_config, unless the config
+    carries its own BridgeConfig and BridgeStats (e.g. an app's) in
+    config['configurable']['bridge'] and ['bridge_stats'].
 
     Args:
         topic (str): The topic for the joke.
         config (RunnableConfig, optional): Configuration for the runnable.
 
     Yields:
-        dict: Each token wrapped in a dict with 'content' or 'error' key
+        TokenEvent: One per token, or a failure event
     """
-    queue = asyncio.Queue()
-    handler = QueueCallbackHandler(queue)
+    bridge = TokenBridge(client_setting(config, "bridge", _bridge_config),
+                         client_setting(config, "bridge_stats", bridge_stats))
+    handler = QueueCallbackHandler(bridge)
     content_received = False
-    error = None
+    failed = False
+    generate_task = None
+    lease = _backends.acquire() if _backends is not None else None
 
     try:
-        model = ChatOpenAI(
-            model="gpt-4o-mini-2024-07-18",
-            streaming=True,
-            callbacks=[handler],
-            request_timeout=30.0,
-            # base_url="http://t1cim-wncchat.wneweb.com.tw/v1", 
-            # api_key=os.environ['ORION_CTH_API_KEY'],
-            # http_async_client=http_client
-        )
+        model = get_langchain_model(lease and lease.backend)
 
         generate_task = asyncio.create_task(
             model.ainvoke(
-                [{"role": "user", "content": f"Tell me a joke about {topic}"}],
-                config=config
+                langchain_request_params(topic)["messages"],
+                config=merge_configs(config, {"callbacks": [handler]})
             )
         )
+        # Ends the bridge when generation finishes; no sentinel task needed
+        generate_task.add_done_callback(lambda task: bridge.close(_generation_error(task)))
+        bridge.on_abort = generate_task.cancel
+
+        async for event in bridge:
+            if event.error is not None:
+                failed = True
+            else:
+                if lease is not None and not content_received:
+                    lease.first_token()
+                content_received = True
+            yield event
 
-        async def put_sentinel():
-            try:
-                await generate_task
-                await queue.put(None)
-            except Exception as e:
-                nonlocal error
-                error = e
-                await queue.put(None)
-
-        sentinel_task = asyncio.create_task(put_sentinel())
-
-        while True:
-            try:
-                token = await asyncio.wait_for(queue.get(), timeout=30.0)
-                if token is None:
-                    break
-                if isinstance(token, dict) and "content" in token:
-                    content_received = True
-                    yield token
-            except asyncio.TimeoutError:
-                yield {"error": "Timeout waiting for tokens"}
-                break
-
-        if error:
-            yield {"error": f"Error during generation: {str(error)}"}
-        elif not content_received:
-            yield {"error": "No content received from API"}
+        if not content_received and not failed:
+            yield TokenEvent.failure("No content received from API", handler.index)
 
     except Exception as e:
+        if lease is not None:
+            lease.fail(e)
         error_msg = f"Connection error: {str(e)}"
         print(f"Error in stream_langchain_tokens: {error_msg}")
-        yield {"error": error_msg}
+        yield TokenEvent.failure(error_msg, handler.index)
 
     finally:
-        if 'generate_task' in locals():
+        bridge.release()
+        if generate_task is not None:
             generate_task.cancel()
-        if 'sentinel_task' in locals():
-            sentinel_task.cancel()
+        if lease is not None:
+            if generate_task is not None and generate_task.done() and not generate_task.cancelled() \
+                    and generate_task.exception() is not None:
+                lease.fail(generate_task.exception())
+            lease.release()
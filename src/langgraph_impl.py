@@ -1,6 +1,9 @@
 # src/langgraph_impl.py
 import logging
+import threading
+from contextlib import aclosing
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import StreamWriter
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import AIMessage
 
@@ -8,13 +11,18 @@ from langchain_core.messages import AIMessage
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-async def call_model(state, config: RunnableConfig):
+async def call_model(state, config: RunnableConfig, writer: StreamWriter):
     """
     A LangGraph node that uses a client function to generate content.
+
+    Each TokenEvent with text is forwarded to the graph's "custom" stream as it arrives, so
+    streaming does not depend on the client emitting LangChain LLM callbacks
+    (e.g. the raw OpenAI client, or tokens replayed from the response cache).
     
     Args:
         state: The current state containing topic and client function
         config: RunnableConfig for proper streaming
+        writer: LangGraph stream writer for the "custom" stream mode
     
     Returns:
         Dict containing the generated content or error
@@ -28,18 +36,17 @@ async def call_model(state, config: RunnableConfig):
     
     try:
         logger.info(f"Generating content for topic: {topic}")
-        full_response = ""
-        async for token in client_fn(topic, config=config):
-            if isinstance(token, dict):
-                if "error" in token:
-                    logger.error(f"Error from client: {token['error']}")
-                    return {"error": token["error"]}
-                elif "content" in token:
-                    logger.debug(f"Received token: {token['content']}")
-                    full_response += token["content"]
-            elif isinstance(token, str):
-                logger.debug(f"Received string token: {token}")
-                full_response += token
+        # Collect parts and join once at the end; += on str is quadratic in the response length
+        parts = []
+        async with aclosing(client_fn(topic, config=config)) as events:
+            async for event in events:
+                if event.error is not None:
+                    logger.error(f"Error from client: {event.error}")
+                    return {"error": event.error}
+                if event.text:
+                    writer(event)
+                    parts.append(event.text)
+        full_response = "".join(parts)
         
         if not full_response.strip():
             logger.warning("No content received from client")
@@ -73,3 +80,37 @@ def build_langgraph(client_fn):
     
     logger.info("Built LangGraph workflow")
     return workflow
+
+
+# Compiled workflows keyed by graph builder. A compiled graph holds no per-run
+# state and gets the client function through its input state, so one instance
+# is shared by all concurrent requests and every client wrapper. Keying on the
+# client function would keep a graph alive for each app's wrapper closures.
+_compiled_graphs = {}
+_compiled_graphs_lock = threading.Lock()
+
+def get_compiled_graph(client_fn, builder=build_langgraph):
+    """
+    Returns the compiled workflow of a graph builder, compiling it on first use.
+    
+    Args:
+        client_fn: The client function runs will pass in their state; the
+            graph does not depend on it
+        builder: The graph definition, a function that compiles a workflow
+        
+    Returns:
+        The shared compiled LangGraph workflow
+    """
+    graph = _compiled_graphs.get(builder)
+    if graph is None:
+        with _compiled_graphs_lock:
+            graph = _compiled_graphs.get(builder)
+            if graph is None:
+                graph = builder(client_fn)
+                _compiled_graphs[builder] = graph
+    return graph
+
+def clear_compiled_graphs():
+    """Drops all cached workflows so the next request recompiles them."""
+    with _compiled_graphs_lock:
+        _compiled_graphs.clear()
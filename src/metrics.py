@@ -0,0 +1,275 @@
+# src/metrics.py
+import bisect
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for token streaming (sub-ms gaps to minute-long streams)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # A metric may read its value from a callback at scrape time; with
+        # labelnames the callback returns a {label_values_tuple: value} mapping
+        self.callback = callback
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values, **kwargs):
+        """Returns the child for a label combination; cache it outside hot loops."""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.callback is not None:
+            if not self.labelnames:
+                lines.append(f"{self.name} {_format_value(self.callback())}")
+                return lines
+            for values, value in sorted(self.callback().items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+            return lines
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # One bisect and three increments: cheap enough for the per-token loop
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with cumulative Prometheus exposition."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together in the Prometheus text format."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (),
+                callback: Optional[Callable[[], Any]] = None) -> Counter:
+        return self.register(Counter(name, help, labelnames, callback))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_ERROR_CODE_RE = re.compile(r"Error code: (\d{3})")
+
+
+def classify_error(message: str) -> str:
+    """Maps an error message from the clients to a low-cardinality error type label."""
+    match = _ERROR_CODE_RE.search(message)
+    if match:
+        return f"http_{match.group(1)}"
+    lowered = message.lower()
+    if "timeout" in lowered or "timed out" in lowered:
+        return "timeout"
+    if "connection" in lowered:
+        return "connection"
+    if "no content" in lowered:
+        return "empty_response"
+    return "other"
+
+
+STREAM_LABELS = ("client_mode", "langgraph")
+
+
+class StreamMetrics:
+    """
+    Streaming instrumentation: latency histograms, token counts, active
+    streams and upstream errors, labeled by client_mode and langgraph.
+
+    Args:
+        registry: Registry to add the metrics to (a new one by default)
+    """
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.ttft = r.histogram("llm_stream_time_to_first_token_seconds",
+                                "Time from request start to the first token.", STREAM_LABELS)
+        self.inter_token = r.histogram("llm_stream_inter_token_seconds",
+                                       "Gap between consecutive tokens of a stream.", STREAM_LABELS)
+        self.duration = r.histogram("llm_stream_duration_seconds",
+                                    "Total duration of a stream.", STREAM_LABELS)
+        self.tokens = r.histogram("llm_stream_tokens", "Tokens per stream.", STREAM_LABELS,
+                                  buckets=TOKEN_COUNT_BUCKETS)
+        self.active = r.gauge("llm_streams_active", "Streams currently being generated.", STREAM_LABELS)
+        self.streams = r.counter("llm_streams_total", "Finished streams by outcome.", STREAM_LABELS + ("status",))
+        self.errors = r.counter("llm_upstream_errors_total", "Upstream errors by type.",
+                                STREAM_LABELS + ("error_type",))
+        self.cancelled = r.counter("llm_streams_cancelled_by_client_total",
+                                   "Streams whose client disconnected before the end.", STREAM_LABELS)
+
+    def observer(self, client_mode: str, langgraph: bool) -> "StreamObserver":
+        """Starts observing one stream."""
+        return StreamObserver(self, client_mode, "true" if langgraph else "false")
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class StreamObserver:
+    """Records one stream; resolves its labeled children once so per-token calls stay cheap."""
+    __slots__ = ("metrics", "labels", "start", "last", "count", "failed", "finished",
+                 "_ttft", "_inter_token", "_active")
+
+    def __init__(self, metrics: StreamMetrics, client_mode: str, langgraph: str):
+        self.metrics = metrics
+        self.labels = (client_mode, langgraph)
+        self._ttft = metrics.ttft.labels(*self.labels)
+        self._inter_token = metrics.inter_token.labels(*self.labels)
+        self._active = metrics.active.labels(*self.labels)
+        self._active.inc()
+        self.start = self.last = time.perf_counter()
+        self.count = 0
+        self.failed = False
+        self.finished = False
+
+    def token(self):
+        now = time.perf_counter()
+        if self.count:
+            self._inter_token.observe(now - self.last)
+        else:
+            self._ttft.observe(now - self.start)
+        self.last = now
+        self.count += 1
+
+    def error(self, message: str):
+        self.failed = True
+        self.metrics.errors.labels(*self.labels, classify_error(message)).inc()
+
+    def cancel(self):
+        """Finishes a stream whose client went away."""
+        if not self.finished:
+            self.metrics.cancelled.labels(*self.labels).inc()
+        self.finish("cancelled")
+
+    def finish(self, status: Optional[str] = None):
+        if self.finished:
+            return
+        self.finished = True
+        self._active.dec()
+        self.metrics.duration.labels(*self.labels).observe(time.perf_counter() - self.start)
+        self.metrics.tokens.labels(*self.labels).observe(self.count)
+        status = status or ("error" if self.failed else "ok")
+        self.metrics.streams.labels(*self.labels, status).inc()
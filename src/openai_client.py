@@ -3,9 +3,16 @@ import os
 import asyncio
 import httpx
 import logging
-from typing import AsyncGenerator
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Any, AsyncGenerator, List, Optional
 from openai import AsyncOpenAI  # Ensure you have an async OpenAI client installed
-from langchain_core.runnables import RunnableConfig
+from src.backend_pool import Backend, BackendLease, BackendPool
+from src.client_registry import client_setting
+from src.hedging import HedgeStats, HedgingConfig, HedgingState, LatencyTracker, race_first
+from src.token_event import TokenEvent
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,42 +22,263 @@ logger = logging.getLogger(__name__)
 # OPENAI_API_BASE_URL = "http://t1cim-wncchat.wneweb.com.tw/v1"
 # ORION_CTH_API_KEY = os.environ['ORION_CTH_API_KEY']
 
-# Create an async HTTP client with SSL verification enabled
-http_client = httpx.AsyncClient()
-
 # Initialize the async OpenAI client with configurable model
 class OpenAIStreamClient:
-    def __init__(self):
-        self.client = AsyncOpenAI()
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 http_client: Optional[httpx.AsyncClient] = None, hedging: Optional[HedgingConfig] = None):
+        # base_url/api_key default to the OPENAI_BASE_URL/OPENAI_API_KEY environment variables
+        self.base_url = base_url
+        self.api_key = api_key
+        self.http_client = http_client
+        # The AsyncOpenAI client (and its HTTP client) is built on first use, so
+        # importing this module is cheap and works without an API key
+        self._client: Optional[AsyncOpenAI] = None
         self.model = 'gpt-4o-mini-2024-07-18'  # Default model
+        self.hedging_state = HedgingState(hedging or HedgingConfig())
+        self.backends: Optional[BackendPool] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _build_client(self) -> AsyncOpenAI:
+        # Retries are handled by stream_tokens (see HedgingConfig), not by the SDK
+        return AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, http_client=self.http_client,
+                           max_retries=0)
+
+    @property
+    def hedging(self) -> HedgingConfig:
+        return self.hedging_state.config
+
+    @property
+    def first_token_latency(self) -> LatencyTracker:
+        return self.hedging_state.first_token_latency
+
+    @property
+    def hedge_stats(self) -> HedgeStats:
+        return self.hedging_state.stats
+
+    def set_hedging(self, config: HedgingConfig):
+        """
+        Sets how requests are hedged and retried before their first token,
+        unless a request's config carries its own HedgingState.
+
+        Args:
+            config: The HedgingConfig to apply; resets the rolling first-token latencies
+        """
+        self.hedging_state = HedgingState(config, self.hedging_state.stats)
+
+    def configure(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        """
+        Points the client at another OpenAI-compatible endpoint, e.g. the replay server.
+
+        Args:
+            base_url: API base URL (None falls back to OPENAI_BASE_URL)
+            api_key: API key (None falls back to OPENAI_API_KEY)
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+
+    def set_backends(self, backends: Optional[BackendPool]):
+        """
+        Routes requests across a pool of backends instead of the single endpoint.
+
+        Args:
+            backends: The BackendPool, or None to go back to base_url/api_key
+        """
+        self.backends = backends
+
+    def _backend_client(self, backend: Backend) -> AsyncOpenAI:
+        client = backend.clients.get("openai")
+        if client is None:
+            client = backend.clients["openai"] = AsyncOpenAI(
+                base_url=backend.base_url, api_key=backend.api_key, http_client=backend.http_client,
+                max_retries=0)
+        return client
+
+    def set_http_client(self, http_client: Optional[httpx.AsyncClient]):
+        """
+        Routes requests through a shared, externally owned connection pool.
+
+        Args:
+            http_client: The pooled client, or None to go back to a private one
+        """
+        self.http_client = http_client
+        self._client = None
+        
+    def request_params(self, topic: str) -> dict:
+        """Returns the model, messages and sampling parameters sent for a topic."""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": f"Tell me a joke about {topic}"}],
+        }
         
-    async def stream_tokens(self, topic: str, config: RunnableConfig = None) -> AsyncGenerator[dict, None]:
+    async def _create_stream(self, topic: str, backend: Optional[Backend] = None):
+        client, params = self.client, self.request_params(topic)
+        if backend is not None:
+            client = self._backend_client(backend)
+            if backend.model:
+                params["model"] = backend.model
+        return await client.chat.completions.create(
+            **params,
+            stream=True,
+            timeout=30.0
+        )
+
+    def _lease(self) -> Optional[BackendLease]:
+        return self.backends.acquire() if self.backends is not None else None
+
+    async def stream_chunks(self, topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[Any, None]:
+        """
+        Streams the raw ChatCompletionChunk objects of a completion, e.g. for recording.
+
+        Yields:
+            ChatCompletionChunk objects, or an {'error': ...} dict on failure
+        """
+        lease = self._lease()
         try:
-            messages = [{"role": "user", "content": f"Tell me a joke about {topic}"}]
-            
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=True,
-                timeout=30.0
-            )
+            response = await self._create_stream(topic, lease and lease.backend)
             
             async for chunk in response:
                 yield chunk
                 
         except Exception as e:
+            if lease is not None:
+                lease.fail(e)
             # For errors, we still need to yield a dict since we can't create OpenAI objects
             error_msg = f"Connection error: {str(e)}"
-            logger.error(f"Error in stream_tokens: {error_msg}")
+            logger.error(f"Error in stream_chunks: {error_msg}")
             yield {"error": error_msg}
 
+        finally:
+            if lease is not None:
+                lease.release()
+
+    async def _open_until_first_token(self, topic: str):
+        """
+        One attempt: opens a stream and reads it up to the first chunk carrying a token.
+
+        With a backend pool, each attempt takes its own lease, so a hedge or
+        retry usually lands on another backend.
+        """
+        lease = self._lease()
+        response = None
+        try:
+            response = await self._create_stream(topic, lease and lease.backend)
+            iterator = response.__aiter__()
+            buffered = []
+            async for chunk in iterator:
+                buffered.append(chunk)
+                if chunk.choices and (chunk.choices[0].delta.content or chunk.choices[0].finish_reason):
+                    break
+        except BaseException as e:
+            if response is not None:
+                await response.close()
+            if lease is not None:
+                if isinstance(e, Exception):
+                    lease.fail(e)
+                lease.release()
+            raise
+        if lease is not None:
+            lease.first_token()
+        return response, iterator, buffered, lease
+
+    async def stream_tokens(self, topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
+        """
+        Streams a completion as TokenEvents. Closing or cancelling the
+        generator closes the upstream HTTP response.
+
+        Until the first token arrives, the request is hedged and retried as
+        set by the HedgingConfig; after that, a failure ends the stream. A
+        HedgingState in config['configurable']['hedging'] (e.g. an app's)
+        takes the place of the client's own.
+
+        Yields:
+            A TokenEvent per chunk, or a failure TokenEvent
+        """
+        index = 0
+        response = lease = None
+        hedging = client_setting(config, "hedging") or self.hedging_state
+        try:
+            response, iterator, buffered, lease = await race_first(
+                lambda: self._open_until_first_token(topic), hedging.config, hedging.first_token_latency,
+                hedging.stats, is_retryable=_is_retryable, discard=_close_attempt,
+            )
+
+            for chunk in buffered:
+                yield _chunk_event(chunk, index)
+                index += 1
+            async for chunk in iterator:
+                yield _chunk_event(chunk, index)
+                index += 1
+
+        except Exception as e:
+            if lease is not None:
+                lease.fail(e)
+            error_msg = f"Connection error: {str(e)}"
+            logger.error(f"Error in stream_tokens: {error_msg}")
+            yield TokenEvent.failure(error_msg, index)
+
+        finally:
+            if response is not None:
+                # Closes the HTTP response at once when the consumer stops early,
+                # so the upstream generation is aborted and the connection freed
+                await response.close()
+            if lease is not None:
+                lease.release()
+
+def _chunk_event(chunk, index: int) -> TokenEvent:
+    choices = chunk.choices
+    if choices:
+        choice = choices[0]
+        return TokenEvent(choice.delta.content or "", index, choice.finish_reason, chunk.usage)
+    # Usage-only chunk sent last when stream_options.include_usage is set
+    return TokenEvent("", index, None, chunk.usage)
+
+def _is_retryable(error: BaseException) -> bool:
+    # Connection errors and timeouts have no status; of the API errors only
+    # rate limits, conflicts and server errors are worth another attempt
+    status = getattr(error, "status_code", None)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+async def _close_attempt(attempt):
+    response, _, _, lease = attempt
+    await response.close()
+    if lease is not None:
+        lease.release()
+
 # Create a singleton instance
 openai_client = OpenAIStreamClient()
 
-async def stream_openai_tokens(topic: str, config: RunnableConfig = None) -> AsyncGenerator[dict, None]:
+def set_openai_http_client(http_client: Optional[httpx.AsyncClient]):
+    """Routes the singleton client through a shared connection pool (None for a private one)."""
+    openai_client.set_http_client(http_client)
+
+def openai_sdk_clients() -> List[AsyncOpenAI]:
+    """Builds the AsyncOpenAI clients requests will use (one per backend with a pool) and returns them."""
+    if openai_client.backends is not None:
+        return [openai_client._backend_client(b) for b in openai_client.backends.backends]
+    return [openai_client.client]
+
+def openai_request_params(topic: str) -> dict:
+    """Request parameters of stream_openai_tokens for a topic, e.g. for cache keys."""
+    return openai_client.request_params(topic)
+
+async def stream_openai_tokens(topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
     """
     Public interface for streaming tokens from the OpenAI client.
     Delegates to the singleton client instance.
     """
-    async for response in openai_client.stream_tokens(topic, config):
-        yield response
+    # Closing this wrapper closes the client's stream, and with it the upstream response, at once
+    async with aclosing(openai_client.stream_tokens(topic, config)) as events:
+        async for event in events:
+            yield event
+
+async def stream_openai_chunks(topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[Any, None]:
+    """Raw ChatCompletionChunk stream of the singleton client, in the format the stream logs record."""
+    async with aclosing(openai_client.stream_chunks(topic, config)) as chunks:
+        async for chunk in chunks:
+            yield chunk
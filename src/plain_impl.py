@@ -1,27 +1,30 @@
 # src/plain_impl.py
-from typing import AsyncGenerator, Union, Dict, Any
+from contextlib import aclosing
+from typing import TYPE_CHECKING, AsyncGenerator
+from src.token_event import TokenEvent
 
-async def stream_plain(topic: str, client_fn) -> AsyncGenerator[str, None]:
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+async def stream_plain(topic: str, client_fn, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
     """
     Directly streams tokens from the client function.
     client_fn is expected to be an async generator function.
     
     Args:
         topic: The topic to generate content about
-        client_fn: An async generator function that yields tokens
+        client_fn: An async generator function that yields TokenEvents
+        config: Optional RunnableConfig passed through to the client function
         
     Yields:
-        Tokens from the client function, with error handling
+        TokenEvents from the client function; an exception ends the stream
+        with a failure event
     """
     try:
-        async for token in client_fn(topic):
-            if isinstance(token, dict):
-                if "error" in token:
-                    yield f"Error: {token['error']}"
-                elif "content" in token:
-                    yield token["content"]
-            elif isinstance(token, str):
-                yield token
+        # aclosing releases the upstream request as soon as this stream is closed
+        async with aclosing(client_fn(topic, config=config)) as events:
+            async for event in events:
+                yield event
             
     except Exception as e:
-        yield f"Error in stream_joke: {str(e)}"
+        yield TokenEvent.failure(f"Error in stream_joke: {str(e)}")
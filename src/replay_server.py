@@ -0,0 +1,427 @@
+# src/replay_server.py
+"""
+Offline stand-in for the OpenAI chat completions API.
+
+Serves ``/v1/chat/completions`` from the streams recorded in
+``logs/openai_stream_*.jsonl`` (see docs/openai_stream_response.md), so both
+``AsyncOpenAI`` and LangChain's ``ChatOpenAI`` can be pointed at it through
+``base_url`` and every combination runs without network access.
+
+Usage:
+    python -m src.replay_server --port 8001 --time-scale 0
+    export OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=replay
+"""
+import argparse
+import ast
+import asyncio
+import glob
+import gzip
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_DIR = "logs"
+
+# "Connection error: Error code: 404 - {'error': {...}}" as recorded by the clients
+_ERROR_CODE_RE = re.compile(r"Error code: (\d{3}) - (\{.*\})\s*$", re.DOTALL)
+_ERROR_MODEL_RE = re.compile(r"model `([^`]+)`")
+
+
+class Recording:
+    """
+    One recorded stream: either a chunk sequence or a single error.
+
+    Attributes:
+        name: File stem the recording was loaded from
+        chunks: List of (offset_seconds, chunk_dict) relative to the first chunk
+        status_code: HTTP status to replay for an error recording
+        error_body: JSON body to replay for an error recording
+        error_model: Model named in the error message, if any
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks: List[Tuple[float, dict]] = []
+        self.status_code: Optional[int] = None
+        self.error_body: Optional[dict] = None
+        self.error_model: Optional[str] = None
+
+    @property
+    def is_error(self) -> bool:
+        return self.error_body is not None
+
+    @property
+    def content(self) -> str:
+        return "".join(
+            choice["delta"].get("content") or ""
+            for _, chunk in self.chunks
+            for choice in chunk.get("choices", [])
+        )
+
+
+def _parse_error(recording: Recording, message: str):
+    """Recovers the upstream status code and JSON body from a recorded error string."""
+    match = _ERROR_CODE_RE.search(message)
+    body = None
+    if match:
+        recording.status_code = int(match.group(1))
+        try:
+            body = ast.literal_eval(match.group(2))
+        except (ValueError, SyntaxError):
+            body = None
+    else:
+        recording.status_code = 500
+    if not isinstance(body, dict) or "error" not in body:
+        body = {"error": {"message": message, "type": "server_error", "param": None, "code": None}}
+    recording.error_body = body
+
+    model_match = _ERROR_MODEL_RE.search(message)
+    recording.error_model = model_match.group(1) if model_match else None
+
+
+def _content_chunk(chunk_id: str, created: int, role: Optional[str], content: Optional[str],
+                   finish_reason: Optional[str]) -> dict:
+    """Builds a ChatCompletionChunk dict for recordings that only captured token text."""
+    return {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": None,
+        "system_fingerprint": None,
+        "choices": [{
+            "index": 0,
+            "delta": {"role": role, "content": content, "function_call": None, "tool_calls": None},
+            "finish_reason": finish_reason,
+            "logprobs": None,
+        }],
+    }
+
+
+def _open_log(path: str):
+    return gzip.open(path, "rt") if path.endswith(".gz") else open(path)
+
+
+def load_recording_file(path: str) -> List[Recording]:
+    """
+    Loads the recordings of one JSONL log file.
+
+    Two line shapes are understood: ``{"timestamp", "chunk": {...}}`` holding a
+    full ChatCompletionChunk or an error, and the older
+    ``{"timestamp", "response": {"content" | "error": ...}}`` holding only token
+    text, which is expanded into role/content/stop chunks. Files written by the
+    stream recorder hold many streams and tag each line with a ``"stream"`` id;
+    every stream becomes its own recording named ``<file stem>:<stream id>``.
+    Gzipped files (``.jsonl.gz``) are read as well.
+
+    Args:
+        path: Path to a logs/openai_stream_*.jsonl[.gz] file
+
+    Returns:
+        The replayable recordings in the file, in the order they start
+    """
+    stem = os.path.basename(path).split(".")[0]
+    groups: Dict[Optional[str], List[dict]] = {}
+    with _open_log(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            groups.setdefault(entry.get("stream"), []).append(entry)
+
+    recordings = []
+    for stream_id, entries in groups.items():
+        name = stem if stream_id is None else f"{stem}:{stream_id}"
+        recording = _build_recording(name, entries)
+        if recording is not None:
+            recordings.append(recording)
+    return recordings
+
+
+def _build_recording(name: str, entries: List[dict]) -> Optional[Recording]:
+    """Builds one Recording from its log entries, or None if they hold nothing replayable."""
+    recording = Recording(name)
+    timestamps: List[float] = []
+    legacy_tokens: List[str] = []
+
+    for entry in entries:
+        timestamp = datetime.fromisoformat(entry["timestamp"]).timestamp()
+        payload = entry.get("chunk", entry.get("response"))
+        if not isinstance(payload, dict):
+            continue
+
+        if "error" in payload:
+            _parse_error(recording, str(payload["error"]))
+            return recording
+        if "choices" in payload:
+            recording.chunks.append((timestamp, payload))
+        elif "content" in payload:
+            legacy_tokens.append(payload["content"])
+        else:
+            continue
+        timestamps.append(timestamp)
+
+    if legacy_tokens:
+        created = int(timestamps[0])
+        chunk_id = f"chatcmpl-replay-{name}"
+        recording.chunks = [(timestamps[0], _content_chunk(chunk_id, created, "assistant", "", None))]
+        recording.chunks += [
+            (ts, _content_chunk(chunk_id, created, None, token, None))
+            for ts, token in zip(timestamps, legacy_tokens)
+        ]
+        recording.chunks.append((timestamps[-1], _content_chunk(chunk_id, created, None, None, "stop")))
+
+    if not recording.chunks:
+        return None
+
+    start = recording.chunks[0][0]
+    recording.chunks = [(ts - start, chunk) for ts, chunk in recording.chunks]
+    return recording
+
+
+def load_recordings(log_dir: str = DEFAULT_LOG_DIR) -> Tuple[List[Recording], List[Recording]]:
+    """
+    Loads every recording in a log directory.
+
+    Args:
+        log_dir: Directory containing openai_stream_*.jsonl[.gz] files
+
+    Returns:
+        Tuple of (stream recordings, error recordings), each sorted by file name
+    """
+    streams, errors = [], []
+    paths = glob.glob(os.path.join(log_dir, "openai_stream_*.jsonl"))
+    paths += glob.glob(os.path.join(log_dir, "openai_stream_*.jsonl.gz"))
+    for path in sorted(paths):
+        for recording in load_recording_file(path):
+            (errors if recording.is_error else streams).append(recording)
+    logger.info(f"Loaded {len(streams)} stream and {len(errors)} error recordings from {log_dir}")
+    return streams, errors
+
+
+def _sse(payload) -> bytes:
+    data = payload if isinstance(payload, str) else json.dumps(payload)
+    return f"data: {data}\n\n".encode("utf-8")
+
+
+def create_replay_app(log_dir: str = DEFAULT_LOG_DIR, time_scale: float = 1.0,
+                      max_delay: Optional[float] = None, error_rate: float = 0.0,
+                      seed: Optional[int] = None) -> FastAPI:
+    """
+    Create the replay server application.
+
+    Stream recordings are served round-robin. A request gets an error
+    recording instead when its model is the one named in that error (e.g.
+    'invalid-model-name'), when it is drawn with probability ``error_rate``, or
+    when the ``X-Replay-Recording`` header names it. The header can select any
+    recording by its file stem.
+
+    Args:
+        log_dir: Directory containing the recordings
+        time_scale: Multiplier for recorded inter-chunk gaps (1.0 original, 0 no delay)
+        max_delay: Optional cap in seconds on any single replayed gap
+        error_rate: Probability of replaying an error recording for any request
+        seed: Seed for the error_rate draw, for reproducible runs
+
+    Returns:
+        A FastAPI application
+    """
+    if time_scale < 0:
+        raise ValueError("time_scale must be >= 0")
+    streams, errors = load_recordings(log_dir)
+    if not streams:
+        raise ValueError(f"No stream recordings found in {log_dir}")
+
+    app = FastAPI()
+    by_name: Dict[str, Recording] = {r.name: r for r in streams + errors}
+    errors_by_model: Dict[str, Recording] = {r.error_model: r for r in errors if r.error_model}
+    next_stream = itertools.cycle(streams)
+    rng = random.Random(seed)
+
+    def select_recording(request: Request, model: str) -> Recording:
+        name = request.headers.get("x-replay-recording")
+        if name:
+            return by_name[name]
+        if model in errors_by_model:
+            return errors_by_model[model]
+        if errors and error_rate and rng.random() < error_rate:
+            return rng.choice(errors)
+        return next(next_stream)
+
+    async def replay_chunks(recording: Recording, model: str, include_usage: bool):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        previous = 0.0
+        shift = 0.0
+        completion_tokens = 0
+        for offset, chunk in recording.chunks:
+            if time_scale:
+                gap = (offset - previous) * time_scale
+                if max_delay is not None and gap > max_delay:
+                    shift += gap - max_delay
+                delay = start + offset * time_scale - shift - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            previous = offset
+
+            if chunk.get("model") is None:
+                chunk = {**chunk, "model": model}
+            if any(choice["delta"].get("content") for choice in chunk["choices"]):
+                completion_tokens += 1
+            yield _sse(chunk)
+
+        if include_usage:
+            last = recording.chunks[-1][1]
+            yield _sse({
+                "id": last["id"], "object": "chat.completion.chunk", "created": last["created"],
+                "model": last.get("model") or model, "system_fingerprint": last.get("system_fingerprint"),
+                "choices": [],
+                "usage": {"prompt_tokens": 0, "completion_tokens": completion_tokens,
+                          "total_tokens": completion_tokens},
+            })
+        yield _sse("[DONE]")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        try:
+            recording = select_recording(request, model)
+        except KeyError as e:
+            return JSONResponse(status_code=400, content={"error": {
+                "message": f"Unknown replay recording {e}", "type": "invalid_request_error",
+                "param": None, "code": None}})
+        logger.info(f"Replaying {recording.name} for model={model}")
+
+        if recording.is_error:
+            return JSONResponse(status_code=recording.status_code, content=recording.error_body)
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                replay_chunks(recording, model, include_usage),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"}
+            )
+
+        first = recording.chunks[0][1]
+        return {
+            "id": first["id"],
+            "object": "chat.completion",
+            "created": first["created"],
+            "model": first.get("model") or model,
+            "system_fingerprint": first.get("system_fingerprint"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": recording.content},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(recording.chunks) - 2,
+                      "total_tokens": len(recording.chunks) - 2},
+        }
+
+    @app.get("/v1/models")
+    async def list_models():
+        models = sorted({chunk.get("model") for r in streams for _, chunk in r.chunks if chunk.get("model")})
+        return {"object": "list",
+                "data": [{"id": m, "object": "model", "created": 0, "owned_by": "replay"} for m in models]}
+
+    return app
+
+
+# Threads of the servers started by start_server, so stop_server can wait for them
+_server_threads: Dict[uvicorn.Server, threading.Thread] = {}
+
+
+def start_server(app, host: str = "127.0.0.1", port: int = 0, name: str = "server") -> Tuple[uvicorn.Server, str]:
+    """
+    Runs an ASGI app with uvicorn in a background thread and waits until it accepts connections.
+
+    A real server is used rather than httpx's ASGITransport, which buffers the
+    whole response and would hide streaming behaviour.
+
+    Args:
+        app: The ASGI application
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        name: Name of the server thread
+
+    Returns:
+        Tuple of (server, base_url); stop it with stop_server, or with
+        ``server.should_exit = True`` when nothing waits for its shutdown
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name=name, daemon=True)
+    thread.start()
+    _server_threads[server] = thread
+
+    deadline = time.monotonic() + 10.0
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError(f"{name} failed to start")
+        time.sleep(0.01)
+
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{bound_port}"
+
+
+def stop_server(server: uvicorn.Server, timeout: float = 10.0):
+    """
+    Stops a server from start_server and waits until its shutdown hooks have run.
+
+    Args:
+        server: The server to stop
+        timeout: Seconds to wait for its thread
+    """
+    server.should_exit = True
+    thread = _server_threads.pop(server, None)
+    if thread is not None:
+        thread.join(timeout)
+
+
+def start_replay_server(app: FastAPI, host: str = "127.0.0.1", port: int = 0) -> Tuple[uvicorn.Server, str]:
+    """
+    Runs the replay server in a background thread and waits until it accepts connections.
+
+    Args:
+        app: The application from create_replay_app
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+
+    Returns:
+        Tuple of (server, base_url of the OpenAI API); call ``server.should_exit = True`` to stop it
+    """
+    server, base_url = start_server(app, host, port, name="replay-server")
+    return server, f"{base_url}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible replay server")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR, help="Directory of recorded streams")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiplier for recorded chunk gaps (1 original, 0 no delay)")
+    parser.add_argument("--max-delay", type=float, default=None, help="Cap in seconds on any single gap")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of replaying an error")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for --error-rate")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=8001, help="Port to bind")
+    args = parser.parse_args()
+
+    uvicorn.run(create_replay_app(log_dir=args.log_dir, time_scale=args.time_scale,
+                                  max_delay=args.max_delay, error_rate=args.error_rate, seed=args.seed),
+                host=args.host, port=args.port)
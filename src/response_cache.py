@@ -0,0 +1,305 @@
+# src/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Optional, Sequence, Tuple
+
+from src.token_event import TokenEvent
+from src.topic_matcher import TopicMatcher
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Approximate bookkeeping cost of one cached token and one entry, in bytes
+TOKEN_OVERHEAD = 96
+ENTRY_OVERHEAD = 512
+
+
+def make_cache_key(namespace: str, params: dict) -> str:
+    """
+    Builds a cache key from a client namespace and its request parameters.
+
+    Args:
+        namespace: Identifies the client, e.g. 'openai' or 'langchain'
+        params: Model, messages and sampling parameters of the request
+
+    Returns:
+        A fixed-size hex digest
+    """
+    payload = json.dumps([namespace, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    """A cached TokenEvent stream with optional per-token offsets (seconds since the request started)."""
+    __slots__ = ("tokens", "offsets", "size", "expires_at")
+
+    def __init__(self, tokens: Tuple[TokenEvent, ...], offsets: Optional[Tuple[float, ...]], size: int,
+                 expires_at: float):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Memory-bounded LRU cache of token streams with a TTL.
+
+    Args:
+        max_bytes: Approximate memory budget for all entries
+        ttl: Seconds an entry stays valid (None never expires)
+        max_entries: Optional bound on the number of entries
+        record_timing: Store per-token offsets so hits can be replayed paced
+        replay: 'instant' replays hits at once, 'paced' with the recorded timing
+        pace_scale: Multiplier applied to recorded offsets in paced replay
+        matcher: Optional normalized and near-duplicate topic lookup used by
+            cached_client in place of the exact topic
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = 3600.0,
+                 max_entries: Optional[int] = None, record_timing: bool = False,
+                 replay: str = "instant", pace_scale: float = 1.0,
+                 matcher: Optional[TopicMatcher] = None):
+        if replay not in ("instant", "paced"):
+            raise ValueError("Invalid replay mode; choose 'instant' or 'paced'.")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.record_timing = record_timing or replay == "paced"
+        self.replay = replay
+        self.pace_scale = pace_scale
+        self.matcher = matcher
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes_used(self) -> int:
+        return self._bytes
+
+    def get(self, key: str, count: bool = True) -> Optional[CacheEntry]:
+        """
+        Returns the live entry for key and marks it most recently used, or None.
+
+        Args:
+            key: The cache key
+            count: Count the lookup as a hit or miss; lookups made through
+                several tiers count once, by their final outcome
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            if count:
+                self.count_lookup(entry is not None)
+            return entry
+
+    def count_lookup(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def contains(self, key: str) -> bool:
+        """True if key has a live entry; does not count as a lookup or touch the LRU order."""
+        entry = self._entries.get(key)
+        return entry is not None and entry.expires_at > time.monotonic()
+
+    def put(self, key: str, tokens: Sequence[TokenEvent], offsets: Optional[Sequence[float]] = None) -> bool:
+        """
+        Stores a completed token stream, evicting least recently used entries as needed.
+
+        Returns:
+            False if the stream alone exceeds the memory budget and was not stored
+        """
+        size = ENTRY_OVERHEAD + sum(TOKEN_OVERHEAD + len(t.text) for t in tokens)
+        if size > self.max_bytes:
+            return False
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        entry = CacheEntry(tuple(tokens), tuple(offsets) if offsets is not None else None, size, expires_at)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            **({"topics": self.matcher.stats()} if self.matcher is not None else {}),
+        }
+
+    async def replay_entry(self, entry: CacheEntry) -> AsyncGenerator[TokenEvent, None]:
+        """Yields a cached stream, instantly or paced by its recorded offsets."""
+        if self.replay == "paced" and entry.offsets is not None:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            for token, offset in zip(entry.tokens, entry.offsets):
+                delay = start + offset * self.pace_scale - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield token
+        else:
+            for token in entry.tokens:
+                yield token
+
+
+def cache_bypassed(config: "Optional[RunnableConfig]") -> bool:
+    """True when the request asked to skip the cache via config['configurable']['cache_bypass']."""
+    return bool(config and (config.get("configurable") or {}).get("cache_bypass"))
+
+
+def primary_key(cache: ResponseCache, namespace: str, params_fn: Callable[[str], dict], topic: str) -> str:
+    """Returns the key a response for topic is stored under: the normalized topic's, if the cache has a matcher."""
+    lookup_topic = cache.matcher.normalize(topic) if cache.matcher is not None else topic
+    return make_cache_key(namespace, params_fn(lookup_topic))
+
+
+def is_cached(cache: ResponseCache, namespace: str, params_fn: Callable[[str], dict], topic: str) -> bool:
+    """
+    Checks whether topic will be served from the cache without reading the entry.
+
+    Only the primary key is checked; near-duplicate matches are left to the
+    lookup itself. The check is not counted and does not touch the LRU order.
+    """
+    return cache.contains(primary_key(cache, namespace, params_fn, topic))
+
+
+def lookup_entry(cache: ResponseCache, namespace: str, params_fn: Callable[[str], dict], topic: str,
+                 record: bool = True) -> Tuple[str, Optional[CacheEntry]]:
+    """
+    Looks a topic up through the cache's tiers.
+
+    Without a matcher the exact topic is the key. With one, the normalized
+    topic is looked up first and then the nearest indexed topic, if near
+    matching is enabled.
+
+    Args:
+        cache: The ResponseCache to use
+        namespace: Client name included in the key
+        params_fn: Returns the request parameters for a topic
+        topic: The requested topic
+        record: Count the lookup in the cache and matcher statistics
+
+    Returns:
+        Tuple of (key a new response for the topic is stored under, live entry or None)
+    """
+    matcher = cache.matcher
+    lookup_topic = matcher.normalize(topic) if matcher is not None else topic
+    key = make_cache_key(namespace, params_fn(lookup_topic))
+    entry = cache.get(key, count=False)
+    near = None
+    if entry is None and matcher is not None:
+        near = matcher.nearest(lookup_topic, record=record)
+        if near is not None:
+            entry = cache.get(make_cache_key(namespace, params_fn(near[0])), count=False)
+            if entry is None:
+                # Evicted or expired since it was indexed
+                matcher.discard(near[0])
+    if record:
+        cache.count_lookup(entry is not None)
+        if matcher is not None:
+            matcher.lookups += 1
+            if entry is not None and near is None:
+                matcher.normalized_hits += 1
+            elif entry is not None:
+                matcher.near_hits += 1
+                logger.info(f"Near-duplicate cache hit: '{topic}' served from '{near[0]}' "
+                            f"(similarity {near[1]:.2f})")
+    return key, entry
+
+
+def cached_client(client_fn, cache: ResponseCache, params_fn: Callable[[str], dict], namespace: str):
+    """
+    Wraps a client function so complete streams are served from and stored in a cache.
+
+    The wrapper has the client function's signature, so it can be used by
+    stream_plain and by the LangGraph call_model node alike. Streams that
+    yielded an error, or were not consumed to the end, are not stored.
+
+    Args:
+        client_fn: Async generator function (topic, config=None) to wrap
+        cache: The ResponseCache to use
+        params_fn: Returns the request parameters (model, messages, sampling) for a topic
+        namespace: Client name included in the key, e.g. 'openai'
+
+    Returns:
+        An async generator function with the same signature as client_fn
+    """
+    async def stream_cached(topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
+        bypass = cache_bypassed(config)
+        if bypass:
+            cache.bypasses += 1
+            key, _ = lookup_entry(cache, namespace, params_fn, topic, record=False)
+        else:
+            key, entry = lookup_entry(cache, namespace, params_fn, topic)
+            if entry is not None:
+                logger.info(f"Cache hit for topic: {topic}")
+                async for token in cache.replay_entry(entry):
+                    yield token
+                return
+
+        tokens = []
+        offsets = [] if cache.record_timing else None
+        failed = False
+        start = time.monotonic()
+        async with aclosing(client_fn(topic, config=config)) as upstream:
+            async for token in upstream:
+                if token.error is not None:
+                    failed = True
+                tokens.append(token)
+                if offsets is not None:
+                    offsets.append(time.monotonic() - start)
+                yield token
+
+        if not failed and any(t.text for t in tokens):
+            if cache.put(key, tokens, offsets) and cache.matcher is not None:
+                cache.matcher.add(cache.matcher.normalize(topic))
+
+    stream_cached.__name__ = f"cached_{getattr(client_fn, '__name__', 'client')}"
+    return stream_cached
@@ -0,0 +1,290 @@
+# src/server.py
+import importlib.util
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from src.admission import AdmissionConfig, AdmissionController
+from src.backend_pool import BackendPool, BackendPoolConfig, load_backend_configs
+from src.hedging import HedgingConfig
+from src.response_cache import ResponseCache
+from src.shared_cache import build_response_cache
+from src.topic_matcher import TopicMatchConfig, TopicMatcher
+from src.stream_compression import CompressionConfig
+from src.stream_recorder import RecorderConfig, StreamRecorder
+from src.token_bridge import BridgeConfig
+from src.warmup import WarmupConfig
+from src.ws_multiplex import WebSocketConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+APP_FACTORY = "src.server:create_app_from_env"
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "0").lower() in ("1", "true", "yes")
+
+
+def _env_optional_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    """
+    Everything needed to build the API app, so each worker process can
+    rebuild it from LLM_* environment variables.
+
+    Attributes:
+        client_mode: 'openai' or 'langchain'
+        use_langgraph: Whether to use LangGraph orchestration
+        flush_policy: Default flush policy of /stream
+        cache: Serve repeated requests from an in-memory response cache
+        cache_ttl: Seconds a cached response stays valid
+        cache_max_mb: Memory budget of the response cache
+        cache_replay: 'instant' or 'paced' replay of cache hits
+        cache_backend: 'memory' (per worker) or 'sqlite' (shared by all
+            workers on the host through cache_path)
+        cache_path: Database file of the 'sqlite' cache backend
+        cache_normalize: Normalization steps applied to topics before they
+            are used in cache keys (empty: exact topics)
+        cache_near_threshold: Similarity at which a cached near-duplicate
+            topic is served (None: no near matching)
+        coalesce_requests: Share one upstream stream between identical requests
+        bridge: Buffer settings between LangChain callbacks and the stream
+        max_concurrent: Upstream streams allowed at once (0: unlimited)
+        requests_per_minute: Upstream requests per minute (0: unlimited)
+        tokens_per_minute: Estimated upstream tokens per minute (0: unlimited)
+        admission_queue: Requests allowed to wait for admission
+        admission_timeout: Seconds a request may wait for admission
+        hedge: Start a duplicate OpenAI request when the first token is late
+        hedge_after: Seconds before hedging (None: rolling p95)
+        max_retries: Retries of OpenAI requests before their first token
+        backends: JSON file of backends to route across (None: single endpoint)
+        routing: Routing policy of the backend pool
+        warmup: What each worker warms before it reports ready
+        recorder: Capture of sampled upstream streams into log files
+        compression: Negotiated compression of /stream responses
+        websocket: Stream and credit limits of the multiplexed /ws endpoint
+    """
+    client_mode: str = "openai"
+    use_langgraph: bool = False
+    flush_policy: str = "immediate"
+    cache: bool = False
+    cache_ttl: float = 3600.0
+    cache_max_mb: float = 64.0
+    cache_replay: str = "instant"
+    cache_backend: str = "memory"
+    cache_path: str = ".cache/responses.sqlite3"
+    cache_normalize: Tuple[str, ...] = ()
+    cache_near_threshold: Optional[float] = None
+    coalesce_requests: bool = False
+    bridge: BridgeConfig = field(default_factory=BridgeConfig)
+    max_concurrent: int = 0
+    requests_per_minute: float = 0.0
+    tokens_per_minute: float = 0.0
+    admission_queue: int = 100
+    admission_timeout: float = 10.0
+    hedge: bool = False
+    hedge_after: Optional[float] = None
+    max_retries: int = 2
+    backends: Optional[str] = None
+    routing: str = "least_outstanding"
+    warmup: WarmupConfig = field(default_factory=WarmupConfig)
+    recorder: RecorderConfig = field(default_factory=RecorderConfig)
+    compression: CompressionConfig = field(default_factory=CompressionConfig)
+    websocket: WebSocketConfig = field(default_factory=WebSocketConfig)
+
+    @classmethod
+    def from_env(cls) -> "ServerConfig":
+        """Builds a config from LLM_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            client_mode=os.environ.get("LLM_CLIENT", defaults.client_mode),
+            use_langgraph=_env_flag("LLM_LANGGRAPH"),
+            flush_policy=os.environ.get("LLM_FLUSH", defaults.flush_policy),
+            cache=_env_flag("LLM_CACHE"),
+            cache_ttl=float(os.environ.get("LLM_CACHE_TTL", defaults.cache_ttl)),
+            cache_max_mb=float(os.environ.get("LLM_CACHE_MAX_MB", defaults.cache_max_mb)),
+            cache_replay=os.environ.get("LLM_CACHE_REPLAY", defaults.cache_replay),
+            cache_backend=os.environ.get("LLM_CACHE_BACKEND", defaults.cache_backend),
+            cache_path=os.environ.get("LLM_CACHE_PATH", defaults.cache_path),
+            cache_normalize=tuple(n for n in os.environ.get("LLM_CACHE_NORMALIZE", "").split(",") if n),
+            cache_near_threshold=_env_optional_float("LLM_CACHE_NEAR_THRESHOLD"),
+            coalesce_requests=_env_flag("LLM_COALESCE_REQUESTS"),
+            bridge=BridgeConfig.from_env(),
+            max_concurrent=int(os.environ.get("LLM_MAX_CONCURRENT", defaults.max_concurrent)),
+            requests_per_minute=float(os.environ.get("LLM_REQUESTS_PER_MINUTE", defaults.requests_per_minute)),
+            tokens_per_minute=float(os.environ.get("LLM_TOKENS_PER_MINUTE", defaults.tokens_per_minute)),
+            admission_queue=int(os.environ.get("LLM_ADMISSION_QUEUE", defaults.admission_queue)),
+            admission_timeout=float(os.environ.get("LLM_ADMISSION_TIMEOUT", defaults.admission_timeout)),
+            hedge=_env_flag("LLM_HEDGE"),
+            hedge_after=_env_optional_float("LLM_HEDGE_AFTER"),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", defaults.max_retries)),
+            backends=os.environ.get("LLM_BACKENDS") or None,
+            routing=os.environ.get("LLM_ROUTING", defaults.routing),
+            warmup=WarmupConfig.from_env(),
+            recorder=RecorderConfig.from_env(),
+            compression=CompressionConfig.from_env(),
+            websocket=WebSocketConfig.from_env(),
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        """The environment variables that from_env reads back into this config."""
+        return {
+            "LLM_CLIENT": self.client_mode,
+            "LLM_LANGGRAPH": "1" if self.use_langgraph else "0",
+            "LLM_FLUSH": self.flush_policy,
+            "LLM_CACHE": "1" if self.cache else "0",
+            "LLM_CACHE_TTL": str(self.cache_ttl),
+            "LLM_CACHE_MAX_MB": str(self.cache_max_mb),
+            "LLM_CACHE_REPLAY": self.cache_replay,
+            "LLM_CACHE_BACKEND": self.cache_backend,
+            "LLM_CACHE_PATH": self.cache_path,
+            "LLM_CACHE_NORMALIZE": ",".join(self.cache_normalize),
+            "LLM_CACHE_NEAR_THRESHOLD": "" if self.cache_near_threshold is None else str(self.cache_near_threshold),
+            "LLM_COALESCE_REQUESTS": "1" if self.coalesce_requests else "0",
+            "LLM_BRIDGE_MAX_SIZE": str(self.bridge.max_size),
+            "LLM_BRIDGE_OVERFLOW": self.bridge.overflow,
+            "LLM_MAX_CONCURRENT": str(self.max_concurrent),
+            "LLM_REQUESTS_PER_MINUTE": str(self.requests_per_minute),
+            "LLM_TOKENS_PER_MINUTE": str(self.tokens_per_minute),
+            "LLM_ADMISSION_QUEUE": str(self.admission_queue),
+            "LLM_ADMISSION_TIMEOUT": str(self.admission_timeout),
+            "LLM_HEDGE": "1" if self.hedge else "0",
+            "LLM_HEDGE_AFTER": "" if self.hedge_after is None else str(self.hedge_after),
+            "LLM_MAX_RETRIES": str(self.max_retries),
+            "LLM_BACKENDS": self.backends or "",
+            "LLM_ROUTING": self.routing,
+            "LLM_WARMUP_CONNECTIONS": str(self.warmup.connections),
+            "LLM_WARMUP_PROBE": "1" if self.warmup.probe else "0",
+            "LLM_WARMUP_PROBE_TOPIC": self.warmup.probe_topic,
+            "LLM_WARMUP_TIMEOUT": str(self.warmup.timeout),
+            "LLM_WARMUP_BLOCK": "1" if self.warmup.block_startup else "0",
+            "LLM_RECORD": "1" if self.recorder.enabled else "0",
+            "LLM_RECORD_DIR": self.recorder.directory,
+            "LLM_RECORD_SAMPLE_RATE": str(self.recorder.sample_rate),
+            "LLM_RECORD_MAX_BUFFER": str(self.recorder.max_buffer),
+            "LLM_RECORD_BATCH_SIZE": str(self.recorder.batch_size),
+            "LLM_RECORD_FLUSH_INTERVAL": str(self.recorder.flush_interval),
+            "LLM_RECORD_MAX_FILE_MB": str(self.recorder.max_file_mb),
+            "LLM_RECORD_MAX_FILE_AGE": str(self.recorder.max_file_age),
+            "LLM_RECORD_GZIP": "1" if self.recorder.gzip else "0",
+            "LLM_COMPRESS": "1" if self.compression.enabled else "0",
+            "LLM_COMPRESS_ENCODINGS": ",".join(self.compression.encodings),
+            "LLM_WS_MAX_STREAMS": str(self.websocket.max_streams),
+            "LLM_WS_INITIAL_CREDIT": str(self.websocket.initial_credit),
+            "LLM_WS_MAX_CREDIT": str(self.websocket.max_credit),
+        }
+
+    def build_cache(self) -> Optional[ResponseCache]:
+        if not self.cache:
+            return None
+        matcher = None
+        if self.cache_normalize or self.cache_near_threshold is not None:
+            matcher = TopicMatcher(TopicMatchConfig(normalizers=self.cache_normalize,
+                                                    near_threshold=self.cache_near_threshold))
+        return build_response_cache(self.cache_backend, self.cache_path,
+                                    max_bytes=int(self.cache_max_mb * 1024 * 1024), ttl=self.cache_ttl,
+                                    replay=self.cache_replay, matcher=matcher)
+
+    def build_admission(self) -> Optional[AdmissionController]:
+        if not (self.max_concurrent or self.requests_per_minute or self.tokens_per_minute):
+            return None
+        return AdmissionController(AdmissionConfig(max_concurrent=self.max_concurrent,
+                                                   requests_per_minute=self.requests_per_minute,
+                                                   tokens_per_minute=self.tokens_per_minute,
+                                                   max_queue=self.admission_queue,
+                                                   queue_timeout=self.admission_timeout))
+
+    def hedging(self) -> HedgingConfig:
+        return HedgingConfig(hedge=self.hedge, hedge_after=self.hedge_after, max_retries=self.max_retries)
+
+    def build_backends(self) -> Optional[BackendPool]:
+        if not self.backends:
+            return None
+        return BackendPool(load_backend_configs(self.backends), BackendPoolConfig(routing=self.routing))
+
+    def build_recorder(self) -> Optional[StreamRecorder]:
+        return StreamRecorder(self.recorder) if self.recorder.enabled else None
+
+
+def build_app(config: ServerConfig):
+    """Builds the FastAPI app for a ServerConfig."""
+    # The web stack is imported here, not at module level, so that direct mode
+    # can use ServerConfig without loading it
+    from src.fastapi_endpoint import create_app
+
+    return create_app(client_mode=config.client_mode,
+                      use_langgraph=config.use_langgraph,
+                      flush_policy=config.flush_policy,
+                      cache=config.build_cache(),
+                      coalesce_requests=config.coalesce_requests,
+                      bridge=config.bridge,
+                      admission=config.build_admission(),
+                      hedging=config.hedging(),
+                      backends=config.build_backends(),
+                      warmup=config.warmup,
+                      recorder=config.build_recorder(),
+                      compression=config.compression,
+                      websocket=config.websocket)
+
+
+def create_app_from_env():
+    """
+    App factory for uvicorn (``factory=True``); every worker calls it once
+    and builds its own app, client pools and graph from the environment.
+    """
+    config = ServerConfig.from_env()
+    logger.info(f"Worker {os.getpid()} building app: client_mode={config.client_mode}, "
+                f"use_langgraph={config.use_langgraph}")
+    return build_app(config)
+
+
+def resolve_loop(loop: str) -> str:
+    """Falls back to asyncio if uvloop was asked for but is not installed."""
+    if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+        logger.warning("uvloop requested but not installed; using the asyncio event loop")
+        return "asyncio"
+    return loop
+
+
+def resolve_http(http: str) -> str:
+    """Falls back to h11 if httptools was asked for but is not installed."""
+    if http == "httptools" and importlib.util.find_spec("httptools") is None:
+        logger.warning("httptools requested but not installed; using h11")
+        return "h11"
+    return http
+
+
+def serve(config: ServerConfig, host: str = "0.0.0.0", port: int = 8000, workers: int = 1,
+          loop: str = "auto", http: str = "auto", graceful_timeout: int = 30):
+    """
+    Runs the API with uvicorn through the app factory.
+
+    With ``workers`` > 1 uvicorn forks that many processes sharing the
+    listening socket, each with its own event loop, connection pools and
+    limits (admission limits and caches apply per worker). On SIGTERM each
+    worker stops accepting connections and lets in-flight streams finish
+    for up to ``graceful_timeout`` seconds before cancelling them.
+
+    Args:
+        config: App settings, handed to the workers through the environment
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+        loop: 'auto', 'asyncio' or 'uvloop' ('auto' uses uvloop when installed)
+        http: 'auto', 'h11' or 'httptools' ('auto' uses httptools when installed)
+        graceful_timeout: Seconds to drain in-flight requests on shutdown
+    """
+    import uvicorn
+
+    os.environ.update(config.to_env())
+    logger.info(f"Serving on {host}:{port} with {workers} worker(s)")
+    uvicorn.run(APP_FACTORY, factory=True, host=host, port=port, workers=workers,
+                loop=resolve_loop(loop), http=resolve_http(http),
+                timeout_graceful_shutdown=graceful_timeout)
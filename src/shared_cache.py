@@ -0,0 +1,316 @@
+# src/shared_cache.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, Optional, Sequence, Tuple
+
+from src.response_cache import ENTRY_OVERHEAD, CacheEntry, ResponseCache
+from src.token_event import TokenEvent
+from src.topic_matcher import TopicMatcher
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ("memory", "sqlite")
+
+# Hits whose recency is kept in memory until the next put writes it
+MAX_PENDING_TOUCHES = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size, entries = entries + 1 WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size, entries = entries - 1 WHERE id = 0;
+END;
+"""
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _usage_dict(usage):
+    if usage is None or isinstance(usage, dict):
+        return usage
+    return usage.model_dump() if hasattr(usage, "model_dump") else None
+
+
+def encode_tokens(tokens: Sequence[TokenEvent], offsets: Optional[Sequence[float]] = None) -> bytes:
+    """
+    Packs a token stream into a compact, zlib-compressed blob.
+
+    The texts are stored back to back after their varint lengths, and
+    offsets as float32. Token indexes that match their position, and empty
+    finish reasons and usage, take no space. Other metadata goes into a small
+    JSON header.
+
+    Args:
+        tokens: The stream to store; failure events are not expected
+        offsets: Optional per-token offsets in seconds
+
+    Returns:
+        The encoded stream
+    """
+    texts = [t.text.encode("utf-8") for t in tokens]
+    extras = {}
+    for position, token in enumerate(tokens):
+        extra = {}
+        if token.index != position:
+            extra["index"] = token.index
+        if token.finish_reason is not None:
+            extra["finish_reason"] = token.finish_reason
+        usage = _usage_dict(token.usage)
+        if usage is not None:
+            extra["usage"] = usage
+        if extra:
+            extras[str(position)] = extra
+    header = json.dumps({"n": len(texts), "extras": extras, "offsets": offsets is not None},
+                        separators=(",", ":")).encode("utf-8")
+
+    raw = bytearray()
+    _write_varint(raw, len(header))
+    raw += header
+    for text in texts:
+        _write_varint(raw, len(text))
+    raw += b"".join(texts)
+    if offsets is not None:
+        raw += array("f", offsets).tobytes()
+    return zlib.compress(bytes(raw), 6)
+
+
+def decode_tokens(data: bytes) -> Tuple[Tuple[TokenEvent, ...], Optional[Tuple[float, ...]]]:
+    """Unpacks a blob from encode_tokens into (tokens, offsets)."""
+    raw = zlib.decompress(data)
+    header_len, pos = _read_varint(raw, 0)
+    header = json.loads(raw[pos:pos + header_len])
+    pos += header_len
+    lengths = []
+    for _ in range(header["n"]):
+        length, pos = _read_varint(raw, pos)
+        lengths.append(length)
+    tokens = []
+    extras = header["extras"]
+    for position, length in enumerate(lengths):
+        text = raw[pos:pos + length].decode("utf-8")
+        pos += length
+        extra = extras.get(str(position), {})
+        tokens.append(TokenEvent(text, extra.get("index", position), extra.get("finish_reason"),
+                                 extra.get("usage")))
+    offsets = None
+    if header["offsets"]:
+        offsets = tuple(array("f", raw[pos:pos + 4 * header["n"]]))
+    return tuple(tokens), offsets
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    Response cache shared by every process on a host through one SQLite file.
+
+    Uses the same LRU, memory-budget and TTL rules as ResponseCache. Recency
+    and the byte and entry totals live in the database, so uvicorn workers
+    fill and evict one cache together. Sizes count the encoded entry, which
+    is much smaller than the in-memory token objects. TTLs use wall-clock
+    time, since each process has its own monotonic clock.
+
+    The calls run on the event loop, so the only blocking point is kept small
+    and bounded. The database runs in WAL mode, where reads never wait for a
+    writer, and lookups only read: a hit's recency is noted in memory and
+    written by the process's next put, and expired entries are skipped rather
+    than deleted. Writes are a single transaction per put that stores the
+    entry, applies those recency updates, purges expired entries and evicts
+    the least recently used ones. A put waits at most ``busy_timeout`` for
+    another process's write lock; if it cannot get it, the response is simply
+    not stored and the conflict is counted.
+
+    Hit, miss and eviction counters, and the near-duplicate index of a
+    matcher, are kept per process. So is recency until it is written, so a
+    process that only reads refreshes the entries it serves the next time it
+    stores one.
+
+    Args:
+        path: Database file, created if missing
+        max_bytes: Budget for all encoded entries
+        ttl: Seconds an entry stays valid (None never expires)
+        max_entries: Optional bound on the number of entries
+        record_timing: Store per-token offsets so hits can be replayed paced
+        replay: 'instant' replays hits at once, 'paced' with the recorded timing
+        pace_scale: Multiplier applied to recorded offsets in paced replay
+        matcher: Optional normalized and near-duplicate topic lookup
+        busy_timeout: Longest a call blocks on another process's lock, in seconds
+    """
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = 3600.0,
+                 max_entries: Optional[int] = None, record_timing: bool = False,
+                 replay: str = "instant", pace_scale: float = 1.0,
+                 matcher: Optional[TopicMatcher] = None, busy_timeout: float = 0.1):
+        super().__init__(max_bytes=max_bytes, ttl=ttl, max_entries=max_entries, record_timing=record_timing,
+                         replay=replay, pace_scale=pace_scale, matcher=matcher)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self.write_conflicts = 0
+        with self._db_lock:
+            self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not cross a fork; each worker opens its own
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def __len__(self) -> int:
+        with self._db_lock:
+            return self._connection().execute("SELECT entries FROM totals").fetchone()[0]
+
+    @property
+    def bytes_used(self) -> int:
+        with self._db_lock:
+            return self._connection().execute("SELECT bytes FROM totals").fetchone()[0]
+
+    def get(self, key: str, count: bool = True) -> Optional[CacheEntry]:
+        now = time.time()
+        with self._db_lock:
+            try:
+                row = self._connection().execute("SELECT data, size, expires_at FROM entries "
+                                                 "WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Shared cache read failed, treating it as a miss: {e}")
+                row = None
+            if row is not None:
+                # Written with the next put, so a hit takes no write lock
+                self._touched.pop(key, None)
+                self._touched[key] = now
+                if len(self._touched) > MAX_PENDING_TOUCHES:
+                    del self._touched[next(iter(self._touched))]
+        if count:
+            self.count_lookup(row is not None)
+        if row is None:
+            return None
+        tokens, offsets = decode_tokens(row[0])
+        return CacheEntry(tokens, offsets, row[1], row[2])
+
+    def contains(self, key: str) -> bool:
+        with self._db_lock:
+            row = self._connection().execute("SELECT expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def put(self, key: str, tokens: Sequence[TokenEvent], offsets: Optional[Sequence[float]] = None) -> bool:
+        data = encode_tokens(tokens, offsets)
+        size = ENTRY_OVERHEAD + len(data)
+        if size > self.max_bytes:
+            return False
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else float("inf")
+        with self._db_lock:
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                # Another process held the write lock for longer than busy_timeout
+                self.write_conflicts += 1
+                logger.warning(f"Shared cache busy, not storing the response: {e}")
+                return False
+            try:
+                conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(used, touched) for touched, used in self._touched.items()])
+                self._touched.clear()
+                self.expirations += conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?)", (key, data, size, expires_at, now))
+                while True:
+                    total_bytes, entries = conn.execute("SELECT bytes, entries FROM totals").fetchone()
+                    if total_bytes <= self.max_bytes and not (self.max_entries and entries > self.max_entries):
+                        break
+                    conn.execute("DELETE FROM entries WHERE key = "
+                                 "(SELECT key FROM entries ORDER BY last_used LIMIT 1)")
+                    self.evictions += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def clear(self):
+        with self._db_lock:
+            self._touched.clear()
+            self._connection().execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["write_conflicts"] = self.write_conflicts
+        return stats
+
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def build_response_cache(backend: str = "memory", path: Optional[str] = None, **kwargs) -> ResponseCache:
+    """
+    Builds a response cache for a backend name.
+
+    Args:
+        backend: 'memory' for a per-process cache, 'sqlite' for one shared
+            by all processes through the file at ``path``
+        path: Database file of the 'sqlite' backend
+        **kwargs: ResponseCache settings (max_bytes, ttl, replay, matcher, ...)
+
+    Returns:
+        The cache
+    """
+    if backend == "memory":
+        return ResponseCache(**kwargs)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("The 'sqlite' cache backend needs a path")
+        return SQLiteResponseCache(path, **kwargs)
+    raise ValueError(f"Invalid cache backend '{backend}'; choose one of {list(CACHE_BACKENDS)}.")
@@ -0,0 +1,161 @@
+# src/single_flight.py
+import asyncio
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, AsyncGenerator, Callable, Dict, Hashable, Optional
+
+from src.response_cache import cache_bypassed
+from src.token_event import TokenEvent
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Subscriber:
+    """
+    One consumer of a shared flight.
+
+    Live tokens are delivered through a bounded buffer. A subscriber whose
+    buffer is full, or that joined late, is marked as lagging and reads from
+    the flight's history until it has caught up, so the upstream pump never
+    blocks on (or drops data for) a slow reader.
+    """
+    __slots__ = ("buffer", "maxsize", "position", "lagging", "ready")
+
+    def __init__(self, maxsize: int, lagging: bool):
+        self.buffer = deque()
+        self.maxsize = maxsize
+        self.position = 0
+        self.lagging = lagging
+        self.ready = asyncio.Event()
+
+    def offer(self, token: TokenEvent):
+        if not self.lagging:
+            if len(self.buffer) < self.maxsize:
+                self.buffer.append(token)
+            else:
+                self.lagging = True
+        self.ready.set()
+
+
+class _Flight:
+    """A single upstream stream and the subscribers attached to it."""
+    def __init__(self):
+        self.history = []
+        self.subscribers = set()
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent streams onto one upstream request.
+
+    The first request for a key starts the upstream stream; requests for the
+    same key arriving while it runs attach as subscribers. Requests that
+    bypass the cache have keys of their own, so they never join a flight that
+    may be replaying a cached response. They first receive
+    the tokens already produced, then live tokens. A subscriber that goes away
+    does not affect the others; the upstream request is cancelled only when
+    its last subscriber leaves.
+
+    Args:
+        buffer_size: Live tokens buffered per subscriber before it falls back
+            to catching up from the flight's history
+    """
+    def __init__(self, buffer_size: int = 256):
+        self.buffer_size = buffer_size
+        self.flights_started = 0
+        self.subscribers_joined = 0
+
+    def wrap(self, client_fn, key_fn: Callable[[str], Hashable] = None):
+        """
+        Wraps a client function with request coalescing.
+
+        Args:
+            client_fn: Async generator function (topic, config=None) to wrap
+            key_fn: Maps a topic to the coalescing key (defaults to the topic)
+
+        Returns:
+            An async generator function with the same signature as client_fn
+        """
+        flights: Dict[Hashable, _Flight] = {}
+        key_fn = key_fn or (lambda topic: topic)
+
+        def flight_key(topic: str, config: "RunnableConfig" = None) -> Hashable:
+            return key_fn(topic), cache_bypassed(config)
+
+        async def pump(key: Hashable, flight: _Flight, topic: str, config: "RunnableConfig"):
+            try:
+                async for token in client_fn(topic, config=config):
+                    flight.history.append(token)
+                    for subscriber in flight.subscribers:
+                        subscriber.offer(token)
+            except Exception as e:
+                logger.error(f"Error in coalesced stream: {str(e)}")
+                error = TokenEvent.failure(f"Error in coalesced stream: {str(e)}", len(flight.history))
+                flight.history.append(error)
+                for subscriber in flight.subscribers:
+                    subscriber.offer(error)
+            finally:
+                flight.done = True
+                if flights.get(key) is flight:
+                    del flights[key]
+                for subscriber in flight.subscribers:
+                    subscriber.ready.set()
+
+        async def stream_coalesced(topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
+            key = flight_key(topic, config)
+            flight = flights.get(key)
+            if flight is None:
+                flight = flights[key] = _Flight()
+                # The shared upstream must not carry one subscriber's callbacks
+                upstream_config = {"configurable": dict(config.get("configurable") or {})} if config else None
+                flight.task = asyncio.create_task(pump(key, flight, topic, upstream_config))
+                self.flights_started += 1
+                subscriber = _Subscriber(self.buffer_size, lagging=False)
+            else:
+                logger.info(f"Joining in-flight stream for topic: {topic}")
+                self.subscribers_joined += 1
+                subscriber = _Subscriber(self.buffer_size, lagging=True)
+            flight.subscribers.add(subscriber)
+
+            try:
+                while True:
+                    if subscriber.buffer:
+                        subscriber.position += 1
+                        yield subscriber.buffer.popleft()
+                    elif subscriber.lagging and subscriber.position < len(flight.history):
+                        subscriber.position += 1
+                        yield flight.history[subscriber.position - 1]
+                    elif flight.done:
+                        if subscriber.position >= len(flight.history):
+                            break
+                        subscriber.lagging = True
+                    else:
+                        # Caught up: switch back to the live buffer and wait
+                        subscriber.lagging = False
+                        subscriber.ready.clear()
+                        await subscriber.ready.wait()
+            finally:
+                flight.subscribers.discard(subscriber)
+                if not flight.subscribers and not flight.done:
+                    logger.info(f"Last subscriber left; cancelling upstream stream for topic: {topic}")
+                    if flights.get(key) is flight:
+                        del flights[key]
+                    flight.task.cancel()
+
+        stream_coalesced.active_flights = flights
+        stream_coalesced.flight_key = flight_key
+        stream_coalesced.__name__ = f"coalesced_{getattr(client_fn, '__name__', 'client')}"
+        return stream_coalesced
+
+    def stats(self) -> dict:
+        return {
+            "flights_started": self.flights_started,
+            "subscribers_joined": self.subscribers_joined,
+        }
@@ -0,0 +1,196 @@
+# src/sse.py
+import asyncio
+import itertools
+import json
+import logging
+import uuid
+from collections import deque
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, Optional, Tuple
+
+from src.token_event import TokenEvent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Serializes one Server-Sent Event; data is sent as JSON."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Splits a 'stream_id:seq' Last-Event-ID into its parts, or returns None if malformed."""
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None
+
+
+class BufferedStream:
+    """
+    One in-flight generation and a ring buffer of its most recent events.
+
+    Events are (seq, event_type, data) tuples numbered from 1. The generation
+    runs in its own task, independent of any client connection, so a client
+    that drops can reconnect and resume from the buffer.
+    """
+    def __init__(self, stream_id: str, capacity: int):
+        self.stream_id = stream_id
+        self.events = deque(maxlen=capacity)
+        self.last_seq = 0
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def first_seq(self) -> int:
+        return self.events[0][0] if self.events else self.last_seq + 1
+
+    def append(self, event_type: str, data: Any):
+        self.last_seq += 1
+        self.events.append((self.last_seq, event_type, data))
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    def changed(self) -> asyncio.Event:
+        """Event set on the next append or finish; capture it before reading the buffer."""
+        return self._changed
+
+    def _notify(self):
+        # Wake every waiting reader, then arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def events_after(self, seq: int):
+        # Sequence numbers are consecutive, so the resume point maps to a deque index
+        start = max(0, seq - self.first_seq + 1)
+        return list(itertools.islice(self.events, start, None))
+
+
+class StreamRegistry:
+    """
+    Keeps in-flight and recently finished SSE streams for resumption.
+
+    Args:
+        buffer_size: Events kept per stream; older ones cannot be resumed from
+        grace_period: Seconds a finished stream is kept for late reconnects,
+            and seconds a running stream may go without any connected client
+            before its generation is cancelled
+        heartbeat: Seconds of silence after which a keep-alive comment is sent
+        retry_ms: Reconnection delay advertised to EventSource clients
+    """
+    def __init__(self, buffer_size: int = 1024, grace_period: float = 60.0, heartbeat: float = 15.0,
+                 retry_ms: int = 1000):
+        self.buffer_size = buffer_size
+        self.grace_period = grace_period
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.streams: Dict[str, BufferedStream] = {}
+
+    def get(self, stream_id: str) -> Optional[BufferedStream]:
+        return self.streams.get(stream_id)
+
+    def start(self, source: AsyncIterable[TokenEvent]) -> BufferedStream:
+        """
+        Starts buffering a generation.
+
+        Args:
+            source: Async iterable of TokenEvents
+
+        Returns:
+            The new BufferedStream
+        """
+        stream = BufferedStream(uuid.uuid4().hex, self.buffer_size)
+        self.streams[stream.stream_id] = stream
+        stream.task = asyncio.create_task(self._pump(stream, source))
+        return stream
+
+    async def _pump(self, stream: BufferedStream, source: AsyncIterable[TokenEvent]):
+        try:
+            async for token in source:
+                if token.error is not None:
+                    stream.append("error", {"message": token.error})
+                else:
+                    stream.append("token", {"text": token.text})
+            stream.append("done", {})
+        except asyncio.CancelledError:
+            stream.append("error", {"message": "Stream abandoned by client"})
+            raise
+        except Exception as e:
+            logger.error(f"Error in SSE stream {stream.stream_id}: {str(e)}")
+            stream.append("error", {"message": str(e)})
+        finally:
+            stream.finish()
+            asyncio.get_running_loop().call_later(self.grace_period, self._evict, stream.stream_id)
+
+    def _evict(self, stream_id: str):
+        stream = self.streams.get(stream_id)
+        if stream is not None and stream.done and stream.subscribers == 0:
+            del self.streams[stream_id]
+            logger.debug(f"Evicted finished SSE stream {stream_id}")
+        elif stream is not None and stream.done:
+            asyncio.get_running_loop().call_later(self.grace_period, self._evict, stream_id)
+
+    def _check_abandoned(self, stream_id: str):
+        stream = self.streams.get(stream_id)
+        if stream is not None and not stream.done and stream.subscribers == 0:
+            logger.info(f"No client reconnected to SSE stream {stream_id}; cancelling generation")
+            stream.task.cancel()
+
+    async def subscribe(self, stream: BufferedStream, after_seq: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yields formatted SSE text for every event after ``after_seq``, then live events.
+
+        A comment line is sent after ``heartbeat`` seconds of silence. If the
+        requested resume point has already left the ring buffer, an error
+        event is sent and the stream continues from the oldest buffered event.
+        """
+        stream.subscribers += 1
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            if after_seq and after_seq + 1 < stream.first_seq:
+                yield format_sse("error", {"message": f"Events {after_seq + 1}-{stream.first_seq - 1} "
+                                                      f"are no longer buffered"})
+            seq = after_seq
+            while True:
+                changed = stream.changed()
+                for event_seq, event_type, data in stream.events_after(seq):
+                    seq = event_seq
+                    yield format_sse(event_type, data, event_id=f"{stream.stream_id}:{event_seq}")
+                if stream.done and seq >= stream.last_seq:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+        finally:
+            stream.subscribers -= 1
+            if stream.subscribers == 0 and not stream.done:
+                asyncio.get_running_loop().call_later(self.grace_period, self._check_abandoned, stream.stream_id)
+
+    async def close(self):
+        """Cancels generations still running, e.g. at shutdown, and waits for their cleanup."""
+        tasks = [s.task for s in self.streams.values() if s.task is not None and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self.streams),
+            "running": sum(1 for s in self.streams.values() if not s.done),
+            "subscribers": sum(s.subscribers for s in self.streams.values()),
+        }
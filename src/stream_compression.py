@@ -0,0 +1,202 @@
+# src/stream_compression.py
+import importlib.util
+import logging
+import os
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterable, Dict, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Server preference, best ratio per CPU first
+ENCODINGS = ("zstd", "br", "gzip", "deflate")
+
+# Levels suited to streaming: most of the ratio at a fraction of the CPU
+ZLIB_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+_ENCODING_MODULES = {"br": "brotli", "zstd": "zstandard"}
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Encodings whose compressor can be built here; brotli and zstd need optional packages."""
+    return tuple(e for e in ENCODINGS
+                 if e not in _ENCODING_MODULES or importlib.util.find_spec(_ENCODING_MODULES[e]) is not None)
+
+
+@dataclass(frozen=True)
+class CompressionConfig:
+    """
+    Negotiated compression of /stream responses.
+
+    Attributes:
+        enabled: Compress responses for clients that accept a supported encoding
+        encodings: Encodings offered, in order of preference
+    """
+    enabled: bool = False
+    encodings: Tuple[str, ...] = field(default_factory=available_encodings)
+
+    def __post_init__(self):
+        unknown = [e for e in self.encodings if e not in ENCODINGS]
+        if unknown:
+            raise ValueError(f"Invalid encodings {unknown}; choose from {list(ENCODINGS)}.")
+
+    @classmethod
+    def from_env(cls) -> "CompressionConfig":
+        """Builds a config from LLM_COMPRESS* environment variables, falling back to the defaults."""
+        encodings = os.environ.get("LLM_COMPRESS_ENCODINGS")
+        return cls(
+            enabled=os.environ.get("LLM_COMPRESS", "0").lower() in ("1", "true", "yes"),
+            encodings=tuple(e.strip() for e in encodings.split(",") if e.strip())
+            if encodings else available_encodings(),
+        )
+
+
+def negotiate_encoding(accept_encoding: Optional[str], offered: Tuple[str, ...]) -> Optional[str]:
+    """
+    Picks the content encoding for a response.
+
+    The server's order of preference decides among the encodings the client
+    accepts with a non-zero q-value; ``*`` accepts any offered encoding.
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header
+        offered: Encodings the server can produce, most preferred first
+
+    Returns:
+        The chosen encoding, or None for an uncompressed response
+    """
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    for encoding in offered:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    """
+    One compression context for the whole response.
+
+    Each ``compress`` call ends with a sync flush, so the bytes written so far
+    decode completely on the client while later chunks still reuse the
+    history of earlier ones.
+    """
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding in ("gzip", "deflate"):
+            # wbits 16+ writes a gzip wrapper; HTTP 'deflate' is the zlib format
+            wbits = 16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS
+            self._zlib = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, wbits)
+            self._compress = lambda data: self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = lambda: self._zlib.flush(zlib.Z_FINISH)
+        elif encoding == "br":
+            import brotli
+
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = lambda data: self._brotli.process(data) + self._brotli.flush()
+            self._finish = self._brotli.finish
+        elif encoding == "zstd":
+            import zstandard
+
+            self._zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._compress = lambda data: self._zstd.compress(data) + self._zstd.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = lambda: self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+        else:
+            raise ValueError(f"Unsupported encoding '{encoding}'")
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk and flushes it so the client can decode it at once."""
+        start = time.thread_time()
+        out = self._compress(data)
+        self.cpu_time += time.thread_time() - start
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        """Ends the compressed stream."""
+        start = time.thread_time()
+        out = self._finish()
+        self.cpu_time += time.thread_time() - start
+        self.bytes_out += len(out)
+        return out
+
+
+class CompressionStats:
+    """Bytes before and after compression and compressor CPU time, per encoding."""
+    def __init__(self):
+        self.streams: Dict[str, int] = {}
+        self.bytes_in: Dict[str, int] = {}
+        self.bytes_out: Dict[str, int] = {}
+        self.cpu_time: Dict[str, float] = {}
+
+    def record(self, compressor: StreamCompressor):
+        encoding = compressor.encoding
+        self.streams[encoding] = self.streams.get(encoding, 0) + 1
+        self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + compressor.bytes_in
+        self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + compressor.bytes_out
+        self.cpu_time[encoding] = self.cpu_time.get(encoding, 0.0) + compressor.cpu_time
+
+    def stats(self) -> dict:
+        return {
+            encoding: {
+                "streams": streams,
+                "bytes_in": self.bytes_in[encoding],
+                "bytes_out": self.bytes_out[encoding],
+                "ratio": round(self.bytes_in[encoding] / self.bytes_out[encoding], 3)
+                if self.bytes_out[encoding] else 0.0,
+                "cpu_us_per_stream": round(self.cpu_time[encoding] / streams * 1e6, 1),
+            }
+            for encoding, streams in self.streams.items()
+        }
+
+
+async def compress_stream(chunks: AsyncIterable[str], compressor: StreamCompressor,
+                          stats: Optional[CompressionStats] = None) -> AsyncGenerator[bytes, None]:
+    """
+    Compresses a chunked text stream, flushing at every chunk boundary.
+
+    Chunk boundaries are the ones chosen by the flush policy, so coalescing
+    decides both when bytes reach the socket and how much each flush costs.
+
+    Args:
+        chunks: Text chunks, e.g. from apply_flush_policy
+        compressor: The response's compression context
+        stats: Totals to add this stream to once it ends
+
+    Yields:
+        Compressed bytes for each chunk, then the end of the compressed stream
+    """
+    try:
+        async for chunk in chunks:
+            data = compressor.compress(chunk.encode("utf-8"))
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        if stats is not None:
+            stats.record(compressor)
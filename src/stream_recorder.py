@@ -0,0 +1,346 @@
+# src/stream_recorder.py
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Callable, List, Optional, Tuple
+
+from src.token_event import TokenEvent
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# One captured log line: (stream it belongs to, wall-clock time, event)
+Line = Tuple["StreamCapture", float, TokenEvent]
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.environ.get(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class RecorderConfig:
+    """
+    Capture of live streams into logs/openai_stream_*.jsonl for debugging and
+    offline replay.
+
+    Attributes:
+        enabled: Record streams at all
+        directory: Directory the log files are written to
+        sample_rate: Fraction of streams recorded (1.0: every stream)
+        max_buffer: Lines held in memory waiting to be written; a finished
+            stream that does not fit is dropped instead of blocking the stream
+        batch_size: Pending lines that wake the writer before its interval
+        flush_interval: Seconds between writes of the pending lines
+        max_file_mb: Uncompressed size at which a log file is rotated
+        max_file_age: Seconds after which a log file is rotated
+        gzip: Write gzipped files (openai_stream_*.jsonl.gz)
+    """
+    enabled: bool = False
+    directory: str = "logs"
+    sample_rate: float = 1.0
+    max_buffer: int = 10000
+    batch_size: int = 500
+    flush_interval: float = 1.0
+    max_file_mb: float = 64.0
+    max_file_age: float = 3600.0
+    gzip: bool = False
+
+    @classmethod
+    def from_env(cls) -> "RecorderConfig":
+        """Builds a config from LLM_RECORD* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            enabled=_env_flag("LLM_RECORD"),
+            directory=os.environ.get("LLM_RECORD_DIR", defaults.directory),
+            sample_rate=float(os.environ.get("LLM_RECORD_SAMPLE_RATE", defaults.sample_rate)),
+            max_buffer=int(os.environ.get("LLM_RECORD_MAX_BUFFER", defaults.max_buffer)),
+            batch_size=int(os.environ.get("LLM_RECORD_BATCH_SIZE", defaults.batch_size)),
+            flush_interval=float(os.environ.get("LLM_RECORD_FLUSH_INTERVAL", defaults.flush_interval)),
+            max_file_mb=float(os.environ.get("LLM_RECORD_MAX_FILE_MB", defaults.max_file_mb)),
+            max_file_age=float(os.environ.get("LLM_RECORD_MAX_FILE_AGE", defaults.max_file_age)),
+            gzip=_env_flag("LLM_RECORD_GZIP"),
+        )
+
+
+def _usage_dict(usage: Any) -> Optional[dict]:
+    if usage is None or isinstance(usage, dict):
+        return usage
+    # CompletionUsage of the OpenAI SDK
+    return usage.model_dump() if hasattr(usage, "model_dump") else dict(usage)
+
+
+def chunk_record(capture: "StreamCapture", event: TokenEvent, first: bool) -> dict:
+    """
+    The ChatCompletionChunk of a recorded event, in the shape the stream logs
+    and the replay server use; an error becomes {'error': message}.
+
+    Args:
+        capture: The stream the event belongs to (its id, start time and model)
+        event: The recorded TokenEvent
+        first: Whether it is the stream's first chunk, which carries the role
+    """
+    if event.error is not None:
+        return {"error": event.error}
+    chunk = {
+        "id": f"chatcmpl-rec-{capture.stream_id}",
+        "object": "chat.completion.chunk",
+        "created": int(capture.created),
+        "model": capture.model,
+        "system_fingerprint": None,
+        "choices": [],
+    }
+    # A usage-only event is the final chunk sent with stream_options.include_usage, which has no choices
+    if event.text or event.finish_reason is not None or event.usage is None:
+        chunk["choices"].append({
+            "index": 0,
+            "delta": {"role": "assistant" if first else None, "content": event.text,
+                      "function_call": None, "tool_calls": None},
+            "finish_reason": event.finish_reason,
+            "logprobs": None,
+        })
+    if event.usage is not None:
+        chunk["usage"] = _usage_dict(event.usage)
+    return chunk
+
+
+class RotatingLogWriter:
+    """
+    Appends serialized lines to openai_stream_<time>_<pid>_<n>.jsonl files,
+    starting a new file once the current one reaches its size or age limit.
+    Only used from the recorder's writer thread.
+    """
+    def __init__(self, directory: str, max_bytes: int, max_age: float, compress: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.files: List[str] = []
+        self._file = None
+        self._opened_at = 0.0
+        self._bytes = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        name = f"openai_stream_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}_{len(self.files)}{suffix}"
+        path = os.path.join(self.directory, name)
+        self._file = gzip.open(path, "at", encoding="utf-8") if self.compress else open(path, "a", encoding="utf-8")
+        self._opened_at = time.monotonic()
+        self._bytes = 0
+        self.files.append(path)
+        logger.info(f"Recording streams to {path}")
+
+    def write(self, lines: List[Line]) -> int:
+        """
+        Serializes and appends lines, rotating between streams when a limit is hit.
+
+        Returns:
+            Uncompressed bytes written
+        """
+        written = 0
+        chunk: List[str] = []
+        for i, (capture, timestamp, event) in enumerate(lines):
+            # A finished stream is buffered and written in one piece, so its first line is here too
+            first = i == 0 or lines[i - 1][0] is not capture
+            chunk.append(json.dumps({"timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                                     "stream": capture.stream_id,
+                                     "chunk": chunk_record(capture, event, first)}) + "\n")
+            # Streams are never split across files
+            last_of_stream = i + 1 == len(lines) or lines[i + 1][0] is not capture
+            if last_of_stream:
+                written += self._append("".join(chunk))
+                chunk = []
+        if self._file is not None:
+            self._file.flush()
+        return written
+
+    def _append(self, data: str) -> int:
+        if self._file is not None and (self._bytes >= self.max_bytes
+                                       or time.monotonic() - self._opened_at >= self.max_age):
+            self.close()
+        if self._file is None:
+            self._open()
+        self._file.write(data)
+        size = len(data.encode("utf-8"))
+        self._bytes += size
+        return size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StreamCapture:
+    """Events of one recorded stream, kept until the stream ends."""
+    __slots__ = ("stream_id", "model", "created", "lines")
+
+    def __init__(self, stream_id: str, model: Optional[str] = None):
+        self.stream_id = stream_id
+        self.model = model
+        self.created = time.time()
+        self.lines: List[Line] = []
+
+    def add(self, token: TokenEvent):
+        self.lines.append((self, time.time(), token))
+
+
+class StreamRecorder:
+    """
+    Records sampled streams without touching the disk on the token path.
+
+    Each token costs one tuple append. A finished stream is moved into a
+    bounded buffer in one piece, and a background task serializes and writes
+    the buffer in batches from a worker thread, as ChatCompletionChunk
+    records with the text, finish_reason and usage of each event. When the buffer is full the
+    stream is dropped and counted, so slow disks never hold up a response.
+
+    Args:
+        config: Sampling, buffer, batching and rotation settings
+        rng: Random source for sampling (defaults to a new random.Random)
+    """
+    def __init__(self, config: RecorderConfig, rng: Optional[random.Random] = None):
+        self.config = config
+        self._rng = rng or random.Random()
+        self._buffer: "deque[Line]" = deque()
+        self._writer = RotatingLogWriter(config.directory, int(config.max_file_mb * 1024 * 1024),
+                                         config.max_file_age, config.gzip)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._streams = 0
+        self.recorded = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.lines_written = 0
+        self.bytes_written = 0
+        self.write_errors = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def files(self) -> List[str]:
+        return list(self._writer.files)
+
+    def begin(self, model: Optional[str] = None) -> Optional[StreamCapture]:
+        """Starts capturing a stream of a model, or returns None if it is not sampled."""
+        if self.config.sample_rate < 1.0 and self._rng.random() >= self.config.sample_rate:
+            self.sampled_out += 1
+            return None
+        self._streams += 1
+        return StreamCapture(f"{os.getpid()}-{self._streams}", model)
+
+    def finish(self, capture: StreamCapture):
+        """Hands a finished stream to the writer, or drops it if the buffer is full."""
+        if not capture.lines:
+            return
+        if len(self._buffer) + len(capture.lines) > self.config.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.extend(capture.lines)
+        # The buffered lines reference the capture; drop its list so they do not form a cycle
+        capture.lines = []
+        self.recorded += 1
+        if self._wakeup is not None and len(self._buffer) >= self.config.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        """Starts the background writer on the running event loop."""
+        if self._task is not None:
+            return
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Writes everything buffered so far."""
+        if not self._buffer:
+            return
+        batch = list(self._buffer)
+        self._buffer.clear()
+        try:
+            self.bytes_written += await asyncio.to_thread(self._writer.write, batch)
+            self.lines_written += len(batch)
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"Failed to write {len(batch)} recorded lines: {e}")
+
+    async def aclose(self):
+        """Stops the writer, writes what is left and closes the current file."""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        await asyncio.to_thread(self._writer.close)
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "buffered": self.buffered,
+            "lines_written": self.lines_written,
+            "bytes_written": self.bytes_written,
+            "write_errors": self.write_errors,
+            "files": len(self._writer.files),
+        }
+
+
+def recorded_client(client_fn, recorder: StreamRecorder, params_fn: Optional[Callable[[str], dict]] = None):
+    """
+    Wraps a client function so sampled streams are recorded as they pass through.
+
+    The wrapper has the client function's signature, so it can be used by
+    stream_plain and by the LangGraph call_model node alike. Streams that fail
+    or are cancelled are recorded up to where they stopped.
+
+    Args:
+        client_fn: Async generator function (topic, config=None) to wrap
+        recorder: The StreamRecorder to hand finished streams to
+        params_fn: Request parameters of the client for a topic; the model
+            named there is recorded in every chunk
+
+    Returns:
+        An async generator function with the same signature as client_fn
+    """
+    async def stream_recorded(topic: str, config: "RunnableConfig" = None) -> AsyncGenerator[TokenEvent, None]:
+        capture = recorder.begin(params_fn(topic).get("model") if params_fn is not None else None)
+        async with aclosing(client_fn(topic, config=config)) as upstream:
+            if capture is None:
+                async for token in upstream:
+                    yield token
+                return
+            try:
+                async for token in upstream:
+                    capture.add(token)
+                    yield token
+            finally:
+                recorder.finish(capture)
+
+    stream_recorded.__name__ = f"recorded_{getattr(client_fn, '__name__', 'client')}"
+    return stream_recorded
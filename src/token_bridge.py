@@ -0,0 +1,221 @@
+# src/token_bridge.py
+import asyncio
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from src.token_event import TokenEvent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "coalesce", "abort")
+
+
+@dataclass(frozen=True)
+class BridgeConfig:
+    """
+    Settings of the bounded buffer between LLM callbacks and a token stream.
+
+    Attributes:
+        max_size: Events buffered per stream before the overflow policy applies
+        overflow: What happens when the buffer is full:
+            'block' makes the producing callback wait for the reader,
+            'coalesce' merges further tokens into one pending event, so no
+            text is lost but token boundaries are,
+            'abort' ends the stream with an error and cancels the generation
+        max_coalesced_chars: Characters the 'coalesce' policy may merge into
+            the pending event; past it the callback waits for the reader as
+            under 'block', so a stalled reader cannot grow the buffer
+    """
+    max_size: int = 256
+    overflow: str = "block"
+    max_coalesced_chars: int = 65536
+
+    def __post_init__(self):
+        if self.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if self.max_coalesced_chars < 1:
+            raise ValueError("max_coalesced_chars must be at least 1")
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{self.overflow}'. "
+                             f"Choose one of: {', '.join(OVERFLOW_POLICIES)}")
+
+    @classmethod
+    def from_env(cls) -> "BridgeConfig":
+        """Builds a config from LLM_BRIDGE_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            max_size=int(os.environ.get("LLM_BRIDGE_MAX_SIZE", defaults.max_size)),
+            overflow=os.environ.get("LLM_BRIDGE_OVERFLOW", defaults.overflow),
+            max_coalesced_chars=int(os.environ.get("LLM_BRIDGE_MAX_COALESCED_CHARS",
+                                                   defaults.max_coalesced_chars)),
+        )
+
+
+class BridgeStats:
+    """Depth and overflow counters aggregated over the bridges that share them, e.g. one app's."""
+    def __init__(self):
+        self.active = 0
+        self.depth = 0
+        self.high_water = 0
+        self.blocked = 0
+        self.coalesced = 0
+        self.aborted = 0
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "depth": self.depth,
+            "high_water": self.high_water,
+            "blocked": self.blocked,
+            "coalesced": self.coalesced,
+            "aborted": self.aborted,
+        }
+
+
+bridge_stats = BridgeStats()
+
+
+class TokenBridge:
+    """
+    Bounded single-producer, single-consumer handoff of TokenEvents.
+
+    The producer (an LLM callback) calls ``put`` and finally ``close``; the
+    consumer iterates the bridge. Waiting uses one future at a time, created
+    only when a side actually has to wait, so no timer or helper task is
+    needed per token or per stream.
+
+    Args:
+        config: Buffer size and overflow policy
+        stats: Counters to update (defaults to the process-wide bridge_stats)
+        on_abort: Called when the 'abort' policy ends the stream, e.g. to
+            cancel the generation feeding the bridge
+    """
+    def __init__(self, config: BridgeConfig = BridgeConfig(), stats: BridgeStats = bridge_stats,
+                 on_abort: Optional[Callable[[], Any]] = None):
+        self.config = config
+        self.stats = stats
+        self.on_abort = on_abort
+        self.buffer = deque()
+        self.high_water = 0
+        self.error: Optional[str] = None
+        self.closed = False
+        # Tokens that arrived while full under the 'coalesce' policy
+        self._overflow = []
+        self._overflow_chars = 0
+        self._overflow_index = 0
+        self._overflow_finish_reason = None
+        self._getter: Optional[asyncio.Future] = None
+        self._putter: Optional[asyncio.Future] = None
+        self._released = False
+        stats.active += 1
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    async def put(self, event: TokenEvent):
+        """Adds an event, applying the overflow policy if the buffer is full."""
+        if self.closed:
+            return
+        # Once tokens are merged, later ones join them so the order is kept
+        while self._overflow or len(self.buffer) >= self.config.max_size:
+            if self.config.overflow == "coalesce":
+                if self._overflow_chars + len(event.text) <= self.config.max_coalesced_chars or not self._overflow:
+                    self._add_overflow(event)
+                    return
+                # The merged text is at its cap as well; wait for the reader to take it
+            elif self.config.overflow == "abort":
+                self.stats.aborted += 1
+                logger.warning(f"Token buffer full ({self.config.max_size}); aborting stream")
+                self.close(f"Token buffer overflow: reader too slow (more than {self.config.max_size} "
+                           f"tokens pending)")
+                if self.on_abort is not None:
+                    self.on_abort()
+                return
+            self.stats.blocked += 1
+            self._putter = asyncio.get_running_loop().create_future()
+            try:
+                await self._putter
+            finally:
+                self._putter = None
+            if self.closed:
+                return
+        self._append(event)
+
+    def close(self, error: Optional[str] = None):
+        """Marks the end of the stream; an error is delivered after the buffered events."""
+        if self.closed:
+            return
+        self.closed = True
+        self.error = error
+        self._wake_getter()
+        if self._putter is not None and not self._putter.done():
+            self._putter.set_result(None)
+
+    def release(self):
+        """Drops buffered events and stops counting this bridge; call when the consumer is done."""
+        if self._released:
+            return
+        self._released = True
+        self.stats.active -= 1
+        self.stats.depth -= len(self.buffer)
+        self.buffer.clear()
+        self._overflow.clear()
+        self._overflow_chars = 0
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> TokenEvent:
+        while True:
+            if self.buffer:
+                event = self.buffer.popleft()
+                self.stats.depth -= 1
+                if self._putter is not None and not self._putter.done():
+                    self._putter.set_result(None)
+                return event
+            if self._overflow:
+                event = TokenEvent("".join(self._overflow), self._overflow_index, self._overflow_finish_reason)
+                self._overflow.clear()
+                self._overflow_chars = 0
+                if self._putter is not None and not self._putter.done():
+                    self._putter.set_result(None)
+                return event
+            if self.closed:
+                if self.error is not None:
+                    error, self.error = self.error, None
+                    return TokenEvent.failure(error)
+                raise StopAsyncIteration
+            self._getter = asyncio.get_running_loop().create_future()
+            try:
+                await self._getter
+            finally:
+                self._getter = None
+
+    def _append(self, event: TokenEvent):
+        self.buffer.append(event)
+        self.stats.depth += 1
+        depth = len(self.buffer)
+        if depth > self.high_water:
+            self.high_water = depth
+            if depth > self.stats.high_water:
+                self.stats.high_water = depth
+        self._wake_getter()
+
+    def _add_overflow(self, event: TokenEvent):
+        if not self._overflow:
+            self._overflow_index = event.index
+        self._overflow.append(event.text)
+        self._overflow_chars += len(event.text)
+        self._overflow_finish_reason = event.finish_reason
+        self.stats.coalesced += 1
+        self._wake_getter()
+
+    def _wake_getter(self):
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
@@ -0,0 +1,51 @@
+# src/token_event.py
+from typing import Any, Optional
+
+
+class TokenEvent:
+    """
+    One event of a token stream: a piece of text, or the error that ended the stream.
+
+    Every client adapter yields TokenEvents, so consumers check ``error`` and
+    read ``text`` without inspecting the shape of each token. Events are
+    shared (e.g. replayed from the cache or fanned out to coalesced
+    subscribers) and must not be mutated.
+
+    Attributes:
+        text: Token text; empty for events that only carry metadata
+        index: Position of the event in its stream, starting at 0
+        finish_reason: Why generation stopped, on the final event if the API reports it
+        usage: Token usage reported by the API, if any
+        error: Error message; set only on failure events
+    """
+    __slots__ = ("text", "index", "finish_reason", "usage", "error")
+
+    def __init__(self, text: str = "", index: int = 0, finish_reason: Optional[str] = None,
+                 usage: Any = None, error: Optional[str] = None):
+        self.text = text
+        self.index = index
+        self.finish_reason = finish_reason
+        self.usage = usage
+        self.error = error
+
+    @classmethod
+    def failure(cls, message: str, index: int = 0) -> "TokenEvent":
+        return cls(index=index, error=message)
+
+    def to_dict(self) -> dict:
+        """The {'content': ...} / {'error': ...} form used on JSON surfaces."""
+        if self.error is not None:
+            return {"error": self.error}
+        return {"content": self.text}
+
+    def __eq__(self, other):
+        if not isinstance(other, TokenEvent):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"TokenEvent(error={self.error!r}, index={self.index})"
+        return f"TokenEvent({self.text!r}, index={self.index}, finish_reason={self.finish_reason!r})"
@@ -0,0 +1,254 @@
+# src/topic_matcher.py
+import hashlib
+import logging
+import random
+import re
+import string
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUNCTUATION = str.maketrans({c: " " for c in string.punctuation})
+_ARTICLES = frozenset(("a", "an", "the"))
+# Words the plural rule must leave alone
+_SINGULAR_S = frozenset(("news", "physics", "chess", "glass", "bus", "gas", "series", "species", "lens"))
+
+# Mersenne prime for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+def _singular(word: str) -> str:
+    """Lemmatization-lite: strips the common English plural endings."""
+    if len(word) <= 3 or word in _SINGULAR_S or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "case": str.casefold,
+    "punctuation": lambda topic: topic.translate(_PUNCTUATION),
+    "whitespace": lambda topic: _WHITESPACE_RE.sub(" ", topic).strip(),
+    "articles": lambda topic: " ".join(w for w in topic.split(" ") if w not in _ARTICLES) or topic,
+    "plural": lambda topic: " ".join(_singular(w) for w in topic.split(" ")),
+}
+
+# Applied in this order; later steps expect the earlier ones
+DEFAULT_NORMALIZERS = ("case", "punctuation", "whitespace", "articles", "plural")
+
+
+def make_normalizer(names: Sequence[str]) -> Callable[[str], str]:
+    """
+    Composes normalization steps from NORMALIZERS.
+
+    Args:
+        names: Step names, applied in the given order
+
+    Returns:
+        A function mapping a topic to its normalized form
+    """
+    unknown = [n for n in names if n not in NORMALIZERS]
+    if unknown:
+        raise ValueError(f"Invalid normalizers {unknown}; choose from {sorted(NORMALIZERS)}.")
+    steps = [NORMALIZERS[n] for n in names]
+
+    def normalize(topic: str) -> str:
+        for step in steps:
+            topic = step(topic)
+        return topic
+
+    return normalize
+
+
+def shingles(topic: str, size: int = 3) -> FrozenSet[str]:
+    """Character n-grams of a topic, padded so short words still produce some."""
+    padded = f" {topic} "
+    if len(padded) <= size:
+        return frozenset((padded,))
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashLSH:
+    """
+    MinHash signatures of shingle sets, banded into LSH buckets.
+
+    Two sets share a bucket in at least one band with a probability that rises
+    steeply around a similarity of ``(1 / bands) ** (1 / rows)``, so a lookup
+    only compares against a handful of candidates.
+
+    Args:
+        num_perm: Hash functions per signature
+        bands: Bands the signature is split into (must divide num_perm)
+        seed: Seed of the hash functions, so signatures are reproducible
+    """
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._buckets: List[Dict[Tuple[int, ...], Set[str]]] = [{} for _ in range(bands)]
+        self._bands_of: Dict[str, List[Tuple[int, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._bands_of)
+
+    def signature(self, items: FrozenSet[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                  for s in items]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _bands(self, items: FrozenSet[str]) -> List[Tuple[int, ...]]:
+        sig = self.signature(items)
+        return [tuple(sig[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def add(self, key: str, items: FrozenSet[str]):
+        if key in self._bands_of:
+            return
+        bands = self._bands(items)
+        self._bands_of[key] = bands
+        for buckets, band in zip(self._buckets, bands):
+            buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key: str):
+        bands = self._bands_of.pop(key, None)
+        if bands is None:
+            return
+        for buckets, band in zip(self._buckets, bands):
+            bucket = buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band]
+
+    def candidates(self, items: FrozenSet[str]) -> Set[str]:
+        found: Set[str] = set()
+        for buckets, band in zip(self._buckets, self._bands(items)):
+            found |= buckets.get(band, set())
+        return found
+
+
+@dataclass(frozen=True)
+class TopicMatchConfig:
+    """
+    Cache lookup tiers beyond the exact key.
+
+    Attributes:
+        normalizers: Steps from NORMALIZERS applied to a topic before it is
+            used in the cache key (empty: the topic is used as given)
+        near_threshold: Minimum shingle Jaccard similarity at which a cached
+            topic is served for a different one (None: no near matching)
+        num_perm: MinHash hash functions per topic
+        bands: LSH bands the signature is split into
+        max_topics: Topics kept in the near-duplicate index
+    """
+    normalizers: Tuple[str, ...] = DEFAULT_NORMALIZERS
+    near_threshold: Optional[float] = None
+    num_perm: int = 64
+    bands: int = 16
+    max_topics: int = 10000
+
+
+class TopicMatcher:
+    """
+    Maps a topic to the topic its cached response is stored under.
+
+    Lookups go through two tiers: the normalized topic (so 'Dogs', 'dogs ',
+    'a dog' and 'DOGS!' share one entry), then, if enabled, the most similar
+    indexed topic found through MinHash/LSH. LSH candidates are verified
+    against their exact shingle similarity before they are served; candidates
+    that fail the check are counted as LSH rejections, i.e. the wrong answers
+    MinHash alone would have given at this threshold.
+
+    Args:
+        config: Normalization and near-duplicate settings
+        normalizer: Custom normalization function used instead of config.normalizers
+    """
+    def __init__(self, config: Optional[TopicMatchConfig] = None,
+                 normalizer: Optional[Callable[[str], str]] = None):
+        self.config = config or TopicMatchConfig()
+        self.normalize = normalizer or make_normalizer(self.config.normalizers)
+        self._lsh = MinHashLSH(self.config.num_perm, self.config.bands)
+        self._topics: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self.lookups = 0
+        self.normalized_hits = 0
+        self.near_hits = 0
+        self.lsh_rejected = 0
+
+    @property
+    def near_enabled(self) -> bool:
+        return self.config.near_threshold is not None
+
+    def add(self, topic: str):
+        """Indexes a normalized topic whose response was just cached."""
+        if not self.near_enabled:
+            return
+        if topic in self._topics:
+            self._topics.move_to_end(topic)
+            return
+        items = shingles(topic)
+        self._topics[topic] = items
+        self._lsh.add(topic, items)
+        while len(self._topics) > self.config.max_topics:
+            oldest, _ = self._topics.popitem(last=False)
+            self._lsh.remove(oldest)
+
+    def discard(self, topic: str):
+        """Drops a topic whose cache entry is gone."""
+        if self._topics.pop(topic, None) is not None:
+            self._lsh.remove(topic)
+
+    def nearest(self, topic: str, record: bool = True) -> Optional[Tuple[str, float]]:
+        """
+        Finds the most similar indexed topic at or above the threshold.
+
+        Args:
+            topic: A normalized topic
+            record: Count candidates rejected by the exact check
+
+        Returns:
+            Tuple of (indexed topic, similarity), or None
+        """
+        if not self.near_enabled or not self._topics:
+            return None
+        items = shingles(topic)
+        best = None
+        for candidate in self._lsh.candidates(items):
+            if candidate == topic:
+                continue
+            similarity = jaccard(items, self._topics[candidate])
+            if similarity < self.config.near_threshold:
+                if record:
+                    self.lsh_rejected += 1
+                continue
+            if best is None or similarity > best[1]:
+                best = (candidate, similarity)
+        return best
+
+    def stats(self) -> dict:
+        hits = self.normalized_hits + self.near_hits
+        return {
+            "lookups": self.lookups,
+            "normalized_hits": self.normalized_hits,
+            "near_hits": self.near_hits,
+            "lsh_rejected": self.lsh_rejected,
+            "indexed_topics": len(self._topics),
+            "hit_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "near_hit_rate": round(self.near_hits / self.lookups, 4) if self.lookups else 0.0,
+        }
@@ -0,0 +1,145 @@
+# src/warmup.py
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WarmupConfig:
+    """
+    What the app does at startup before it reports ready.
+
+    Client objects and compiled graphs are always built; the rest is opt-in.
+
+    Attributes:
+        connections: Upstream connections to open per connection pool (kept
+            for the pool's keep-alive expiry, up to its keep-alive limit)
+        probe: Stream one short generation through the configured path and
+            stop at its first token; a failed probe keeps the app not ready
+        probe_topic: Topic of the probe request
+        timeout: Seconds the warm-up may take before it gives up
+        block_startup: Finish warming before the server accepts connections;
+            if False, serve at once and report not ready until warm
+    """
+    connections: int = 0
+    probe: bool = False
+    probe_topic: str = "warm-up"
+    timeout: float = 10.0
+    block_startup: bool = True
+
+    @classmethod
+    def from_env(cls) -> "WarmupConfig":
+        """Builds a config from LLM_WARMUP_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            connections=int(os.environ.get("LLM_WARMUP_CONNECTIONS", defaults.connections)),
+            probe=os.environ.get("LLM_WARMUP_PROBE", "0").lower() in ("1", "true", "yes"),
+            probe_topic=os.environ.get("LLM_WARMUP_PROBE_TOPIC", defaults.probe_topic),
+            timeout=float(os.environ.get("LLM_WARMUP_TIMEOUT", defaults.timeout)),
+            block_startup=os.environ.get("LLM_WARMUP_BLOCK", "1").lower() in ("1", "true", "yes"),
+        )
+
+
+class WarmupState:
+    """Progress of the warm-up, as reported by the readiness endpoint."""
+    def __init__(self):
+        self.status = "pending"
+        self.duration: Optional[float] = None
+        self.connections = 0
+        self.probe_ttft: Optional[float] = None
+        self.errors: List[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def stats(self) -> dict:
+        return {
+            "status": self.status,
+            "duration": self.duration,
+            "connections": self.connections,
+            "probe_ttft": self.probe_ttft,
+            "errors": list(self.errors),
+        }
+
+
+async def open_connections(sdk_clients: List[Any], count: int) -> int:
+    """
+    Opens ``count`` connections in each client's pool by sending that many
+    concurrent model-list requests; the connections stay pooled afterwards.
+
+    Returns:
+        Number of requests that got a response
+    """
+    async def one(client):
+        await client.models.list()
+
+    results = await asyncio.gather(*(one(c) for c in sdk_clients for _ in range(count)), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        logger.warning(f"{len(failures)} of {len(results)} warm-up connections failed: {failures[0]}")
+    return len(results) - len(failures)
+
+
+async def probe(client_fn: Callable, topic: str) -> float:
+    """
+    Streams one generation until its first token, then closes it.
+
+    Returns:
+        Seconds to the first token
+
+    Raises:
+        RuntimeError: If the stream failed or ended without a token
+    """
+    start = time.perf_counter()
+    async with aclosing(client_fn(topic)) as events:
+        async for event in events:
+            if event.error is not None:
+                raise RuntimeError(event.error)
+            if event.text:
+                return time.perf_counter() - start
+    raise RuntimeError("Probe stream ended without a token")
+
+
+async def run_warmup(config: WarmupConfig, state: WarmupState, build_clients: Callable[[], List[Any]],
+                     client_fn: Callable):
+    """
+    Runs the warm-up and records its outcome in ``state``.
+
+    Args:
+        config: What to warm
+        state: Updated as the warm-up progresses
+        build_clients: Builds the client objects and returns the AsyncOpenAI
+            clients whose connection pools should be warmed
+        client_fn: Client function used by the probe
+    """
+    async def warm():
+        sdk_clients = build_clients()
+        if config.connections > 0:
+            state.connections = await open_connections(sdk_clients, config.connections)
+        if config.probe:
+            state.probe_ttft = await probe(client_fn, config.probe_topic)
+
+    state.status = "warming"
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(warm(), config.timeout)
+        state.status = "ready"
+    except Exception as e:
+        message = "Warm-up timed out" if isinstance(e, asyncio.TimeoutError) else f"Warm-up failed: {e}"
+        state.errors.append(message)
+        # Without an explicit probe the app can still serve; a failed probe means it cannot
+        state.status = "failed" if config.probe else "ready"
+        logger.warning(message)
+    finally:
+        state.duration = time.perf_counter() - start
+    logger.info(f"Warm-up {state.status} in {state.duration:.2f}s: {state.connections} connections"
+                + (f", probe TTFT {state.probe_ttft:.3f}s" if state.probe_ttft is not None else ""))
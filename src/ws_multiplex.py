@@ -0,0 +1,256 @@
+# src/ws_multiplex.py
+import asyncio
+import json
+import logging
+import os
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from src.token_event import TokenEvent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WebSocketConfig:
+    """
+    Limits of the multiplexed /ws endpoint.
+
+    Attributes:
+        max_streams: Generations one connection may run at once
+        initial_credit: Token frames a stream may send before the client
+            grants more, unless the start message sets its own
+        max_credit: Largest credit a stream can hold; grants beyond it are clipped
+    """
+    max_streams: int = 16
+    initial_credit: int = 64
+    max_credit: int = 4096
+
+    @classmethod
+    def from_env(cls) -> "WebSocketConfig":
+        """Builds a config from LLM_WS_* environment variables, falling back to the defaults."""
+        defaults = cls()
+        return cls(
+            max_streams=int(os.environ.get("LLM_WS_MAX_STREAMS", defaults.max_streams)),
+            initial_credit=int(os.environ.get("LLM_WS_INITIAL_CREDIT", defaults.initial_credit)),
+            max_credit=int(os.environ.get("LLM_WS_MAX_CREDIT", defaults.max_credit)),
+        )
+
+
+class StreamRejected(Exception):
+    """Raised by a stream opener when a generation cannot start, e.g. by admission control."""
+    def __init__(self, message: str, status_code: int, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class MultiplexStats:
+    """Connections, streams and flow-control stalls of the /ws endpoint."""
+    def __init__(self):
+        self.connections = 0
+        self.active = 0
+        self.started = 0
+        self.cancelled = 0
+        self.credit_stalls = 0
+        self.protocol_errors = 0
+
+
+class StreamCredit:
+    """Token frames a stream may still send; sending waits while it is zero."""
+    def __init__(self, initial: int, maximum: int):
+        self.maximum = maximum
+        self.available = min(initial, maximum)
+        self._granted = asyncio.Event()
+
+    def grant(self, n: int):
+        self.available = min(self.available + n, self.maximum)
+        if self.available > 0:
+            self._granted.set()
+
+    async def acquire(self) -> bool:
+        """Takes one credit; returns True if it had to wait for it."""
+        waited = False
+        while self.available <= 0:
+            waited = True
+            self._granted.clear()
+            await self._granted.wait()
+        self.available -= 1
+        return waited
+
+
+class _Stream:
+    def __init__(self, stream_id: str, credit: StreamCredit):
+        self.stream_id = stream_id
+        self.credit = credit
+        self.cancel_requested = False
+        self.started = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class MultiplexSession:
+    """
+    Runs many generations over one WebSocket connection.
+
+    Messages are JSON objects in both directions. The client sends:
+        {"type": "start", "id": "a", "topic": "dogs", "credit": 32, "cache_bypass": false}
+        {"type": "credit", "id": "a", "n": 32}
+        {"type": "cancel", "id": "a"}
+
+    and receives frames tagged with the stream id, interleaved across streams:
+        {"type": "token", "id": "a", "seq": 1, "text": "Why"}
+        {"type": "error", "id": "a", "message": "...", "status": 429, "retry_after": "1"}
+        {"type": "done", "id": "a", "tokens": 42}
+        {"type": "cancelled", "id": "a"}
+        {"type": "protocol_error", "id": "a", "message": "..."}
+
+    Every started stream ends with exactly one 'done' or 'cancelled' frame,
+    after which its id may be reused. Each token frame spends one credit of
+    its stream; a stream without credit stops reading from its generation,
+    so a client that falls behind on one stream holds back only that
+    stream's upstream request. Credit and cancel messages for streams that
+    already ended are ignored, since they can cross the final frame.
+
+    Args:
+        send: Sends one frame (a JSON-serializable dict) to the client
+        open_stream: Starts a generation for (topic, cache_bypass) and
+            returns its TokenEvents; may raise StreamRejected
+        config: Stream and credit limits
+        stats: Counters shared by all connections of the app
+    """
+    def __init__(self, send: Callable[[dict], Awaitable[None]],
+                 open_stream: Callable[[str, bool], Awaitable[AsyncIterator[TokenEvent]]],
+                 config: WebSocketConfig = WebSocketConfig(), stats: Optional[MultiplexStats] = None):
+        self._send_frame = send
+        self.open_stream = open_stream
+        self.config = config
+        self.stats = stats or MultiplexStats()
+        self.streams: Dict[str, _Stream] = {}
+        self._send_lock = asyncio.Lock()
+        self._closed = False
+
+    async def send(self, frame: dict):
+        # Frames of concurrent streams must not interleave mid-message
+        async with self._send_lock:
+            await self._send_frame(frame)
+
+    async def protocol_error(self, message: str, stream_id=None):
+        self.stats.protocol_errors += 1
+        await self.send({"type": "protocol_error", "id": stream_id, "message": message})
+
+    async def handle_text(self, text: str):
+        """Handles one message received from the client."""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            await self.protocol_error("Messages must be JSON objects")
+            return
+        if not isinstance(message, dict):
+            await self.protocol_error("Messages must be JSON objects")
+            return
+        kind = message.get("type")
+        stream_id = message.get("id")
+        if not isinstance(stream_id, str) or not stream_id:
+            await self.protocol_error("Messages need a non-empty string 'id'")
+            return
+        if kind == "start":
+            await self._start(stream_id, message)
+        elif kind == "credit":
+            n = message.get("n")
+            if not isinstance(n, int) or isinstance(n, bool) or n <= 0:
+                await self.protocol_error("'n' must be a positive integer", stream_id)
+                return
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream.credit.grant(n)
+        elif kind == "cancel":
+            stream = self.streams.get(stream_id)
+            if stream is not None and not stream.cancel_requested:
+                stream.cancel_requested = True
+                # A task cancelled before its first step would skip the cleanup in _run
+                if stream.started:
+                    stream.task.cancel()
+        else:
+            await self.protocol_error(f"Unknown message type '{kind}'", stream_id)
+
+    async def _start(self, stream_id: str, message: dict):
+        if stream_id in self.streams:
+            await self.protocol_error(f"Stream '{stream_id}' is already running", stream_id)
+            return
+        credit = message.get("credit", self.config.initial_credit)
+        if not isinstance(credit, int) or isinstance(credit, bool) or credit < 0:
+            await self.protocol_error("'credit' must be a non-negative integer", stream_id)
+            return
+        topic = message.get("topic", "dogs")
+        if not isinstance(topic, str):
+            await self.protocol_error("'topic' must be a string", stream_id)
+            return
+        if len(self.streams) >= self.config.max_streams:
+            await self.send({"type": "error", "id": stream_id, "status": 429,
+                             "message": f"At most {self.config.max_streams} streams may run on one connection"})
+            await self.send({"type": "done", "id": stream_id, "tokens": 0})
+            return
+        stream = _Stream(stream_id, StreamCredit(credit, self.config.max_credit))
+        self.streams[stream_id] = stream
+        self.stats.started += 1
+        self.stats.active += 1
+        stream.task = asyncio.create_task(self._run(stream, topic, bool(message.get("cache_bypass"))))
+
+    async def _run(self, stream: _Stream, topic: str, cache_bypass: bool):
+        stream_id = stream.stream_id
+        tokens = 0
+        final = None
+        try:
+            stream.started = True
+            if stream.cancel_requested:
+                raise asyncio.CancelledError
+            # Admission may wait; it runs in the stream's task so other streams are not held up
+            try:
+                source = await self.open_stream(topic, cache_bypass)
+            except StreamRejected as e:
+                await self.send({"type": "error", "id": stream_id, "message": str(e),
+                                 "status": e.status_code, "retry_after": e.retry_after})
+            else:
+                async with aclosing(source) as events:
+                    async for event in events:
+                        if event.error is not None:
+                            await self.send({"type": "error", "id": stream_id, "message": event.error})
+                            continue
+                        if await stream.credit.acquire():
+                            self.stats.credit_stalls += 1
+                        tokens += 1
+                        await self.send({"type": "token", "id": stream_id, "seq": tokens, "text": event.text})
+            final = {"type": "done", "id": stream_id, "tokens": tokens}
+        except asyncio.CancelledError:
+            if not stream.cancel_requested or self._closed:
+                raise
+            # Closing the generation above has already cancelled its upstream request
+            self.stats.cancelled += 1
+            logger.info(f"Client cancelled WebSocket stream '{stream_id}' after {tokens} tokens")
+            final = {"type": "cancelled", "id": stream_id}
+        except Exception as e:
+            # Sending failed; the connection is gone and aclose cleans up
+            logger.debug(f"WebSocket stream '{stream_id}' stopped: {str(e)}")
+        finally:
+            # Freed before the final frame so the client may reuse the id as soon as it sees it
+            self.streams.pop(stream_id, None)
+            self.stats.active -= 1
+        if final is not None:
+            try:
+                await self.send(final)
+            except Exception as e:
+                logger.debug(f"Could not send end of WebSocket stream '{stream_id}': {str(e)}")
+
+    async def aclose(self):
+        """Cancels every running stream, e.g. when the client disconnects, and waits for their cleanup."""
+        self._closed = True
+        tasks = [s.task for s in self.streams.values() if s.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Streams whose task was cancelled before it ran
+        self.stats.active -= len(self.streams)
+        self.streams.clear()
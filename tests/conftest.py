@@ -0,0 +1,79 @@
+import os
+import pytest
+
+# Without an API key the suite runs against the offline replay server built from
+# logs/*.jsonl. Set LLM_REPLAY=1 to force replay, or LLM_REPLAY=0 to force live calls.
+REPLAY = os.environ.get("LLM_REPLAY", "0" if os.environ.get("OPENAI_API_KEY") else "1") == "1"
+
+_replay_server = None
+
+
+def pytest_configure(config):
+    global _replay_server
+    if not REPLAY:
+        return
+    from src.replay_server import create_replay_app, start_replay_server
+
+    time_scale = float(os.environ.get("LLM_REPLAY_TIME_SCALE", "0"))
+    _replay_server, base_url = start_replay_server(create_replay_app(time_scale=time_scale))
+    # Must be set before src.openai_client builds its AsyncOpenAI singleton
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "replay"
+
+
+def pytest_unconfigure(config):
+    if _replay_server is not None:
+        _replay_server.should_exit = True
+
+
+def pytest_collection_modifyitems(config, items):
+    if not REPLAY:
+        return
+    # These tests capture live API traffic into logs/; replaying would only re-record the fixtures
+    skip_live = pytest.mark.skip(reason="records live OpenAI responses; not meaningful against the replay server")
+    for item in items:
+        if item.fspath.basename == "test_openai_stream_responses.py":
+            item.add_marker(skip_live)
+
+
+class FakeClient:
+    """Client function stand-in that streams a short joke about the topic and records each call."""
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    async def __call__(self, topic, config=None):
+        from src.token_event import TokenEvent
+
+        self.calls.append(topic)
+        if self.error is not None:
+            yield TokenEvent.failure(self.error)
+            return
+        for text in ("Why", " did", " the ", topic, "?"):
+            yield TokenEvent(text)
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient()
+
+
+@pytest.fixture
+def failing_client():
+    return FakeClient(error="Connection error: Error code: 500 - {'error': {'message': 'boom'}}")
+
+
+@pytest.fixture
+def fake_stream_app(monkeypatch, fake_client):
+    """
+    Builds apps whose langchain client streams fake_client instead of calling the API.
+
+    Call it with create_app's keyword arguments; client_mode defaults to "langchain".
+    """
+    from src import fastapi_endpoint, langchain_openai_client
+
+    def make(**create_app_kwargs):
+        monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", fake_client)
+        create_app_kwargs.setdefault("client_mode", "langchain")
+        return fastapi_endpoint.create_app(**create_app_kwargs)
+    return make
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from src.admission import AdmissionConfig, AdmissionController, AdmissionRejected, TokenBucket, estimate_tokens
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(per_minute=60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+
+
+def test_estimate_tokens():
+    params = {"messages": [{"role": "user", "content": "x" * 40}]}
+    assert estimate_tokens(params, completion_tokens=100) == 110
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_queues_in_order_and_releases():
+    controller = AdmissionController(AdmissionConfig(max_concurrent=1, queue_timeout=1.0))
+    first = await controller.acquire()
+    order = []
+
+    async def waiter(name):
+        ticket = await controller.acquire()
+        order.append(name)
+        await asyncio.sleep(0.01)
+        ticket.release()
+        return ticket
+
+    tasks = [asyncio.create_task(waiter(n)) for n in ("a", "b")]
+    await asyncio.sleep(0.02)
+    assert controller.queued == 2 and order == []
+    first.release()
+    tickets = await asyncio.gather(*tasks)
+    assert order == ["a", "b"]
+    assert tickets[0].wait > 0
+    assert controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_full_and_deadline_rejections():
+    controller = AdmissionController(AdmissionConfig(max_concurrent=1, max_queue=1, queue_timeout=0.05))
+    await controller.acquire()
+    queued = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as full:
+        await controller.acquire()
+    assert full.value.status_code == 503 and full.value.reason == "queue_full"
+
+    with pytest.raises(AdmissionRejected) as timeout:
+        await queued
+    assert timeout.value.reason == "timeout" and timeout.value.retry_after >= 1
+    assert controller.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_exhausted_rate_limit_is_rejected_fast():
+    controller = AdmissionController(AdmissionConfig(requests_per_minute=1, queue_timeout=5.0))
+    (await controller.acquire()).release()
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire()
+    assert rejected.value.status_code == 429
+    assert 55 <= rejected.value.retry_after <= 60
+
+
+def test_endpoint_returns_retry_after_when_saturated(fake_stream_app):
+    from fastapi.testclient import TestClient
+
+    admission = AdmissionController(AdmissionConfig(requests_per_minute=1, queue_timeout=1.0))
+    app = fake_stream_app(admission=admission)
+    client = TestClient(app)
+
+    assert "Why did the dogs" in client.get("/stream?topic=dogs").text
+    response = client.get("/stream?topic=cats")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission.active == 0
+
+    metrics = client.get("/metrics").text
+    assert 'llm_admission_rejected_total{reason="rate_limited"} 1' in metrics
+    assert "llm_admission_queue_wait_seconds_count 1" in metrics
@@ -0,0 +1,160 @@
+import json
+import os
+import random
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend_pool import BackendConfig, BackendPool, BackendPoolConfig, load_backend_configs
+from src.fastapi_endpoint import create_app
+from src.hedging import HedgingConfig
+from src.openai_client import OpenAIStreamClient
+
+UNREACHABLE = "http://127.0.0.1:9/v1"
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+def make_pool(*names, **config):
+    return BackendPool([BackendConfig(base_url=f"http://{n}/v1", name=n) for n in names], BackendPoolConfig(**config))
+
+
+def test_least_outstanding_spreads_load_and_avoids_slow_backends():
+    pool = make_pool("a", "b")
+    first, second = pool.acquire(), pool.acquire()
+    assert {first.backend.name, second.backend.name} == {"a", "b"}
+    first.release()
+    second.release()
+
+    backends = {b.name: b for b in pool.backends}
+    backends["a"].latency, backends["b"].latency = 0.1, 1.0
+    picked = [pool.acquire() for _ in range(5)]
+    # 'a' takes load until (outstanding + 1) * latency catches up with idle 'b'
+    assert [lease.backend.name for lease in picked].count("a") >= 4
+
+
+def test_weighted_routing_follows_weights():
+    pool = BackendPool([BackendConfig("http://a/v1", name="a", weight=3), BackendConfig("http://b/v1", name="b")],
+                       BackendPoolConfig(routing="weighted"), rng=random.Random(0))
+    names = [pool.pick().name for _ in range(2000)]
+    assert 0.7 < names.count("a") / len(names) < 0.8
+
+
+def test_ewma_latency():
+    pool = make_pool("a", ewma_alpha=0.5)
+    backend = pool.backends[0]
+    pool._record_success(backend, 1.0)
+    pool._record_success(backend, 0.0)
+    assert backend.latency == pytest.approx(0.5)
+
+
+def test_failing_backend_is_ejected_and_readmitted():
+    pool = make_pool("a", "b", failure_threshold=2, ejection_time=0.05)
+    bad = pool.backends[0]
+    for _ in range(2):
+        pool._record_failure(bad)
+    assert all(pool.pick().name == "b" for _ in range(10))
+
+    time.sleep(0.06)
+    assert not bad.stats()["ejected"]
+    # Still on probation: one more failure ejects it again, for twice as long
+    pool._record_failure(bad)
+    assert bad.ejected_until - time.monotonic() > 0.06
+    pool._record_success(bad, 0.1)
+    assert bad.failures == 0 and bad.ejections == 0
+
+
+def test_client_errors_do_not_count_against_a_backend():
+    pool = make_pool("a", failure_threshold=1)
+    lease = pool.acquire()
+    lease.fail(APIError(400))
+    lease.release()
+    assert pool.backends[0].failures == 0
+    lease = pool.acquire()
+    lease.fail(APIError(503))
+    lease.release()
+    assert pool.backends[0].stats() == {"outstanding": 0, "latency": None, "requests": 2, "errors": 1,
+                                        "ejected": True}
+
+
+def test_all_ejected_uses_the_backend_due_back_first():
+    pool = make_pool("a", "b", failure_threshold=1)
+    pool._record_failure(pool.backends[1])
+    pool._record_failure(pool.backends[0])
+    assert pool.pick().name == "b"
+
+
+def test_load_backend_configs(tmp_path, monkeypatch):
+    monkeypatch.setenv("SECOND_KEY", "secret")
+    path = tmp_path / "backends.json"
+    path.write_text(json.dumps([
+        {"base_url": "http://a/v1", "api_key": "k1", "model": "m1", "weight": 2},
+        {"base_url": "http://b/v1", "api_key_env": "SECOND_KEY"},
+    ]))
+    configs = load_backend_configs(str(path))
+    assert configs[0] == BackendConfig("http://a/v1", "k1", "m1", 2.0)
+    assert configs[1].api_key == "secret"
+
+
+def replay_backends(**config):
+    return BackendPool([
+        BackendConfig(UNREACHABLE, api_key="unused", name="down"),
+        BackendConfig(os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+                      api_key=os.environ.get("OPENAI_API_KEY"), name="up"),
+    ], BackendPoolConfig(**config))
+
+
+@pytest.mark.asyncio
+async def test_openai_client_fails_over_to_a_healthy_backend():
+    client = OpenAIStreamClient(hedging=HedgingConfig(max_retries=2, backoff_base=0.001))
+    backends = replay_backends(failure_threshold=1)
+    client.set_backends(backends)
+
+    events = [event async for event in client.stream_tokens("dogs")]
+    assert not any(event.error for event in events)
+    assert "".join(event.text for event in events)
+
+    down, up = backends.backends
+    assert down.errors >= 1 and down.stats()["ejected"]
+    assert up.latency is not None
+    assert down.outstanding == up.outstanding == 0
+
+
+def test_app_routes_through_backends_and_reports_them():
+    backends = replay_backends(failure_threshold=1)
+    # Make the healthy backend the first choice so no retry is needed
+    backends.backends[1].latency = 0.001
+    backends.backends[0].latency = 10.0
+    app = create_app(client_mode="langchain", backends=backends)
+    with TestClient(app) as client:
+        assert all(b.http_client is not None for b in backends.backends)
+        response = client.get("/stream", params={"topic": "dogs"})
+        assert response.status_code == 200
+        assert "Error" not in response.text
+
+        stats = client.get("/backends").json()
+        assert stats["up"]["requests"] == 1 and stats["up"]["outstanding"] == 0
+        metrics = client.get("/metrics").text
+        assert 'llm_backend_requests_total{backend="up"} 1' in metrics
+        assert 'llm_backend_ejected{backend="down"} 0' in metrics
+    assert all(b.http_client is None for b in backends.backends)
+
+
+def test_app_without_backends_does_not_route_through_another_apps_pool():
+    from src.openai_client import openai_client
+
+    backends = replay_backends()
+    pooled = create_app(client_mode="openai", backends=backends)
+    plain = create_app(client_mode="openai")
+    with TestClient(plain) as client:
+        assert openai_client.backends is None
+        assert "Error" not in client.get("/stream", params={"topic": "dogs"}).text
+    assert all(b.requests == 0 for b in backends.backends)
+    with TestClient(pooled):
+        assert openai_client.backends is backends
+    assert openai_client.backends is None
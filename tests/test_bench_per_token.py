@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.bench_per_token import LAYERS, add_net_cost, bench_layer, compare_to_baseline, drain, open_layer, \
+    SyntheticSource
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("layer", LAYERS)
+async def test_every_layer_passes_all_tokens(layer):
+    outputs = await drain(open_layer(layer, SyntheticSource(50, 4)))
+    # The endpoint adds its end-of-stream line; the graph ends with the node's update
+    assert outputs >= 50
+
+
+@pytest.mark.asyncio
+async def test_bench_layer_reports_per_token_figures():
+    result = await bench_layer("stream_plain", 200, 4, repeat=1, rate=50000)
+    assert result["cpu_us_per_token"] > 0 and result["max_tokens_per_sec"] > 0
+    assert "peak_bytes_per_token" in result and "retained_bytes_per_token" in result
+    assert result["paced"]["rate"] == 50000
+
+
+def test_compare_to_baseline_flags_regressions():
+    base = {"layer": "bridge", "cpu_us_per_token": 2.0, "max_tokens_per_sec": 400000,
+            "peak_bytes_per_token": 10.0, "retained_bytes_per_token": 0.0}
+    same = dict(base, cpu_us_per_token=2.2, retained_bytes_per_token=3.0)
+    slower = dict(base, cpu_us_per_token=3.0, max_tokens_per_sec=200000)
+    assert compare_to_baseline([same], {"bridge": base}, 0.25) == []
+    regressions = compare_to_baseline([slower], {"bridge": base}, 0.25)
+    assert len(regressions) == 2 and regressions[0].startswith("bridge: cpu_us_per_token")
+
+
+def test_net_cost_is_relative_to_the_source():
+    results = [{"layer": "source", "cpu_us_per_token": 0.5}, {"layer": "bridge", "cpu_us_per_token": 3.0}]
+    add_net_cost(results)
+    assert [r["net_cpu_us_per_token"] for r in results] == [0.0, 2.5]
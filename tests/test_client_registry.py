@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_import_time import parse_importtime
+from src.client_registry import configure_client, load_client, loaded_clients
+from src.hedging import HedgingConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def modules_after(script: str) -> set:
+    """Runs a fresh interpreter and returns the top-level packages it imported."""
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", script + "\nimport sys\nprint(' '.join(sorted({m.split('.')[0] for m in sys.modules})))"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return set(result.stdout.split())
+
+
+def test_openai_direct_mode_imports_only_its_stack():
+    # Also shows that importing the client no longer needs an API key
+    loaded = modules_after("import main\nfrom src.client_registry import load_client\nload_client('openai')")
+    assert "openai" in loaded
+    assert not loaded & {"langchain", "langchain_core", "langchain_openai", "langgraph", "fastapi", "uvicorn"}
+
+
+def test_langgraph_is_imported_on_first_graph():
+    loaded = modules_after("from src.client_registry import get_compiled_graph, load_client\n"
+                           "get_compiled_graph(load_client('openai')[0])")
+    assert "langgraph" in loaded and "langchain_openai" not in loaded
+
+
+def test_load_client_and_configure():
+    from src.openai_client import openai_client, stream_openai_tokens
+
+    client_fn, params_fn = load_client("openai")
+    assert client_fn is stream_openai_tokens
+    assert params_fn("dogs")["messages"][0]["content"] == "Tell me a joke about dogs"
+    assert "openai" in loaded_clients()
+
+    previous = openai_client.hedging
+    try:
+        configure_client("openai", hedging=HedgingConfig(max_retries=5))
+        assert openai_client.hedging.max_retries == 5
+    finally:
+        openai_client.set_hedging(previous)
+
+    with pytest.raises(ValueError):
+        load_client("anthropic")
+
+
+def test_parse_importtime():
+    report = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |   json.decoder",
+        "import time:        50 |        150 | json",
+        "import time:       300 |        300 | main",
+    ])
+    assert parse_importtime(report) == (450, {"json": 150, "main": 300})
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.replay_server import start_server
+from src.token_event import TokenEvent
+
+
+class SlowUpstream:
+    """Fake client function that streams forever and records when it is cancelled."""
+    def __init__(self):
+        self.started = 0
+        self.closed = 0
+
+    async def __call__(self, topic, config=None):
+        self.started += 1
+        try:
+            for index in range(1000):
+                yield TokenEvent(f"token{index} ", index)
+                await asyncio.sleep(0.02)
+        finally:
+            self.closed += 1
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize("use_langgraph", [False, True])
+@pytest.mark.parametrize("flush", ["immediate", "coalesce"])
+def test_disconnect_cancels_upstream(monkeypatch, use_langgraph, flush):
+    from src import fastapi_endpoint, langchain_openai_client
+
+    upstream = SlowUpstream()
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", upstream)
+    app = fastapi_endpoint.create_app(client_mode="langchain", use_langgraph=use_langgraph)
+    server, base_url = start_server(app)
+    try:
+        with httpx.Client(base_url=base_url, timeout=5.0) as client:
+            with client.stream("GET", f"/stream?topic=dogs&flush={flush}") as response:
+                next(response.iter_text())
+        # The upstream generator is closed long before its 20 s of tokens run out
+        assert wait_for(lambda: upstream.closed == 1)
+
+        metrics = app.state.metrics
+        labels = ("langchain", "true" if use_langgraph else "false")
+        assert wait_for(lambda: metrics.cancelled.labels(*labels).value == 1)
+        assert metrics.active.labels(*labels).value == 0
+        assert metrics.streams.labels(*labels, "cancelled").value == 1
+    finally:
+        server.should_exit = True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("wrapper,method", [("stream_openai_tokens", "stream_tokens"),
+                                            ("stream_openai_chunks", "stream_chunks")])
+async def test_closing_the_openai_wrapper_closes_the_client_stream(monkeypatch, wrapper, method):
+    from src import openai_client
+
+    upstream = SlowUpstream()
+    monkeypatch.setattr(openai_client.openai_client, method, upstream)
+    stream = getattr(openai_client, wrapper)("dogs")
+    await stream.__anext__()
+    await stream.aclose()
+    # Closed right away, not whenever the garbage collector finalizes it
+    assert upstream.closed == 1
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+
+from src.flush_policy import (
+    COALESCE,
+    IMMEDIATE,
+    FlushPolicy,
+    apply_flush_policy,
+    resolve_flush_policy,
+)
+
+
+async def synthetic_tokens(tokens, delay=0.0):
+    for token in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+
+async def collect(source, policy):
+    return [chunk async for chunk in apply_flush_policy(source, policy)]
+
+
+def test_resolve_flush_policy():
+    assert resolve_flush_policy() is IMMEDIATE
+    assert resolve_flush_policy("coalesce") is COALESCE
+    assert resolve_flush_policy(IMMEDIATE, max_bytes=10) == FlushPolicy(10, COALESCE.max_latency)
+    assert resolve_flush_policy("coalesce", max_latency=0.2) == FlushPolicy(COALESCE.max_bytes, 0.2)
+    with pytest.raises(ValueError):
+        resolve_flush_policy("sometimes")
+
+
+@pytest.mark.asyncio
+async def test_immediate_policy_passes_tokens_through():
+    tokens = ["Why", " did", " the", " dog"]
+    assert await collect(synthetic_tokens(tokens), IMMEDIATE) == tokens
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_on_max_bytes():
+    tokens = ["ab", "cd", "ef", "gh", "i"]
+    chunks = await collect(synthetic_tokens(tokens), FlushPolicy(max_bytes=4, max_latency=10.0))
+    assert chunks == ["abcd", "efgh", "i"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_on_max_latency_while_source_is_idle():
+    async def bursty():
+        yield "a"
+        yield "b"
+        await asyncio.sleep(0.2)
+        yield "c"
+
+    chunks = await collect(bursty(), FlushPolicy(max_bytes=1024, max_latency=0.05))
+    assert chunks == ["ab", "c"]
+
+
+@pytest.mark.asyncio
+async def test_source_errors_propagate_through_coalescing():
+    async def failing():
+        yield "a"
+        raise RuntimeError("upstream failed")
+
+    with pytest.raises(RuntimeError, match="upstream failed"):
+        await collect(failing(), FlushPolicy(max_bytes=1024, max_latency=0.05))
+
+
+@pytest.mark.asyncio
+async def test_closing_mid_flush_unwinds_the_source():
+    unwound = []
+    readers = set()
+
+    async def stalled():
+        try:
+            for token in ("a", "b"):
+                readers.add(asyncio.current_task())
+                yield token
+            readers.add(asyncio.current_task())
+            await asyncio.sleep(10)
+            yield "c"
+        finally:
+            unwound.append(True)
+
+    chunks = apply_flush_policy(stalled(), FlushPolicy(max_bytes=1024, max_latency=0.05))
+    # Flushed by the latency window while the source is stalled mid-read
+    assert await chunks.__anext__() == "ab"
+    await chunks.aclose()
+    # The source's finally ran before aclose returned, and no reader task was left behind
+    assert unwound == [True]
+    # Every read ran in the same long-lived reader task
+    assert len(readers) == 1
+    assert all(task is asyncio.current_task() for task in asyncio.all_tasks())
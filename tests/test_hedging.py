@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from src.hedging import HedgeStats, HedgingConfig, LatencyTracker, backoff_delay, hedge_delay, race_first
+from src.openai_client import OpenAIStreamClient
+from src.token_event import TokenEvent
+from tests.test_token_event import FakeStream, make_chunk
+
+
+def test_hedge_delay_uses_rolling_percentile_once_warm():
+    config = HedgingConfig(hedge=True, initial_hedge_after=2.0, min_samples=10)
+    tracker = LatencyTracker()
+    assert hedge_delay(config, tracker) == 2.0
+    for ms in range(1, 101):
+        tracker.record(ms / 1000.0)
+    assert hedge_delay(config, tracker) == pytest.approx(0.095)
+    assert hedge_delay(HedgingConfig(hedge_after=0.3), tracker) == 0.3
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, 0.1, 0.5) for attempt in range(10) for _ in range(20)]
+    assert all(0.0 <= d <= 0.5 for d in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_and_loser_is_cancelled():
+    delays = [1.0, 0.01]
+    cancelled = []
+
+    async def attempt():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    stats = HedgeStats()
+    result = await race_first(attempt, HedgingConfig(hedge=True, hedge_after=0.02), LatencyTracker(), stats)
+    assert result == 0.01
+    assert cancelled == [1.0]
+    assert stats.stats() == {"attempts": 2, "hedges": 1, "hedge_wins": 1, "retries": 0}
+
+
+@pytest.mark.asyncio
+async def test_failures_before_first_token_are_retried():
+    outcomes = [ConnectionError("reset"), ConnectionError("reset"), "ok"]
+
+    async def attempt():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    stats = HedgeStats()
+    config = HedgingConfig(max_retries=2, backoff_base=0.001)
+    assert await race_first(attempt, config, LatencyTracker(), stats) == "ok"
+    assert stats.retries == 2
+
+    async def not_found():
+        raise LookupError("404")
+
+    with pytest.raises(LookupError):
+        await race_first(not_found, config, LatencyTracker(), HedgeStats(), is_retryable=lambda e: False)
+
+
+class SlowFirstChunk(FakeStream):
+    def __init__(self, chunks, delay):
+        super().__init__(chunks)
+        self.delay = delay
+
+    async def _iterate(self):
+        await asyncio.sleep(self.delay)
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_client_streams_from_hedged_request(monkeypatch):
+    client = OpenAIStreamClient(api_key="test", hedging=HedgingConfig(hedge=True, hedge_after=0.02))
+    streams = [SlowFirstChunk([make_chunk("slow")], 1.0), SlowFirstChunk([make_chunk("fast"), make_chunk("!")], 0.0)]
+    opened = list(streams)
+
+    async def fake_create_stream(topic, backend=None):
+        return streams.pop(0)
+
+    monkeypatch.setattr(client, "_create_stream", fake_create_stream)
+    events = [event async for event in client.stream_tokens("dogs")]
+    assert events == [TokenEvent("fast", 0), TokenEvent("!", 1)]
+    assert opened[0].closed and opened[1].closed
+    assert client.hedge_stats.hedge_wins == 1
+
+
+def test_apps_keep_their_own_hedging(monkeypatch):
+    from fastapi.testclient import TestClient
+    from src.fastapi_endpoint import create_app
+    from src.openai_client import openai_client
+
+    streams = []
+
+    async def fake_create_stream(topic, backend=None):
+        return streams.pop(0)
+
+    monkeypatch.setattr(openai_client, "_create_stream", fake_create_stream)
+    hedged = create_app(client_mode="openai", hedging=HedgingConfig(hedge=True, hedge_after=0.02))
+    # Created after the hedged app; must not inherit its hedging
+    plain = create_app(client_mode="openai")
+    with TestClient(hedged) as hedged_client, TestClient(plain) as plain_client:
+        streams[:] = [SlowFirstChunk([make_chunk("slow")], 0.3), SlowFirstChunk([make_chunk("fast")], 0.0)]
+        assert hedged_client.get("/stream?topic=dogs").text.startswith("fast")
+        streams[:] = [SlowFirstChunk([make_chunk("slow")], 0.3), SlowFirstChunk([make_chunk("fast")], 0.0)]
+        assert plain_client.get("/stream?topic=dogs").text.startswith("slow")
+        # Each app reports only its own upstream requests
+        assert "llm_upstream_hedges_total 1" in hedged_client.get("/metrics").text
+        metrics = plain_client.get("/metrics").text
+        assert "llm_upstream_hedges_total 0" in metrics and "llm_upstream_attempts_total 1" in metrics
@@ -0,0 +1,41 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from src.fastapi_endpoint import create_app
+from src.http_pool import HTTPPoolConfig, create_http_client
+from src.langchain_openai_client import get_langchain_model
+from src.openai_client import openai_client
+
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("LLM_HTTP2", "true")
+    config = HTTPPoolConfig.from_env()
+    assert config.max_connections == 7
+    assert config.http2 is True
+    assert config.max_keepalive_connections == HTTPPoolConfig().max_keepalive_connections
+
+
+@pytest.mark.asyncio
+async def test_create_http_client_applies_limits():
+    client = create_http_client(HTTPPoolConfig(max_connections=3, max_keepalive_connections=2))
+    try:
+        pool = client._transport._pool
+        assert pool._max_connections == 3
+        assert pool._max_keepalive_connections == 2
+    finally:
+        await client.aclose()
+
+
+def test_app_lifespan_shares_and_closes_pool():
+    app = create_app(client_mode="langchain", http_pool=HTTPPoolConfig(max_connections=5))
+    with TestClient(app):
+        pool = app.state.http_client
+        assert isinstance(pool, httpx.AsyncClient)
+        assert openai_client.http_client is pool
+        assert get_langchain_model() is get_langchain_model()
+        assert get_langchain_model().http_async_client is pool
+    assert pool.is_closed
+    assert openai_client.http_client is None
+    assert get_langchain_model() is not get_langchain_model()
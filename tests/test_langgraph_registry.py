@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from src import langgraph_impl
+from src.fastapi_endpoint import create_app
+from src.langgraph_impl import build_langgraph, clear_compiled_graphs, get_compiled_graph
+from src.response_cache import ResponseCache
+from src.token_event import TokenEvent
+
+
+async def fake_client(topic, config=None):
+    yield TokenEvent(topic)
+
+
+async def other_client(topic, config=None):
+    yield TokenEvent(topic)
+
+
+def test_compiled_graph_is_shared_by_all_clients():
+    clear_compiled_graphs()
+    graph = get_compiled_graph(fake_client)
+    assert get_compiled_graph(fake_client) is graph
+    # The client function travels in the run's state, so the graph does not depend on it
+    assert get_compiled_graph(other_client) is graph
+
+
+def test_compiled_graph_is_keyed_by_builder():
+    clear_compiled_graphs()
+
+    def custom_builder(client_fn):
+        return build_langgraph(client_fn)
+
+    assert get_compiled_graph(fake_client, builder=custom_builder) is not get_compiled_graph(fake_client)
+
+
+def test_apps_share_one_graph(monkeypatch):
+    from src import langchain_openai_client
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", fake_client)
+    clear_compiled_graphs()
+    # Each app compiles on startup with its own cache-wrapped client function
+    for _ in range(3):
+        with TestClient(create_app(client_mode="langchain", use_langgraph=True, cache=ResponseCache())):
+            pass
+    assert len(langgraph_impl._compiled_graphs) == 1
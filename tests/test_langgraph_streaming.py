@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from src.langgraph_impl import build_langgraph
+from src.token_event import TokenEvent
+
+
+@pytest.mark.asyncio
+async def test_tokens_stream_through_graph_incrementally():
+    finished = asyncio.Event()
+
+    async def chunk_client(topic, config=None):
+        for index, text in enumerate(("Why", " did", "", " the ", topic)):
+            await asyncio.sleep(0.01)
+            yield TokenEvent(text, index)
+        finished.set()
+
+    graph = build_langgraph(chunk_client)
+    custom, updates = [], []
+    async for mode, chunk in graph.astream({"topic": "dogs", "client_fn": chunk_client},
+                                           stream_mode=["custom", "updates"]):
+        if mode == "custom":
+            # Each token reaches the consumer before the client is done
+            if not custom:
+                assert not finished.is_set()
+            custom.append(chunk)
+        else:
+            updates.append(chunk)
+
+    assert [event.text for event in custom] == ["Why", " did", " the ", "dogs"]
+    assert updates == [{"call_model": {"joke": "Why did the dogs"}}]
+
+
+def test_stream_endpoint_sends_the_same_text_with_and_without_langgraph(fake_stream_app):
+    from fastapi.testclient import TestClient
+
+    plain = TestClient(fake_stream_app()).get("/stream?topic=dogs").text
+    graph = TestClient(fake_stream_app(use_langgraph=True)).get("/stream?topic=dogs").text
+    assert graph == plain == "Why did the dogs?\nEnd of stream\n"
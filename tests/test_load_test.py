@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from benchmarks.common import percentile
+
+
+@pytest.mark.parametrize("q,expected", [(0, 1), (10, 1), (50, 5), (51, 6), (90, 9), (95, 10), (100, 10)])
+def test_nearest_rank_percentile(q, expected):
+    # Ranks where q * n / 100 is a whole number must not round up to the next value
+    assert percentile(list(range(10, 0, -1)), q) == expected
+
+
+def test_percentile_of_one_value():
+    assert percentile([3.5], 50) == 3.5 and percentile([3.5], 99) == 3.5
+
+
+def test_stop_server_waits_for_shutdown_hooks():
+    from fastapi import FastAPI
+
+    from src.replay_server import start_server, stop_server
+
+    app = FastAPI()
+    shut_down = []
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await asyncio.sleep(0.1)
+        shut_down.append(True)
+
+    server, _ = start_server(app)
+    stop_server(server)
+    # The next benchmark combination may start right away
+    assert shut_down == [True]
@@ -0,0 +1,73 @@
+import pytest
+
+from src.metrics import MetricsRegistry, StreamMetrics, classify_error
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    child = histogram.labels("stream")
+    for value in (0.05, 0.5, 0.5, 3.0):
+        child.observe(value)
+    text = registry.render()
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="stream",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="stream",le="1"} 3' in text
+    assert 'latency_seconds_bucket{route="stream",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="stream"} 4' in text
+    with pytest.raises(ValueError):
+        registry.counter("latency_seconds", "Duplicate.")
+
+
+def test_callback_gauge_is_read_at_scrape_time():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge("queue_depth", "Depth.", callback=lambda: depth[0])
+    assert "queue_depth 3" in registry.render()
+    depth[0] = 7
+    assert "queue_depth 7" in registry.render()
+
+
+def test_classify_error():
+    assert classify_error("Error code: 429 - {'error': 'rate limit'}") == "http_429"
+    assert classify_error("Connection error: refused") == "connection"
+    assert classify_error("Request timed out.") == "timeout"
+    assert classify_error("No content received from LLM") == "empty_response"
+
+
+def test_observer_records_one_stream():
+    metrics = StreamMetrics()
+    observer = metrics.observer("openai", False)
+    assert metrics.active.labels("openai", "false").value == 1
+    for _ in range(3):
+        observer.token()
+    observer.error("Error code: 500 - {}")
+    observer.finish()
+    observer.finish()
+
+    labels = ("openai", "false")
+    assert metrics.active.labels(*labels).value == 0
+    assert metrics.ttft.labels(*labels).count == 1
+    assert metrics.inter_token.labels(*labels).count == 2
+    assert metrics.tokens.labels(*labels).sum == 3
+    assert metrics.streams.labels(*labels, "error").value == 1
+    assert metrics.errors.labels(*labels, "http_500").value == 1
+
+
+def test_metrics_endpoint(fake_stream_app):
+    from fastapi.testclient import TestClient
+    from src.response_cache import ResponseCache
+
+    app = fake_stream_app(cache=ResponseCache())
+    client = TestClient(app)
+    client.get("/stream?topic=dogs")
+    client.get("/stream?topic=dogs")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'llm_streams_total{client_mode="langchain",langgraph="false",status="ok"} 2' in text
+    assert 'llm_stream_tokens_sum{client_mode="langchain",langgraph="false"} 10' in text
+    assert 'llm_streams_active{client_mode="langchain",langgraph="false"} 0' in text
+    assert "llm_cache_hits_total 1" in text
+    assert "llm_cache_entries 1" in text
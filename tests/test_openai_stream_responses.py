@@ -3,7 +3,7 @@ import json
 import pytest
 import asyncio
 from datetime import datetime
-from src.openai_client import stream_openai_tokens
+from src.openai_client import stream_openai_chunks
 
 @pytest.mark.asyncio
 async def test_record_openai_stream_responses():
@@ -21,7 +21,7 @@ async def test_record_openai_stream_responses():
     log_file = f"logs/openai_stream_{timestamp}.jsonl"
     
     chunks = []
-    async for chunk in stream_openai_tokens("dogs"):
+    async for chunk in stream_openai_chunks("dogs"):
         # Record each chunk
         chunks.append(chunk)
         
@@ -98,7 +98,7 @@ async def test_record_openai_stream_errors():
     
     chunks = []
     try:
-        async for chunk in stream_openai_tokens("dogs"):
+        async for chunk in stream_openai_chunks("dogs"):
             chunks.append(chunk)
             
             # Convert OpenAI object to JSON-serializable dict if it's not already a dict
@@ -0,0 +1,70 @@
+import time
+
+import httpx
+import openai
+import pytest
+from openai import AsyncOpenAI
+
+from src.replay_server import create_replay_app, load_recordings
+
+
+def replay_client(app):
+    transport = httpx.ASGITransport(app=app)
+    return AsyncOpenAI(
+        base_url="http://replay/v1",
+        api_key="replay",
+        http_client=httpx.AsyncClient(transport=transport, base_url="http://replay"),
+    )
+
+
+def test_load_recordings_reads_both_log_formats():
+    streams, errors = load_recordings("logs")
+    assert len(streams) == 3 and len(errors) == 2
+    for recording in streams:
+        first, last = recording.chunks[0][1], recording.chunks[-1][1]
+        assert first["choices"][0]["delta"]["role"] == "assistant"
+        assert last["choices"][0]["finish_reason"] == "stop"
+        assert recording.content.strip()
+    assert all(r.status_code == 404 and r.error_model == "invalid-model-name" for r in errors)
+
+
+@pytest.mark.asyncio
+async def test_replays_recorded_stream():
+    streams, _ = load_recordings("logs")
+    client = replay_client(create_replay_app(time_scale=0))
+
+    response = await client.chat.completions.create(
+        model="gpt-4o-mini-2024-07-18",
+        messages=[{"role": "user", "content": "Tell me a joke about dogs"}],
+        stream=True,
+    )
+    content = "".join([chunk.choices[0].delta.content or "" async for chunk in response])
+    assert content == streams[0].content
+
+
+@pytest.mark.asyncio
+async def test_replays_recorded_error_for_invalid_model():
+    client = replay_client(create_replay_app(time_scale=0))
+    with pytest.raises(openai.NotFoundError) as excinfo:
+        await client.chat.completions.create(
+            model="invalid-model-name",
+            messages=[{"role": "user", "content": "Tell me a joke about dogs"}],
+            stream=True,
+        )
+    assert excinfo.value.body["code"] == "model_not_found"
+
+
+@pytest.mark.asyncio
+async def test_scaled_timing_with_max_delay():
+    client = replay_client(create_replay_app(time_scale=1.0, max_delay=0.01))
+    start = time.perf_counter()
+    response = await client.chat.completions.create(
+        model="gpt-4o-mini-2024-07-18",
+        messages=[{"role": "user", "content": "Tell me a joke about dogs"}],
+        stream=True,
+        extra_headers={"X-Replay-Recording": "openai_stream_20250216_220658"},
+    )
+    chunks = [chunk async for chunk in response]
+    # The original recording spans several minutes; every gap is capped at 10 ms
+    assert len(chunks) == 22
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,90 @@
+import pytest
+
+from src.langgraph_impl import get_compiled_graph
+from src.plain_impl import stream_plain
+from src.response_cache import ResponseCache, cached_client, is_cached, primary_key
+from src.token_event import TokenEvent
+from src.topic_matcher import TopicMatcher
+
+
+def params(topic):
+    return {"model": "test-model", "messages": [{"role": "user", "content": f"Tell me a joke about {topic}"}]}
+
+
+async def collect(source):
+    return [token async for token in source]
+
+
+@pytest.mark.asyncio
+async def test_hit_replays_stream_without_calling_client(fake_client):
+    cache = ResponseCache()
+    client = cached_client(fake_client, cache, params, namespace="test")
+    first = await collect(stream_plain("dogs", client))
+    second = await collect(stream_plain("dogs", client))
+    assert [t.text for t in first] == [t.text for t in second] == ["Why", " did", " the ", "dogs", "?"]
+    assert fake_client.calls == ["dogs"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bypass_and_errors_skip_cache(fake_client, failing_client):
+    cache = ResponseCache()
+    client = cached_client(fake_client, cache, params, namespace="test")
+    bypass = {"configurable": {"cache_bypass": True}}
+    await collect(client("dogs", config=bypass))
+    await collect(client("dogs", config=bypass))
+    assert fake_client.calls == ["dogs", "dogs"]
+    assert cache.stats()["bypasses"] == 2
+
+    failing = cached_client(failing_client, cache, params, namespace="failing")
+    await collect(failing("cats"))
+    await collect(failing("cats"))
+    assert failing_client.calls == ["cats", "cats"]
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = ResponseCache(max_entries=2, ttl=10.0)
+    cache.put("a", [TokenEvent("1")])
+    cache.put("b", [TokenEvent("2")])
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", [TokenEvent("3")])
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    import src.response_cache as response_cache
+    now = response_cache.time.monotonic()
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now + 11.0)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_memory_bound():
+    cache = ResponseCache(max_bytes=2000)
+    for i in range(10):
+        cache.put(str(i), [TokenEvent("x" * 100)] * 3)
+    assert cache.stats()["bytes"] <= 2000
+    assert len(cache) < 10
+
+
+@pytest.mark.asyncio
+async def test_langgraph_path_streams_cache_hits(fake_client):
+    cache = ResponseCache()
+    client = cached_client(fake_client, cache, params, namespace="graph")
+    graph = get_compiled_graph(client)
+    inputs = {"topic": "dogs", "client_fn": client}
+    first = [t async for t in graph.astream(inputs, stream_mode="custom")]
+    second = [t async for t in graph.astream(inputs, stream_mode="custom")]
+    assert "".join(t.text for t in first) == "".join(t.text for t in second) == "Why did the dogs?"
+    assert fake_client.calls == ["dogs"]
+
+
+def test_is_cached_checks_the_normalized_key_without_reading_it():
+    cache = ResponseCache(max_entries=2, matcher=TopicMatcher())
+    cache.put(primary_key(cache, "test", params, "dogs"), [TokenEvent("1")])
+    cache.put(primary_key(cache, "test", params, "cats"), [TokenEvent("2")])
+    assert is_cached(cache, "test", params, "Dogs!")
+    assert not is_cached(cache, "test", params, "birds")
+    # "dogs" stays least recently used, and the checks are not lookups
+    cache.put(primary_key(cache, "test", params, "birds"), [TokenEvent("3")])
+    assert not is_cached(cache, "test", params, "dogs")
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
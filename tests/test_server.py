@@ -0,0 +1,114 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import uvicorn
+from fastapi.testclient import TestClient
+
+from src import server
+from src.replay_server import create_replay_app, start_replay_server
+from src.server import ServerConfig, create_app_from_env, resolve_http, resolve_loop, serve
+from src.stream_compression import CompressionConfig
+from src.stream_recorder import RecorderConfig
+from src.token_bridge import BridgeConfig
+from src.warmup import WarmupConfig
+from src.ws_multiplex import WebSocketConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_config_round_trips_through_the_environment(monkeypatch):
+    config = ServerConfig(client_mode="langchain", use_langgraph=True, cache=True, cache_ttl=5.0,
+                          cache_backend="sqlite", cache_path="/tmp/cache.sqlite3",
+                          cache_normalize=("case", "plural"), cache_near_threshold=0.7,
+                          bridge=BridgeConfig(max_size=8, overflow="coalesce"), max_concurrent=4,
+                          hedge=True, hedge_after=0.5, backends="backends.json", routing="weighted",
+                          warmup=WarmupConfig(connections=2, probe=True, block_startup=False),
+                          recorder=RecorderConfig(enabled=True, sample_rate=0.1, gzip=True),
+                          compression=CompressionConfig(enabled=True, encodings=("gzip", "deflate")),
+                          websocket=WebSocketConfig(max_streams=4, initial_credit=8, max_credit=64))
+    for name, value in config.to_env().items():
+        monkeypatch.setenv(name, value)
+    assert ServerConfig.from_env() == config
+
+
+def test_defaults_when_environment_is_empty(monkeypatch):
+    for name in ServerConfig().to_env():
+        monkeypatch.delenv(name, raising=False)
+    assert ServerConfig.from_env() == ServerConfig()
+
+
+def test_factory_builds_app_from_environment(monkeypatch):
+    monkeypatch.setenv("LLM_CLIENT", "langchain")
+    monkeypatch.setenv("LLM_CACHE", "1")
+    monkeypatch.setenv("LLM_MAX_CONCURRENT", "2")
+    app = create_app_from_env()
+    assert app.state.admission.config.max_concurrent == 2
+    with TestClient(app) as client:
+        assert client.get("/cache/stats").status_code == 200
+
+
+def test_missing_loop_and_parser_fall_back(monkeypatch):
+    monkeypatch.setattr(server.importlib.util, "find_spec", lambda name: None)
+    assert resolve_loop("uvloop") == "asyncio"
+    assert resolve_http("httptools") == "h11"
+    assert resolve_loop("auto") == "auto"
+
+
+def test_serve_runs_the_factory_with_workers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append((app, kwargs)))
+    monkeypatch.setattr(server.os, "environ", dict(os.environ))
+    serve(ServerConfig(client_mode="langchain"), port=9000, workers=4, loop="asyncio", graceful_timeout=7)
+    app, kwargs = calls[0]
+    assert app == "src.server:create_app_from_env"
+    assert kwargs["factory"] is True and kwargs["workers"] == 4
+    assert kwargs["timeout_graceful_shutdown"] == 7
+    assert server.os.environ["LLM_CLIENT"] == "langchain"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sigterm_drains_in_flight_streams():
+    # Slow replay so the stream is still running when the server is told to stop
+    replay, replay_url = start_replay_server(create_replay_app(time_scale=2.0, max_delay=0.3))
+    port = free_port()
+    env = {**os.environ, "OPENAI_BASE_URL": replay_url, "OPENAI_API_KEY": "replay"}
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--mode", "api", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "2", "--graceful-timeout", "20"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30.0
+        while True:
+            try:
+                if httpx.get(f"{base_url}/metrics", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            assert time.monotonic() < deadline, "server did not start"
+            time.sleep(0.2)
+
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            with client.stream("GET", "/stream?topic=dogs") as response:
+                chunks = response.iter_text()
+                body = next(chunks)
+                process.send_signal(signal.SIGTERM)
+                body += "".join(chunks)
+        assert body.endswith("End of stream\n")
+        assert "Error" not in body
+        assert process.wait(timeout=30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+        replay.should_exit = True
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from src.plain_impl import stream_plain
+from src.response_cache import ResponseCache, cached_client
+from src.shared_cache import SQLiteResponseCache, build_response_cache, decode_tokens, encode_tokens
+from src.token_event import TokenEvent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def params(topic):
+    return {"model": "test-model", "messages": [{"role": "user", "content": f"Tell me a joke about {topic}"}]}
+
+
+def stream(*texts):
+    return [TokenEvent(text, i) for i, text in enumerate(texts)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Builds caches of one backend; every sqlite cache of a test shares one file."""
+    def make(**kwargs):
+        return build_response_cache(request.param, str(tmp_path / "cache.sqlite3"), **kwargs)
+    return make
+
+
+def test_encoding_round_trips_and_is_compact():
+    tokens = [TokenEvent("", 0), *[TokenEvent(t, i + 1) for i, t in enumerate(["Hund", " 🐕", " und"] * 50)],
+              TokenEvent("", 151, "stop", {"completion_tokens": 150})]
+    offsets = [i * 0.01 for i in range(len(tokens))]
+    decoded, decoded_offsets = decode_tokens(encode_tokens(tokens, offsets))
+    assert [(t.text, t.index, t.finish_reason, t.usage) for t in decoded] == \
+           [(t.text, t.index, t.finish_reason, t.usage) for t in tokens]
+    assert decoded_offsets == pytest.approx(offsets, abs=1e-6)
+    as_json = json.dumps([t.to_dict() for t in tokens]).encode()
+    assert len(encode_tokens(tokens)) < len(as_json) / 5
+
+
+def test_lru_eviction_by_entries(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.put("a", stream("A"))
+    time.sleep(0.01)
+    cache.put("b", stream("B"))
+    time.sleep(0.01)
+    assert cache.get("a") is not None  # 'b' is now least recently used
+    time.sleep(0.01)
+    cache.put("c", stream("C"))
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+    assert len(cache) == 2 and cache.evictions == 1
+
+
+def test_lru_eviction_by_bytes(make_cache):
+    probe = make_cache()
+    probe.put("probe", stream("x" * 10))
+    budget = probe.bytes_used * 2
+    probe.clear()
+    cache = make_cache(max_bytes=budget)
+    for key in ("a", "b", "c"):
+        assert cache.put(key, stream("x" * 10))
+        time.sleep(0.01)
+    assert len(cache) == 2 and cache.bytes_used <= budget
+    assert not cache.contains("a")
+    # Random text, so the compact encoding cannot shrink it below the budget
+    assert not cache.put("huge", stream(os.urandom(budget).hex()))
+
+
+def test_ttl_expiry(make_cache):
+    cache = make_cache(ttl=0.05)
+    cache.put("a", stream("A"))
+    assert cache.contains("a")
+    time.sleep(0.1)
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+    # Expired entries are gone once the next entry is stored
+    cache.put("b", stream("B"))
+    assert cache.expirations == 1 and len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_share_one_cache(tmp_path, fake_client):
+    path = str(tmp_path / "cache.sqlite3")
+    worker_1 = cached_client(fake_client, SQLiteResponseCache(path), params, namespace="test")
+    worker_2 = cached_client(fake_client, SQLiteResponseCache(path), params, namespace="test")
+    first = [e.text async for e in stream_plain("dogs", worker_1)]
+    second = [e.text async for e in stream_plain("dogs", worker_2)]
+    assert first == second and fake_client.calls == ["dogs"]
+
+
+_WRITER = """
+import sys
+from src.shared_cache import SQLiteResponseCache
+from src.token_event import TokenEvent
+cache = SQLiteResponseCache(sys.argv[1], max_entries=20, busy_timeout=5.0)
+for i in range(50):
+    cache.put(f"{sys.argv[2]}-{i}", [TokenEvent(f"token {i}", 0), TokenEvent(" and more", 1)])
+"""
+
+
+def test_concurrent_writer_processes_keep_totals_consistent(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteResponseCache(path)
+    writers = [subprocess.Popen([sys.executable, "-c", _WRITER, path, f"w{n}"], cwd=ROOT) for n in range(4)]
+    assert all(w.wait(timeout=60) == 0 for w in writers)
+
+    cache = SQLiteResponseCache(path, max_entries=20)
+    assert len(cache) == 20
+    rows = cache._connection().execute("SELECT COUNT(*), SUM(size) FROM entries").fetchone()
+    assert rows == (20, cache.bytes_used)
+    key = cache._connection().execute("SELECT key FROM entries LIMIT 1").fetchone()[0]
+    assert cache.get(key).tokens[1].text == " and more"
+
+
+def test_hits_do_not_wait_for_another_writer(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteResponseCache(path, busy_timeout=0.2)
+    cache.put("a", stream("A"))
+    stored_at = cache._connection().execute("SELECT last_used FROM entries").fetchone()[0]
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # Another process in the middle of a put
+    try:
+        start = time.monotonic()
+        assert cache.get("a").tokens[0].text == "A" and cache.get("b") is None
+        assert time.monotonic() - start < 0.1
+        # A put gives up after busy_timeout instead of stalling the event loop
+        assert not cache.put("b", stream("B"))
+        assert cache.stats()["write_conflicts"] == 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    # The hit's recency is written with the next put
+    assert cache.put("b", stream("B"))
+    last_used = cache._connection().execute("SELECT last_used FROM entries WHERE key = 'a'").fetchone()[0]
+    assert last_used > stored_at and not cache._touched
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        build_response_cache("redis")
+    assert isinstance(build_response_cache("memory"), ResponseCache)
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from src.response_cache import ResponseCache, cached_client, make_cache_key
+from src.single_flight import SingleFlight
+from src.token_event import TokenEvent
+
+TOKENS = ["Why", " did", " the", " dog", " sit", "?"]
+upstream_calls = []
+
+
+async def slow_client(topic, config=None):
+    upstream_calls.append(topic)
+    for token in TOKENS:
+        await asyncio.sleep(0.01)
+        yield TokenEvent(token)
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    upstream_calls.clear()
+
+
+async def collect(source):
+    return [token.text async for token in source]
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_upstream_stream():
+    single_flight = SingleFlight()
+    client = single_flight.wrap(slow_client)
+
+    async def late_joiner():
+        await asyncio.sleep(0.035)
+        return await collect(client("dogs"))
+
+    results = await asyncio.gather(collect(client("dogs")), collect(client("dogs")), late_joiner())
+    assert all(result == TOKENS for result in results)
+    assert upstream_calls == ["dogs"]
+    assert single_flight.stats() == {"flights_started": 1, "subscribers_joined": 2}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_coalesce():
+    client = SingleFlight().wrap(slow_client)
+    await asyncio.gather(collect(client("dogs")), collect(client("cats")))
+    assert sorted(upstream_calls) == ["cats", "dogs"]
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_catches_up_from_history():
+    client = SingleFlight(buffer_size=1).wrap(slow_client)
+
+    async def slow_reader():
+        tokens = []
+        async for token in client("dogs"):
+            await asyncio.sleep(0.03)
+            tokens.append(token.text)
+        return tokens
+
+    results = await asyncio.gather(slow_reader(), collect(client("dogs")))
+    assert results == [TOKENS, TOKENS]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_keeps_other_subscribers_and_last_cancels_upstream():
+    client = SingleFlight().wrap(slow_client)
+
+    async def leaves_early():
+        stream = client("dogs")
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    results = await asyncio.gather(leaves_early(), collect(client("dogs")))
+    assert results[1] == TOKENS
+
+    stream = client("cats")
+    await stream.__anext__()
+    flight = client.active_flights[client.flight_key("cats")]
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert flight.task.cancelled() or flight.task.done()
+    assert client.flight_key("cats") not in client.active_flights
+
+
+@pytest.mark.asyncio
+async def test_cache_bypass_does_not_join_a_flight_replaying_the_cache():
+    def params(topic):
+        return {"topic": topic}
+
+    cache = ResponseCache(replay="paced")
+    cache.put(make_cache_key("test", params("dogs")), [TokenEvent("cached"), TokenEvent(" joke")], [0.0, 0.1])
+    client = SingleFlight().wrap(cached_client(slow_client, cache, params, namespace="test"))
+
+    async def bypass_joiner():
+        # Arrives while the cache hit is still being replayed
+        await asyncio.sleep(0.03)
+        return await collect(client("dogs", {"configurable": {"cache_bypass": True}}))
+
+    results = await asyncio.gather(collect(client("dogs")), bypass_joiner())
+    assert results == [["cached", " joke"], TOKENS]
+    assert upstream_calls == ["dogs"]
+
+
+@pytest.mark.asyncio
+async def test_topics_sharing_a_cache_entry_share_a_flight(monkeypatch):
+    import httpx
+
+    from src import fastapi_endpoint, langchain_openai_client
+    from src.topic_matcher import TopicMatcher
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", slow_client)
+    app = fastapi_endpoint.create_app(client_mode="langchain", cache=ResponseCache(matcher=TopicMatcher()),
+                                      coalesce_requests=True)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(client.get("/stream?topic=dogs"), client.get("/stream?topic=Dogs!"))
+    assert responses[0].text == responses[1].text
+    assert upstream_calls == ["dogs"]
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from src.sse import StreamRegistry, format_sse, parse_last_event_id
+from src.token_event import TokenEvent
+
+
+async def tokens(texts, delay=0.0, error=None):
+    for text in texts:
+        if delay:
+            await asyncio.sleep(delay)
+        yield TokenEvent(text)
+    if error:
+        yield TokenEvent.failure(error)
+
+
+def parse_events(raw):
+    events = []
+    for block in raw.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith((":", "retry")))
+        if fields:
+            events.append(fields)
+    return events
+
+
+async def read(registry, stream, after_seq=0, limit=None):
+    raw = ""
+    count = 0
+    async for text in registry.subscribe(stream, after_seq):
+        raw += text
+        count += text.startswith("id:")
+        if limit and count >= limit:
+            break
+    return parse_events(raw)
+
+
+def test_format_and_parse():
+    assert format_sse("token", {"text": "hi"}, "abc:1") == 'id: abc:1\nevent: token\ndata: {"text": "hi"}\n\n'
+    assert parse_last_event_id("abc:12") == ("abc", 12)
+    assert parse_last_event_id("garbage") is None
+
+
+@pytest.mark.asyncio
+async def test_numbered_tokens_then_typed_error_and_done():
+    registry = StreamRegistry()
+    stream = registry.start(tokens(["a", "b"], error="boom"))
+    events = await read(registry, stream)
+    assert [e["event"] for e in events] == ["token", "token", "error", "done"]
+    assert [e["id"] for e in events] == [f"{stream.stream_id}:{i}" for i in range(1, 5)]
+
+
+@pytest.mark.asyncio
+async def test_resume_after_disconnect_without_regenerating():
+    registry = StreamRegistry()
+    stream = registry.start(tokens(["a", "b", "c", "d"], delay=0.01))
+    first = await read(registry, stream, limit=2)
+    last_id = parse_last_event_id(first[-1]["id"])
+    resumed = await read(registry, registry.get(last_id[0]), after_seq=last_id[1])
+    texts = [e["data"] for e in first + resumed if e["event"] == "token"]
+    assert texts == ['{"text": "a"}', '{"text": "b"}', '{"text": "c"}', '{"text": "d"}']
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_ring_buffer_and_grace_period():
+    registry = StreamRegistry(buffer_size=2, grace_period=0.05, heartbeat=0.01)
+    stream = registry.start(tokens(["a", "b", "c"], delay=0.02))
+    raw = "".join([text async for text in registry.subscribe(stream)])
+    assert ": heartbeat" in raw
+
+    # Only the last two events (token "c" and done) are still buffered
+    late = await read(registry, stream, after_seq=1)
+    assert late[0]["event"] == "error" and "no longer buffered" in late[0]["data"]
+
+    await asyncio.sleep(0.1)
+    assert registry.get(stream.stream_id) is None
+
+
+def test_sse_endpoint_resumes_with_last_event_id(fake_stream_app):
+    from fastapi.testclient import TestClient
+
+    app = fake_stream_app()
+    client = TestClient(app)
+
+    response = client.get("/sse?topic=dogs")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [e["event"] for e in events] == ["token"] * 5 + ["done"]
+
+    resumed = parse_events(client.get("/sse", headers={"Last-Event-ID": events[1]["id"]}).text)
+    assert [e["id"] for e in resumed] == [e["id"] for e in events[2:]]
+    assert client.get("/sse", headers={"Last-Event-ID": "unknown:3"}).status_code == 404
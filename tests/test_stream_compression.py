@@ -0,0 +1,93 @@
+import gzip
+import zlib
+
+import pytest
+import zstandard
+from fastapi.testclient import TestClient
+
+from src.fastapi_endpoint import create_app
+from src.stream_compression import (CompressionConfig, CompressionStats, StreamCompressor, compress_stream,
+                                    negotiate_encoding)
+
+OFFERED = ("zstd", "br", "gzip", "deflate")
+TOKENS = ["Why", " did", " the", " dog", " sit", " in", " the", " shade", "?"] * 20
+# What a coalescing flush policy hands the compressor: a few tokens per chunk
+CHUNKS = ["".join(TOKENS[i:i + 9]) + "\n" for i in range(0, len(TOKENS), 9)]
+
+
+def test_negotiation_follows_server_preference_and_q_values():
+    assert negotiate_encoding("gzip, deflate, zstd", OFFERED) == "zstd"
+    assert negotiate_encoding("gzip;q=0, deflate", OFFERED) == "deflate"
+    assert negotiate_encoding("*", ("gzip",)) == "gzip"
+    assert negotiate_encoding("br", ("gzip",)) is None
+    assert negotiate_encoding("identity", OFFERED) is None
+    assert negotiate_encoding(None, OFFERED) is None
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        CompressionConfig(encodings=("lz4",))
+
+
+@pytest.mark.parametrize("encoding, decompressor", [
+    ("gzip", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)),
+    ("deflate", lambda: zlib.decompressobj()),
+    ("zstd", lambda: zstandard.ZstdDecompressor().decompressobj()),
+])
+def test_every_flush_decodes_at_once(encoding, decompressor):
+    compressor = StreamCompressor(encoding)
+    decoder = decompressor()
+    for token in TOKENS:
+        # The client can show each token as soon as its bytes arrive
+        assert decoder.decompress(compressor.compress(token.encode())) == token.encode()
+    decoder.decompress(compressor.finish())
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate", "zstd"])
+def test_one_context_per_stream_compresses_coalesced_chunks(encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in CHUNKS:
+        compressor.compress(chunk.encode())
+    compressor.finish()
+    # Later chunks reuse the history of earlier ones, unlike one gzip member per chunk
+    per_chunk = sum(len(gzip.compress(c.encode())) for c in CHUNKS)
+    assert compressor.bytes_out < per_chunk / 4
+    assert compressor.bytes_out < compressor.bytes_in / 2
+
+
+@pytest.mark.asyncio
+async def test_compress_stream_records_stats():
+    async def chunks():
+        for chunk in CHUNKS:
+            yield chunk
+
+    stats = CompressionStats()
+    body = b"".join([c async for c in compress_stream(chunks(), StreamCompressor("gzip"), stats)])
+    assert gzip.decompress(body).decode() == "".join(CHUNKS)
+    assert stats.stats()["gzip"]["streams"] == 1
+    assert stats.stats()["gzip"]["ratio"] > 1
+
+
+def test_stream_endpoint_negotiates_compression():
+    app = create_app(client_mode="openai", flush_policy="coalesce",
+                     compression=CompressionConfig(enabled=True, encodings=("gzip", "deflate")))
+    with TestClient(app) as client:
+        plain = client.get("/stream?topic=dogs", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["vary"] == "Accept-Encoding"
+        compressed = client.get("/stream?topic=dogs", headers={"Accept-Encoding": "deflate, gzip"})
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["vary"] == "Accept-Encoding"
+        assert compressed.text.endswith("End of stream\n")
+        stats = client.get("/compression/stats").json()["gzip"]
+        # httpx has already decoded the body
+        assert stats["streams"] == 1 and stats["bytes_in"] == len(compressed.content)
+        assert 'llm_compression_bytes_out_total{encoding="gzip"}' in client.get("/metrics").text
+
+
+def test_compression_is_off_by_default():
+    app = create_app(client_mode="openai", compression=CompressionConfig())
+    with TestClient(app) as client:
+        response = client.get("/stream?topic=dogs", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert "vary" not in response.headers
@@ -0,0 +1,134 @@
+import asyncio
+import glob
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.fastapi_endpoint import create_app
+from src.langgraph_impl import get_compiled_graph
+from src.plain_impl import stream_plain
+from src.replay_server import create_replay_app, load_recordings
+from src.stream_recorder import RecorderConfig, StreamRecorder, recorded_client
+from src.token_event import TokenEvent
+
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_RECORD", "1")
+    monkeypatch.setenv("LLM_RECORD_SAMPLE_RATE", "0.25")
+    monkeypatch.setenv("LLM_RECORD_GZIP", "true")
+    config = RecorderConfig.from_env()
+    assert config.enabled and config.sample_rate == 0.25 and config.gzip
+    assert config.directory == "logs"
+
+
+@pytest.mark.asyncio
+async def test_recorded_streams_replay(tmp_path, fake_client, failing_client):
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path)))
+    recorder.start()
+    client_fn = recorded_client(fake_client, recorder)
+    texts = []
+    for topic in ("dogs", "cats"):
+        texts.append("".join([e.text async for e in stream_plain(topic, client_fn)]))
+    assert recorder.buffered == 10  # Nothing was written on the token path
+    # The same stage works under the LangGraph call_model node
+    failing = recorded_client(failing_client, recorder)
+    graph = get_compiled_graph(failing)
+    [_ async for _ in graph.astream({"topic": "birds", "client_fn": failing}, stream_mode="custom")]
+    await recorder.aclose()
+
+    assert recorder.stats()["recorded"] == 3 and recorder.lines_written == 11
+    streams, errors = load_recordings(str(tmp_path))
+    assert [s.content for s in streams] == texts
+    assert streams[0].name != streams[1].name
+    assert errors[0].status_code == 500
+
+
+@pytest.mark.asyncio
+async def test_lines_are_chunk_records_that_replay_exactly(tmp_path):
+    usage = {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14}
+
+    async def client(topic, config=None):
+        # Role chunk, tokens, the finish chunk and the usage-only chunk, as the OpenAI client yields them
+        for event in (TokenEvent("", 0), TokenEvent("Why", 1), TokenEvent(" not", 2), TokenEvent("", 3, "stop"),
+                      TokenEvent("", 4, None, usage)):
+            yield event
+
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path)))
+    client_fn = recorded_client(client, recorder, lambda topic: {"model": "gpt-4o-mini-2024-07-18"})
+    [_ async for _ in client_fn("dogs")]
+    await recorder.aclose()
+
+    with open(recorder.files[0]) as f:
+        chunks = [json.loads(line)["chunk"] for line in f]
+    assert len({c["id"] for c in chunks}) == 1 and all(c["model"] == "gpt-4o-mini-2024-07-18" for c in chunks)
+    assert chunks[0]["choices"][0]["delta"]["role"] == "assistant"
+    assert [c["choices"][0]["delta"]["content"] for c in chunks[:4]] == ["", "Why", " not", ""]
+    assert chunks[3]["choices"][0]["finish_reason"] == "stop"
+    assert chunks[4]["choices"] == [] and chunks[4]["usage"] == usage
+
+    with TestClient(create_replay_app(str(tmp_path), time_scale=0)) as replay:
+        body = replay.post("/v1/chat/completions", json={"model": "m", "stream": True, "messages": []}).text
+    replayed = [json.loads(line[len("data: "):]) for line in body.splitlines()
+                if line.startswith("data: {")]
+    assert replayed == chunks
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_streams_without_blocking(tmp_path, fake_client):
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path), max_buffer=7))
+    client_fn = recorded_client(fake_client, recorder)
+    for topic in ("dogs", "cats", "birds"):
+        assert "".join([e.text async for e in client_fn(topic)]) == f"Why did the {topic}?"
+    assert recorder.recorded == 1 and recorder.dropped == 2
+    await recorder.aclose()
+    streams, _ = load_recordings(str(tmp_path))
+    assert [s.content for s in streams] == ["Why did the dogs?"]
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_idle_flush_intervals(tmp_path, fake_client):
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path), flush_interval=0.01))
+    recorder.start()
+    await asyncio.sleep(0.05)
+    [_ async for _ in recorded_client(fake_client, recorder)("dogs")]
+    for _ in range(100):
+        if recorder.lines_written:
+            break
+        await asyncio.sleep(0.01)
+    # Written by the background task, not by aclose
+    assert recorder.lines_written == 5
+    await recorder.aclose()
+
+
+@pytest.mark.asyncio
+async def test_sampling(tmp_path, fake_client):
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path), sample_rate=0.0))
+    [_ async for _ in recorded_client(fake_client, recorder)("dogs")]
+    assert recorder.sampled_out == 1 and recorder.buffered == 0
+
+
+@pytest.mark.asyncio
+async def test_rotation_and_gzip(tmp_path, fake_client):
+    # Every stream goes past the size limit, so each lands in its own file
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path), max_file_mb=1e-6, gzip=True))
+    client_fn = recorded_client(fake_client, recorder)
+    for topic in ("dogs", "cats", "birds"):
+        [_ async for _ in client_fn(topic)]
+        await recorder.flush()
+    await recorder.aclose()
+    assert len(glob.glob(os.path.join(tmp_path, "openai_stream_*.jsonl.gz"))) == 3
+    streams, _ = load_recordings(str(tmp_path))
+    assert [s.content for s in streams] == [f"Why did the {t}?" for t in ("dogs", "cats", "birds")]
+
+
+def test_app_records_upstream_streams(tmp_path):
+    recorder = StreamRecorder(RecorderConfig(enabled=True, directory=str(tmp_path)))
+    app = create_app(client_mode="openai", recorder=recorder)
+    with TestClient(app) as client:
+        body = client.get("/stream?topic=dogs").text
+        assert client.get("/recorder/stats").json()["recorded"] == 1
+        assert "llm_recorder_streams_total 1" in client.get("/metrics").text
+    streams, _ = load_recordings(str(tmp_path))
+    assert streams[0].content == body.removesuffix("\nEnd of stream\n")
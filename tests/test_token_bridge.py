@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from src.token_bridge import BridgeConfig, BridgeStats, TokenBridge
+from src.token_event import TokenEvent
+
+TOKENS = ["Why", " did", " the", " dog", " sit", "?"]
+
+
+async def produce(bridge, tokens=TOKENS, error=None):
+    for index, text in enumerate(tokens):
+        await bridge.put(TokenEvent(text, index))
+    bridge.close(error)
+
+
+async def slow_read(bridge, delay=0.01):
+    events = []
+    async for event in bridge:
+        events.append(event)
+        await asyncio.sleep(delay)
+    return events
+
+
+def test_config_validation():
+    with pytest.raises(ValueError):
+        BridgeConfig(overflow="drop")
+    with pytest.raises(ValueError):
+        BridgeConfig(max_size=0)
+
+
+@pytest.mark.asyncio
+async def test_block_policy_bounds_buffer_and_keeps_every_token():
+    stats = BridgeStats()
+    bridge = TokenBridge(BridgeConfig(max_size=2, overflow="block"), stats)
+    events, _ = await asyncio.gather(slow_read(bridge), produce(bridge))
+    assert [e.text for e in events] == TOKENS
+    assert bridge.high_water == stats.high_water == 2
+    assert stats.blocked > 0
+    bridge.release()
+    assert stats.active == 0 and stats.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesce_policy_merges_overflow_in_order():
+    stats = BridgeStats()
+    bridge = TokenBridge(BridgeConfig(max_size=2, overflow="coalesce"), stats)
+    await produce(bridge)
+    events = await slow_read(bridge, delay=0)
+    assert [e.text for e in events] == ["Why", " did", " the dog sit?"]
+    assert events[-1].index == 2
+    assert stats.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_coalesced_text_is_capped_while_the_reader_stalls():
+    stats = BridgeStats()
+    bridge = TokenBridge(BridgeConfig(max_size=2, overflow="coalesce", max_coalesced_chars=8), stats)
+    tokens = [f"t{i:02} " for i in range(20)]
+    producer = asyncio.create_task(produce(bridge, tokens))
+    await asyncio.sleep(0.05)
+    # Two buffered tokens plus at most 8 merged characters; the producer waits for the reader
+    assert not producer.done() and len(bridge) == 2 and bridge._overflow_chars <= 8
+    assert stats.blocked == 1
+    events, _ = await asyncio.gather(slow_read(bridge, delay=0), producer)
+    assert "".join(e.text for e in events) == "".join(tokens)
+    bridge.release()
+
+
+@pytest.mark.asyncio
+async def test_abort_policy_ends_stream_and_cancels_producer():
+    aborted = []
+    bridge = TokenBridge(BridgeConfig(max_size=2, overflow="abort"), BridgeStats(),
+                         on_abort=lambda: aborted.append(True))
+    await produce(bridge)
+    events = await slow_read(bridge, delay=0)
+    assert [e.text for e in events[:2]] == ["Why", " did"]
+    assert "overflow" in events[-1].error
+    assert aborted == [True]
+
+
+@pytest.mark.asyncio
+async def test_error_is_delivered_after_buffered_tokens():
+    bridge = TokenBridge(BridgeConfig(), BridgeStats())
+    await produce(bridge, tokens=["a"], error="Error during generation: boom")
+    events = await slow_read(bridge, delay=0)
+    assert events == [TokenEvent("a", 0), TokenEvent.failure("Error during generation: boom")]
+
+
+def test_apps_keep_their_own_bridge_settings(monkeypatch):
+    from fastapi.testclient import TestClient
+    from src import langchain_openai_client
+    from src.fastapi_endpoint import create_app
+
+    bridges = []
+
+    class RecordingBridge(TokenBridge):
+        def __init__(self, config, stats, **kwargs):
+            super().__init__(config, stats, **kwargs)
+            bridges.append(self)
+
+    monkeypatch.setattr(langchain_openai_client, "TokenBridge", RecordingBridge)
+    small = create_app(client_mode="langchain", bridge=BridgeConfig(max_size=4, overflow="coalesce"))
+    # Created after the other app; must not inherit its settings
+    default = create_app(client_mode="langchain")
+    with TestClient(small) as small_client, TestClient(default) as default_client:
+        small_client.get("/stream?topic=dogs")
+        default_client.get("/stream?topic=dogs")
+        assert bridges[0].config == BridgeConfig(max_size=4, overflow="coalesce")
+        assert bridges[1].config == BridgeConfig.from_env()
+        # Each app counts only its own streams
+        assert bridges[0].stats is not bridges[1].stats
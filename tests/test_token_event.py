@@ -0,0 +1,62 @@
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from src.openai_client import OpenAIStreamClient
+from src.plain_impl import stream_plain
+from src.token_event import TokenEvent
+
+
+def make_chunk(content, finish_reason=None):
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}],
+    })
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def test_token_event_shape():
+    event = TokenEvent("hi", 3)
+    assert not hasattr(event, "__dict__")
+    assert event.to_dict() == {"content": "hi"}
+    assert TokenEvent.failure("boom").to_dict() == {"error": "boom"}
+    assert TokenEvent("hi", 3) == event
+
+
+@pytest.mark.asyncio
+async def test_openai_adapter_yields_token_events(monkeypatch):
+    client = OpenAIStreamClient(api_key="test")
+    chunks = [make_chunk("Why"), make_chunk(" dogs"), make_chunk(None, finish_reason="stop")]
+
+    async def fake_create_stream(topic, backend=None):
+        return FakeStream(chunks)
+
+    monkeypatch.setattr(client, "_create_stream", fake_create_stream)
+    events = [event async for event in stream_plain("dogs", lambda topic, config=None: client.stream_tokens(topic))]
+    assert events == [TokenEvent("Why", 0), TokenEvent(" dogs", 1), TokenEvent("", 2, "stop")]
+
+
+@pytest.mark.asyncio
+async def test_openai_adapter_reports_failures(monkeypatch):
+    client = OpenAIStreamClient(api_key="test")
+
+    async def failing_create_stream(topic, backend=None):
+        raise RuntimeError("refused")
+
+    monkeypatch.setattr(client, "_create_stream", failing_create_stream)
+    events = [event async for event in client.stream_tokens("dogs")]
+    assert events == [TokenEvent.failure("Connection error: refused")]
@@ -0,0 +1,106 @@
+import pytest
+
+from src.plain_impl import stream_plain
+from src.response_cache import ResponseCache, cached_client
+from src.token_event import TokenEvent
+from src.topic_matcher import (DEFAULT_NORMALIZERS, MinHashLSH, TopicMatchConfig, TopicMatcher, jaccard,
+                               make_normalizer, shingles)
+
+calls = []
+
+
+async def fake_client(topic, config=None):
+    calls.append(topic)
+    for token in ("Why", " did", " the ", topic, "?"):
+        yield TokenEvent(token)
+
+
+def params(topic):
+    return {"model": "test-model", "messages": [{"role": "user", "content": f"Tell me a joke about {topic}"}]}
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+async def joke(client, topic):
+    return "".join([e.text async for e in stream_plain(topic, client)])
+
+
+def test_default_normalization_folds_trivial_variants():
+    normalize = make_normalizer(DEFAULT_NORMALIZERS)
+    assert {normalize(t) for t in ("Dogs", "dogs ", "a dog", "DOGS!", "The  dogs.")} == {"dog"}
+    assert normalize("puppies") == "puppy" and normalize("boxes") == "box" and normalize("chess") == "chess"
+    assert make_normalizer(("case",))("Dogs") == "dogs"
+    with pytest.raises(ValueError):
+        make_normalizer(("stemming",))
+
+
+def test_lsh_finds_similar_sets_only():
+    lsh = MinHashLSH()
+    for topic in ("golden retriever", "quantum physics", "cat"):
+        lsh.add(topic, shingles(topic))
+    assert "golden retriever" in lsh.candidates(shingles("golden retriever puppy"))
+    assert "quantum physics" not in lsh.candidates(shingles("golden retriever puppy"))
+    lsh.remove("golden retriever")
+    assert "golden retriever" not in lsh.candidates(shingles("golden retriever"))
+
+
+@pytest.mark.asyncio
+async def test_normalized_tier_shares_one_entry():
+    cache = ResponseCache(matcher=TopicMatcher())
+    client = cached_client(fake_client, cache, params, namespace="test")
+    first = await joke(client, "Dogs")
+    for topic in ("dogs ", "a dog", "DOGS!"):
+        assert await joke(client, topic) == first
+    assert calls == ["Dogs"]
+    stats = cache.stats()["topics"]
+    assert stats["normalized_hits"] == 3 and stats["hit_rate"] == 0.75
+    assert cache.hits == 3 and cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_near_tier_serves_similar_topics_above_threshold():
+    matcher = TopicMatcher(TopicMatchConfig(near_threshold=0.6))
+    cache = ResponseCache(matcher=matcher)
+    client = cached_client(fake_client, cache, params, namespace="test")
+    await joke(client, "golden retrievers")
+    await joke(client, "golden retriever puppies")
+    await joke(client, "quantum physics")
+    assert calls == ["golden retrievers", "quantum physics"]
+    assert matcher.near_hits == 1
+    similarity = jaccard(shingles("golden retriever"), shingles("golden retriever puppy"))
+    assert similarity >= 0.6
+
+
+@pytest.mark.asyncio
+async def test_candidates_below_threshold_count_as_lsh_rejections():
+    matcher = TopicMatcher(TopicMatchConfig(near_threshold=0.95))
+    cache = ResponseCache(matcher=matcher)
+    client = cached_client(fake_client, cache, params, namespace="test")
+    await joke(client, "golden retrievers")
+    await joke(client, "golden retriever puppies")
+    assert len(calls) == 2
+    assert matcher.near_hits == 0 and matcher.lsh_rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_evicted_topics_leave_the_index():
+    matcher = TopicMatcher(TopicMatchConfig(near_threshold=0.6))
+    cache = ResponseCache(matcher=matcher, max_entries=1)
+    client = cached_client(fake_client, cache, params, namespace="test")
+    await joke(client, "golden retrievers")
+    await joke(client, "quantum physics")
+    await joke(client, "golden retriever puppies")
+    assert len(calls) == 3
+    assert "golden retriever" not in matcher._topics
+
+
+@pytest.mark.asyncio
+async def test_custom_normalizer():
+    cache = ResponseCache(matcher=TopicMatcher(normalizer=lambda topic: topic.split()[-1].lower()))
+    client = cached_client(fake_client, cache, params, namespace="test")
+    await joke(client, "funny Cats")
+    await joke(client, "grumpy cats")
+    assert calls == ["funny Cats"]
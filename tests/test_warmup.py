@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from src.fastapi_endpoint import create_app
+from src.response_cache import ResponseCache
+from src.token_event import TokenEvent
+from src.warmup import WarmupConfig
+
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_WARMUP_CONNECTIONS", "4")
+    monkeypatch.setenv("LLM_WARMUP_PROBE", "true")
+    config = WarmupConfig.from_env()
+    assert config.connections == 4 and config.probe is True
+    assert config.block_startup is True
+
+
+def test_startup_opens_connections_before_ready():
+    app = create_app(client_mode="openai", warmup=WarmupConfig(connections=3))
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["connections"] == 3
+        # The connections stay pooled for the first requests
+        assert len(app.state.http_client._transport._pool.connections) == 3
+        assert "llm_ready 1" in client.get("/metrics").text
+
+
+def test_probe_bypasses_the_cache():
+    cache = ResponseCache()
+    app = create_app(client_mode="langchain", cache=cache, warmup=WarmupConfig(probe=True))
+    with TestClient(app) as client:
+        stats = client.get("/ready").json()
+        assert stats["status"] == "ready"
+        assert stats["probe_ttft"] > 0
+        assert len(cache) == 0
+
+
+def test_successful_probe_reports_ready(monkeypatch):
+    from src import langchain_openai_client
+
+    async def fake_client(topic, config=None):
+        yield TokenEvent("ready", 0)
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", fake_client)
+    app = create_app(client_mode="langchain", warmup=WarmupConfig(probe=True))
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready" and response.json()["errors"] == []
+
+
+def test_probe_timeout_keeps_app_not_ready(monkeypatch):
+    from src import langchain_openai_client
+
+    async def stalled_client(topic, config=None):
+        await asyncio.sleep(10)
+        yield TokenEvent("late", 0)
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", stalled_client)
+    app = create_app(client_mode="langchain", warmup=WarmupConfig(probe=True, timeout=0.1))
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["errors"] == ["Warm-up timed out"]
+
+
+def test_failed_probe_keeps_app_not_ready(monkeypatch):
+    from src import langchain_openai_client
+
+    async def failing_client(topic, config=None):
+        yield TokenEvent.failure("Connection error: upstream down")
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", failing_client)
+    app = create_app(client_mode="langchain", warmup=WarmupConfig(probe=True))
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "failed"
+        assert "upstream down" in response.json()["errors"][0]
+
+
+def test_background_warmup_reports_not_ready_until_done(monkeypatch):
+    from src import langchain_openai_client
+
+    async def slow_client(topic, config=None):
+        await asyncio.sleep(0.3)
+        yield TokenEvent("ready", 0)
+
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", slow_client)
+    app = create_app(client_mode="langchain", warmup=WarmupConfig(probe=True, block_startup=False))
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+        deadline = time.monotonic() + 5.0
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.token_event import TokenEvent
+from src.ws_multiplex import MultiplexSession, StreamRejected, WebSocketConfig
+
+
+class Upstream:
+    """Fake client function that counts the tokens it has produced and whether it was closed."""
+    def __init__(self, count=5, delay=0.0):
+        self.count = count
+        self.delay = delay
+        self.produced = 0
+        self.closed = 0
+
+    async def __call__(self, topic, config=None):
+        try:
+            for index in range(self.count):
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield TokenEvent(f"{topic}{index} ", index)
+        finally:
+            self.closed += 1
+
+
+def session_for(upstream, config=WebSocketConfig()):
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+
+    async def open_stream(topic, cache_bypass):
+        if topic == "rejected":
+            raise StreamRejected("Too many requests", 429, "2")
+        return upstream(topic)
+
+    return MultiplexSession(send, open_stream, config), frames
+
+
+async def until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+def ended(frames, stream_id):
+    return any(f["id"] == stream_id and f["type"] in ("done", "cancelled") for f in frames)
+
+
+@pytest.mark.asyncio
+async def test_streams_are_interleaved_and_tagged():
+    session, frames = session_for(Upstream(count=5, delay=0.01))
+    for stream_id, topic in (("a", "dogs"), ("b", "cats")):
+        await session.handle_text(json.dumps({"type": "start", "id": stream_id, "topic": topic}))
+    await until(lambda: ended(frames, "a") and ended(frames, "b"))
+
+    for stream_id, topic in (("a", "dogs"), ("b", "cats")):
+        tokens = [f for f in frames if f["id"] == stream_id and f["type"] == "token"]
+        assert "".join(f["text"] for f in tokens) == "".join(f"{topic}{i} " for i in range(5))
+        assert [f["seq"] for f in tokens] == [1, 2, 3, 4, 5]
+    # Frames of both streams arrive as they are produced, not one stream after the other
+    ids = [f["id"] for f in frames if f["type"] == "token"]
+    assert ids.index("b") < len(ids) - ids[::-1].index("a") - 1
+    assert frames[-1]["type"] == "done" and frames[-1]["tokens"] == 5
+    assert session.streams == {} and session.stats.active == 0
+
+
+@pytest.mark.asyncio
+async def test_credit_holds_back_the_upstream_read():
+    upstream = Upstream(count=10)
+    session, frames = session_for(upstream)
+    await session.handle_text(json.dumps({"type": "start", "id": "a", "credit": 3}))
+    await until(lambda: len(frames) == 3)
+    await asyncio.sleep(0.05)
+    # The fourth token was read and waits for credit; nothing beyond it is pulled from upstream
+    assert len(frames) == 3 and upstream.produced == 4
+
+    await session.handle_text(json.dumps({"type": "credit", "id": "a", "n": 100}))
+    await until(lambda: ended(frames, "a"))
+    assert [f["type"] for f in frames] == ["token"] * 10 + ["done"]
+    assert session.stats.credit_stalls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_one_stream_only():
+    upstream = Upstream(count=1000, delay=0.005)
+    session, frames = session_for(upstream)
+    for stream_id in ("a", "b"):
+        await session.handle_text(json.dumps({"type": "start", "id": stream_id}))
+    await until(lambda: any(f["id"] == "a" for f in frames))
+    await session.handle_text(json.dumps({"type": "cancel", "id": "a"}))
+    await until(lambda: ended(frames, "a"))
+
+    assert [f["type"] for f in frames if f["id"] == "a"][-1] == "cancelled"
+    assert upstream.closed == 1 and "b" in session.streams and session.stats.cancelled == 1
+    # The id is free again once its final frame was sent
+    sent = len(frames)
+    await session.handle_text(json.dumps({"type": "start", "id": "a"}))
+    await until(lambda: any(f["id"] == "a" for f in frames[sent:]))
+    await session.aclose()
+    assert upstream.closed == 3 and session.stats.active == 0
+
+
+@pytest.mark.asyncio
+async def test_rejections_and_protocol_errors():
+    session, frames = session_for(Upstream(), WebSocketConfig(max_streams=1, initial_credit=0))
+    await session.handle_text("not json")
+    await session.handle_text(json.dumps({"type": "start"}))
+    await session.handle_text(json.dumps({"type": "start", "id": "a"}))
+    await session.handle_text(json.dumps({"type": "start", "id": "a"}))
+    await session.handle_text(json.dumps({"type": "start", "id": "b"}))
+    await session.handle_text(json.dumps({"type": "credit", "id": "a", "n": 0}))
+    await session.handle_text(json.dumps({"type": "pause", "id": "a"}))
+    # Late credit and cancel messages for streams that already ended are not errors
+    await session.handle_text(json.dumps({"type": "cancel", "id": "gone"}))
+    assert [f["type"] for f in frames] == ["protocol_error"] * 3 + ["error", "done"] + ["protocol_error"] * 2
+    assert frames[3] == {"type": "error", "id": "b", "status": 429,
+                         "message": "At most 1 streams may run on one connection"}
+    await session.handle_text(json.dumps({"type": "cancel", "id": "a"}))
+    await until(lambda: ended(frames, "a"))
+
+    await session.handle_text(json.dumps({"type": "start", "id": "c", "topic": "rejected"}))
+    await until(lambda: ended(frames, "c"))
+    assert frames[-2] == {"type": "error", "id": "c", "message": "Too many requests", "status": 429,
+                          "retry_after": "2"}
+
+
+def receive_until_done(ws, stream_ids):
+    frames = []
+    open_ids = set(stream_ids)
+    while open_ids:
+        frame = ws.receive_json()
+        frames.append(frame)
+        if frame["type"] in ("done", "cancelled"):
+            open_ids.discard(frame["id"])
+    return frames
+
+
+@pytest.mark.parametrize("use_langgraph", [False, True])
+def test_websocket_endpoint_runs_the_stream_path(monkeypatch, use_langgraph):
+    from src import fastapi_endpoint, langchain_openai_client
+
+    upstream = Upstream(count=4)
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", upstream)
+    app = fastapi_endpoint.create_app(client_mode="langchain", use_langgraph=use_langgraph)
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "start", "id": "1", "topic": "dogs"})
+            ws.send_json({"type": "start", "id": "2", "topic": "cats", "credit": 2})
+            ws.send_json({"type": "credit", "id": "2", "n": 2})
+            frames = receive_until_done(ws, ["1", "2"])
+        for stream_id, topic in (("1", "dogs"), ("2", "cats")):
+            text = "".join(f["text"] for f in frames if f["id"] == stream_id and f["type"] == "token")
+            assert text == "".join(f"{topic}{i} " for i in range(4))
+        metrics = client.get("/metrics").text
+        assert "llm_websocket_streams_total 2" in metrics
+        assert "llm_websocket_streams_active 0" in metrics
+
+
+def test_websocket_disconnect_cancels_upstream(monkeypatch):
+    from src import fastapi_endpoint, langchain_openai_client
+
+    upstream = Upstream(count=1000, delay=0.01)
+    monkeypatch.setattr(langchain_openai_client, "stream_langchain_tokens", upstream)
+    app = fastapi_endpoint.create_app(client_mode="langchain")
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "start", "id": "a"})
+            ws.send_json({"type": "start", "id": "b"})
+            assert ws.receive_json()["type"] == "token"
+            ws.send_json({"type": "cancel", "id": "a"})
+            frames = receive_until_done(ws, ["a"])
+            assert frames[-1] == {"type": "cancelled", "id": "a"}
+            assert ws.receive_json()["id"] == "b"
+        # Closing the socket cancels the remaining stream's upstream request
+        stats = app.state.ws_stats
+        for _ in range(200):
+            if upstream.closed == 2:
+                break
+            time.sleep(0.01)
+        assert upstream.closed == 2
+        assert stats.connections == 0 and stats.active == 0 and stats.cancelled == 1